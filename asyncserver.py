@@ -0,0 +1,238 @@
+import asyncio
+from struct import error as StructError
+from _thread import start_new_thread
+import pygame as pg
+from entities import NetPlayer
+from codec import encode, decode_join
+from server import Server
+from settings import *
+
+
+class ServerDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, address):
+        self.server.datagram_received(data, address)
+
+    def error_received(self, exc):
+        # a client that was sent a datagram has closed its udp socket
+        pass
+
+
+class AsyncServer(Server):
+    def __init__(self):
+        # the same server, but every client, the game and the window run on one event loop instead of threads
+        super().__init__()
+        self.loop = None
+        self.udp_transport = None
+        self.stopped = None
+        self.client_tasks = set()
+
+    def run(self):
+        # start the window
+        self.screen = pg.display.set_mode((SERVER_SCREEN_WIDTH, SERVER_SCREEN_HEIGHT))
+        pg.display.set_icon(self.icon)
+
+        asyncio.run(self.main())
+
+        # quit program
+        print("Quiting Pygame...")
+        pg.quit()
+        print("\nProcess Finished")
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+
+        # create a socket to host the server
+        self.create_socket()
+
+        # have the server socket start listening for client connections
+        self.socket.listen()
+        self.socket.setblocking(False)
+        # clients using udp are handled by the event loop as their datagrams arrive
+        self.udp_transport = (await self.loop.create_datagram_endpoint(lambda: ServerDatagramProtocol(self),
+                                                                       sock=self.udp_socket))[0]
+        self.print_started()
+
+        # input() blocks, so commands are read on a thread but run on the event loop
+        start_new_thread(self.threaded_input, ())
+
+        tasks = [self.loop.create_task(self.accept_clients()),
+                 self.loop.create_task(self.window_loop()),
+                 self.loop.create_task(self.broadcast_loop())]
+        # every room plays its game on the same event loop
+        for room in self.rooms:
+            tasks.append(self.loop.create_task(self.game_loop(room)))
+
+        # wait until the server is ended, then stop everything still running
+        await self.stopped.wait()
+        tasks.extend(self.client_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # close down the sockets
+        self.udp_transport.close()
+        self.socket.close()
+        for connection in self.connections.values():
+            connection.close()
+
+    def end(self):
+        print("\nStarting Server Termination")
+        # stop all loops, the sockets are closed once every task has stopped
+        self.open = False
+        self.running = False
+        print("Closing Server Socket...")
+        self.stopped.set()
+
+    async def next_frame(self, last_time, frame_length=1.0 / FPS):
+        # sleep for what is left of the frame, returns the time now and how long the frame took in seconds
+        await asyncio.sleep(max(0.0, frame_length - (self.loop.time() - last_time)))
+        current_time = self.loop.time()
+        return current_time, current_time - last_time
+
+    async def window_loop(self):
+        last_time = self.loop.time()
+        while self.running:
+            # pause
+            last_time, self.window_dt = await self.next_frame(last_time)
+
+            self.update_window()
+
+    async def game_loop(self, room):
+        # start a new game
+        room.prepare_new_game()
+        room.tick_clock.restart()
+        # start the game timer
+        while self.running:
+            # pause until the next tick is due
+            await asyncio.sleep(room.tick_clock.time_until_tick())
+
+            # run every tick that is due, so the game keeps the same pace even after a slow tick
+            for tick in range(room.tick_clock.due_ticks()):
+                # reset the game after enough time has passed
+                if room.tick():
+                    # end current game and start a new game
+                    room.prepare_new_game()
+                    break
+
+    async def broadcast_loop(self):
+        # every client is sent snapshots at the same rate, no matter how often it sends its player
+        last_time = self.loop.time()
+        while self.running:
+            last_time = (await self.next_frame(last_time, 1.0 / SNAPSHOT_RATE))[0]
+            self.broadcast_snapshots()
+
+    def send_datagram(self, datagram, address):
+        self.udp_transport.sendto(datagram, address)
+
+    def send_snapshot(self, session, snapshot):
+        # only one snapshot is sent to a client at a time, so a slow client falls behind instead of slowing others
+        session.sending = True
+        self.loop.create_task(self.send_session(session, snapshot, True))
+
+    def threaded_input(self):
+        while self.running:
+            # split the text command received into words
+            command = input().split()
+            self.loop.call_soon_threadsafe(self.run_command, command)
+
+    async def accept_clients(self):
+        while self.running:
+            try:
+                conn, addr = await self.loop.sock_accept(self.socket)
+            except OSError:
+                print("Socket Connection Aborted - Server Closed")
+                break
+
+            print(f"\nClient {self.current_player} Has Connected From IP: {addr[0]}")
+
+            task = self.loop.create_task(self.client_session(conn, self.current_player))
+            self.client_tasks.add(task)
+            task.add_done_callback(self.client_tasks.discard)
+            self.current_player += 1
+
+    async def client_session(self, connection, player_id):
+        connection.setblocking(False)
+        session = self.open_session(connection, player_id)
+
+        # create a new player and send it to the new client
+        # the new player is not added to the players dictionary of the game until (and if) they are verified
+        new_player = NetPlayer(player_id)
+        await session.send_async(self.loop, encode(new_player))
+
+        # send verification to client, with the token the client has to send with everything sent over udp
+        try:
+            player_data, session.compressions, requested_room, resume_token = decode_join(
+                await session.buffer.receive_async(self.loop))
+        except (EOFError, ValueError, ConnectionResetError):
+            verify, reason, player_data, room = False, "Connection Reset", None, None
+        else:
+            verify, reason, player_data, room = self.join_client(player_id, session, player_data, requested_room,
+                                                                 resume_token)
+        if player_data is not None:
+            compression = self.choose_compression(session, verify)
+            await session.send_async(self.loop, encode((verify, reason, session.token, compression,
+                                                        self.room_id(room), self.udp_port)))
+            session.set_compression(compression)
+
+        if verify:
+            if player_data.player_id == player_id:
+                self.add_player(player_id, player_data, room)
+            else:
+                # the client got back the player it had before it lost its connection
+                player_id = player_data.player_id
+
+            # this loop will only end when this client disconnects or the server disconnects this client
+            while self.threaded_clients[player_id] and not session.left:
+                try:
+                    reply = self.handle_message(player_id, session, await session.buffer.receive_async(self.loop))
+                    if reply is not None:
+                        await session.send_async(self.loop, reply)
+                except EOFError:
+                    break
+                except (ValueError, StructError):
+                    # the message was too large or was not a valid message, or the reply could not be encoded
+                    break
+                except OSError:
+                    # the connection was reset, or shut down because the client was kicked or resumed its player
+                    # on a new connection
+                    break
+
+            # close the connection with the client that has disconnected
+            self.disconnect_client(player_id, session)
+
+        else:
+            # disconnect the unverified client
+            print(f"Client {player_id} Denied Access:", reason)
+
+            self.disconnect_client(player_id, session)
+
+    def datagram_received(self, data, address):
+        try:
+            reply = self.handle_datagram(data, address)
+        except OSError:
+            # the client disconnected, its session removes it
+            return
+        if reply is None:
+            return
+        session, messages = reply
+        # tasks get the send lock in the order they were created, so the messages keep their order
+        for message in messages:
+            self.loop.create_task(self.send_session(session, message))
+
+    async def send_session(self, session, message, snapshot=False):
+        try:
+            await session.send_async(self.loop, message)
+        except OSError:
+            # the client disconnected, its session removes it
+            return
+        if snapshot:
+            session.sending = False
+
+
+if __name__ == "__main__":
+    s = AsyncServer()
+    s.run()
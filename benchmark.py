@@ -0,0 +1,168 @@
+from os import path
+from sys import argv
+from timeit import Timer
+from random import randint, uniform, choice
+from pickle import dumps, loads
+import pytmx
+from pygame.math import Vector2 as Vec
+from entities import NetPlayer
+from bullets import BulletStore
+from codec import encode, decode, encode_snapshot, decode_snapshot, game_state, EMPTY_STATE
+from settings import *
+
+BENCHMARK_MAP = "four_corners.tmx"
+BENCHMARK_BULLETS = [0, 50, 200, 1000]
+BENCHMARK_REPEAT = 5
+BENCHMARK_BASES = 3  # how many different snapshots the clients are behind by
+
+
+def make_player(player_id):
+    # a player with data like one in the middle of a game
+    player = NetPlayer(player_id)
+    player.username = f"Player {player_id}"
+    player.image_color = choice(PLAYER_IMGS_CYCLE)
+    player.image_string = PLAYER_IMGS[player.image_color]
+    player.ammo = randint(0, 10)
+    player.kills = randint(0, 20)
+    player.deaths = randint(0, 20)
+    player.score = player.kills * 100
+    player.pos = Vec(uniform(0, 3200), uniform(0, 1920))
+    player.rot = uniform(-720, 720)
+    player.current_respawn_time = randint(0, RESPAWN_INVINCIBLE_DURATION)
+    return player
+
+
+def make_game(bullet_amount):
+    # a game like the server sends, with the item spawns of a real map
+    game_folder = path.dirname(__file__)
+    tilemap_data = pytmx.TiledMap(path.join(game_folder, "map", BENCHMARK_MAP))
+    game = {"players": {},
+            "current map": BENCHMARK_MAP,
+            "game time": GAME_LENGTH,
+            "score time": END_GAME_LENGTH / 1000.0,
+            "items": {},
+            "bullets": {},
+            "active": True
+            }
+    for player_id in range(MAX_CLIENTS):
+        game['players'][player_id] = make_player(player_id)
+    current_item_id = 0
+    for tile_object in tilemap_data.objects:
+        if tile_object.type == "item":
+            current_item = choice(ITEM_WEIGHTS_LIST) if tile_object.name == "random" else tile_object.name
+            game['items'][current_item_id] = [bool(randint(0, 1)), tile_object.name, current_item]
+            current_item_id += 1
+    for bullet_id in range(bullet_amount):
+        game['bullets'][bullet_id] = [Vec(uniform(0, 3200), uniform(0, 1920)), uniform(0, 360),
+                                      randint(0, MAX_CLIENTS - 1)]
+    return game
+
+
+def time_per_call(function, message):
+    # the fastest of a few runs, in microseconds
+    timer = Timer(lambda: function(message))
+    number, total_time = timer.autorange()
+    best_time = min([total_time] + timer.repeat(BENCHMARK_REPEAT - 1, number))
+    return best_time / number * 1000000
+
+
+def compare(name, message):
+    pickled = dumps(message)
+    encoded = encode(message)
+    print(f"{name}:")
+    print(f"\t- Pickle: {len(pickled)} Bytes, Encode {time_per_call(dumps, message):.1f} us, "
+          f"Decode {time_per_call(loads, pickled):.1f} us")
+    print(f"\t- Codec: {len(encoded)} Bytes, Encode {time_per_call(encode, message):.1f} us, "
+          f"Decode {time_per_call(decode, encoded):.1f} us")
+
+
+def next_frame(game):
+    # the game one frame later, where every player and bullet moved but the items stayed the same
+    for player in game['players'].values():
+        player.pos += Vec(2, 1)
+        player.rot += 3
+    for bullet_data in game['bullets'].values():
+        bullet_data[0] += Vec(BULLET_VEL, 0).rotate(-bullet_data[1]) / FPS
+
+
+def compare_delta(name, game):
+    base_state = game_state(game)
+    next_frame(game)
+    state = game_state(game)
+    keyframe = encode_snapshot(1, 0, EMPTY_STATE, state)
+    delta = encode_snapshot(1, 0, base_state, state)
+    print(f"{name}:")
+    print(f"\t- Keyframe: {len(keyframe)} Bytes, Delta: {len(delta)} Bytes, "
+          f"Encode Delta {time_per_call(lambda state: encode_snapshot(1, 0, base_state, state), state):.1f} us, "
+          f"Decode Delta {time_per_call(lambda delta: decode_snapshot(delta, base_state), delta):.1f} us")
+
+
+def compare_broadcast(name, game):
+    # every client is sent the same tick, but some of them are further behind than others
+    base_states = []
+    for base in range(BENCHMARK_BASES):
+        base_states.append(game_state(game))
+        next_frame(game)
+    state = game_state(game)
+    client_bases = [base_states[player_id % BENCHMARK_BASES] for player_id in range(MAX_CLIENTS)]
+
+    def broadcast(shared):
+        # the server encodes a snapshot once for every client sent the same state since the same base
+        snapshots = {}
+        for base_state in client_bases:
+            key = id(base_state) if shared else None
+            if key is None or key not in snapshots:
+                snapshots[key] = encode_snapshot(1, 0, base_state, state)
+
+    print(f"{name}:")
+    print(f"\t- Every Client {time_per_call(broadcast, False):.1f} us, "
+          f"Once Per Base {time_per_call(broadcast, True):.1f} us")
+
+
+def compare_move(name, game):
+    # one tick of moving every bullet, one at a time as vectors and all at once in a BulletStore
+    bullet_store = BulletStore()
+    for bullet_id, (pos, angle, owner_player_id) in game['bullets'].items():
+        bullet_store.add(bullet_id, pos, angle, owner_player_id, 0)
+
+    def move_vectors(bullets):
+        for bullet_data in bullets.values():
+            bullet_data[0] += Vec(BULLET_VEL, 0).rotate(-bullet_data[1]) / FPS
+
+    print(f"{name}:")
+    print(f"\t- Vectors {time_per_call(move_vectors, game['bullets']):.1f} us, "
+          f"Bullet Store {time_per_call(lambda bullets: bullets.move(1 / FPS), bullet_store):.1f} us")
+
+
+def run(bullet_amounts):
+    # the player sent by every client every frame
+    player = make_player(0)
+    player.overwrites['new bullets'].append([Vec(player.pos.x, player.pos.y), player.rot + 90, 0])
+    player.overwrites['new bullets'].append([Vec(player.pos.x, player.pos.y), player.rot - 90, 0])
+    compare("Client Player", player)
+
+    # the game sent to every client every frame
+    for bullet_amount in bullet_amounts:
+        compare(f"Game With {MAX_CLIENTS} Players And {bullet_amount} Bullets", make_game(bullet_amount))
+
+    # the changes sent after the first frame
+    for bullet_amount in bullet_amounts:
+        compare_delta(f"Snapshot Delta With {MAX_CLIENTS} Moving Players And {bullet_amount} Bullets",
+                      make_game(bullet_amount))
+
+    # one tick sent to every client, with each player, item, and bullet encoded once instead of once per client
+    for bullet_amount in bullet_amounts:
+        compare_broadcast(f"Broadcast To {MAX_CLIENTS} Clients With {bullet_amount} Bullets",
+                          make_game(bullet_amount))
+
+    # the bullets moved by the server every tick
+    for bullet_amount in bullet_amounts:
+        compare_move(f"Moving {bullet_amount} Bullets", make_game(bullet_amount))
+
+
+if __name__ == "__main__":
+    # bullet amounts can be given as arguments, such as: python benchmark.py 0 100 500
+    if len(argv) > 1:
+        run([int(bullet_amount) for bullet_amount in argv[1:]])
+    else:
+        run(BENCHMARK_BULLETS)
@@ -0,0 +1,137 @@
+from math import cos, sin, radians
+import numpy as np
+from codec import to_angle, POSITION_SCALE, POSITION_MIN, POSITION_MAX
+from settings import *
+
+
+class BulletStore:
+    def __init__(self, size=BULLET_STORE_SIZE):
+        # every bullet of a room, kept in arrays so all of them are moved at once instead of one at a time
+        # each bullet has a slot, the same index in every array, and slots of removed bullets are used again
+        self.x = np.zeros(size)
+        self.y = np.zeros(size)
+        # the direction each bullet moves in, as a vector one pixel long
+        self.vel_x = np.zeros(size)
+        self.vel_y = np.zeros(size)
+        # the angle as it is sent, which never changes after the bullet is launched
+        self.angle = np.zeros(size, dtype=np.uint16)
+        self.owner = np.zeros(size, dtype=np.uint32)
+        self.spawn_tick = np.zeros(size, dtype=np.int64)
+        self.bullet_id = np.zeros(size, dtype=np.uint32)
+        self.alive = np.zeros(size, dtype=bool)
+        # bullet id to its slot, and the slots of removed bullets
+        self.slots = {}
+        self.free_slots = []
+        # every slot past this one has never been used
+        self.used = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, bullet_id):
+        return bullet_id in self.slots
+
+    def grow(self):
+        # double the size of every array, keeping the bullets in the same slots
+        for name in ("x", "y", "vel_x", "vel_y", "angle", "owner", "spawn_tick", "bullet_id", "alive"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros_like(array))))
+
+    def add(self, bullet_id, pos, angle, owner_player_id, spawn_tick):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.used == len(self.alive):
+                self.grow()
+            slot = self.used
+            self.used += 1
+        self.x[slot] = pos.x
+        self.y[slot] = pos.y
+        # the same direction as Vec(1, 0).rotate(-angle)
+        self.vel_x[slot] = cos(radians(angle))
+        self.vel_y[slot] = -sin(radians(angle))
+        self.angle[slot] = to_angle(angle)
+        self.owner[slot] = owner_player_id
+        self.spawn_tick[slot] = spawn_tick
+        self.bullet_id[slot] = bullet_id
+        self.alive[slot] = True
+        self.slots[bullet_id] = slot
+
+    def remove(self, bullet_id):
+        # bullets that were already removed are ignored, as more than one client can report the same bullet
+        slot = self.slots.pop(bullet_id, None)
+        if slot is not None:
+            self.alive[slot] = False
+            # removed bullets stay still, so every slot can be moved without checking which are alive
+            self.vel_x[slot] = 0.0
+            self.vel_y[slot] = 0.0
+            self.free_slots.append(slot)
+
+    def clear(self):
+        self.alive[:self.used] = False
+        self.vel_x[:self.used] = 0.0
+        self.vel_y[:self.used] = 0.0
+        self.slots.clear()
+        self.free_slots.clear()
+        self.used = 0
+
+    def remove_where(self, hits):
+        # remove every bullet in a slot that is True in hits
+        for slot in np.flatnonzero(hits & self.alive[:len(hits)]).tolist():
+            # a client can remove the same bullet meanwhile, only the first removal frees its slot
+            if self.slots.pop(int(self.bullet_id[slot]), None) is not None:
+                self.alive[slot] = False
+                self.vel_x[slot] = 0.0
+                self.vel_y[slot] = 0.0
+                self.free_slots.append(slot)
+
+    def expired(self, tick, tick_length):
+        # True in the slot of every bullet that has gone as far as it can
+        return (tick - self.spawn_tick[:self.used]) * (tick_length * BULLET_VEL) >= BULLET_RANGE
+
+    def hits(self, pos, player_id):
+        # True in the slot of every bullet touching the hit rect of a player, other than the player's own bullets
+        reach_x = (PLAYER_HIT_RECT_WIDTH + BULLET_HIT_SIZE) / 2
+        reach_y = (PLAYER_HIT_RECT_HEIGHT + BULLET_HIT_SIZE) / 2
+        return (self.alive[:self.used] & (self.owner[:self.used] != player_id)
+                & (np.abs(self.x[:self.used] - pos.x) < reach_x) & (np.abs(self.y[:self.used] - pos.y) < reach_y))
+
+    def move(self, dt):
+        # move every bullet by how far it goes in dt seconds
+        self.x[:self.used] += self.vel_x[:self.used] * (BULLET_VEL * dt)
+        self.y[:self.used] += self.vel_y[:self.used] * (BULLET_VEL * dt)
+
+    def states(self):
+        # bullet id to the values that are sent, the position rounded to sub-pixel units the same way as to_fixed
+        slots = np.flatnonzero(self.alive[:self.used])
+        xs = np.clip(np.rint(self.x[slots] * POSITION_SCALE), POSITION_MIN, POSITION_MAX).astype(int)
+        ys = np.clip(np.rint(self.y[slots] * POSITION_SCALE), POSITION_MIN, POSITION_MAX).astype(int)
+        return dict(zip(self.bullet_id[slots].tolist(),
+                        zip(xs.tolist(), ys.tolist(), self.angle[slots].tolist(), self.owner[slots].tolist())))
+
+
+class WallGrid:
+    def __init__(self, walls, width, height, cell_size=WALL_GRID_SIZE):
+        # the map split into small squares, each blocked if a bullet centered in it would touch a wall
+        # finding the square of every bullet is much faster than checking every bullet against every wall
+        self.cell_size = cell_size
+        columns = int(width // cell_size) + 1
+        rows = int(height // cell_size) + 1
+        self.blocked = np.zeros((rows, columns), dtype=bool)
+        centers_x = (np.arange(columns) + 0.5) * cell_size
+        centers_y = (np.arange(rows) + 0.5) * cell_size
+        # a bullet touches a wall if its center is closer to the wall than half its size
+        reach = BULLET_HIT_SIZE / 2
+        for x, y, wall_width, wall_height in walls:
+            blocked_columns = (centers_x > x - reach) & (centers_x < x + wall_width + reach)
+            blocked_rows = (centers_y > y - reach) & (centers_y < y + wall_height + reach)
+            self.blocked[np.ix_(blocked_rows, blocked_columns)] = True
+
+    def collide(self, bullets):
+        # True in the slot of every bullet that hit a wall or left the map
+        columns = np.floor(bullets.x[:bullets.used] / self.cell_size).astype(int)
+        rows = np.floor(bullets.y[:bullets.used] / self.cell_size).astype(int)
+        hits = (columns < 0) | (rows < 0) | (columns >= self.blocked.shape[1]) | (rows >= self.blocked.shape[0])
+        inside = ~hits
+        hits[inside] = self.blocked[rows[inside], columns[inside]]
+        return hits
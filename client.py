@@ -220,7 +220,10 @@ class Client:
             print(f"\nKicked From Server At {self.network.server_ip}:{self.network.server_port}")
         else:
             print(f"\nDisconnected From Server At {self.network.server_ip}:{self.network.server_port}")
-        self.network.client.close()
+        if self.network.compressor is not None:
+            print(self.network.compressor.stats())
+        print(self.network.telemetry.stats())
+        self.network.close()
         self.connected = False
         self.menu = True
 
@@ -233,9 +236,9 @@ class Client:
         self.player.image_color = PLAYER_IMGS_CYCLE[self.current_img_cycle]
         self.player.image_string = self.image_string
 
-        verify, reason = self.network.send(self.player)
+        verify, reason = self.network.verify(self.player)
         if verify:
-            print("Successfully Joined Server")
+            print(f"Successfully Joined Server In Room {self.network.room}")
         else:
             reason = "Connection Refused: " + reason
             print(reason)
@@ -479,7 +482,7 @@ class Client:
         self.bullet_ids.clear()
 
         # get the game data to load anything before starting the game loop
-        self.game = self.network.send(self.player)
+        self.game = self.network.update(self.player)
         self.current_map = self.game['current map']
 
         # create the map
@@ -572,15 +575,31 @@ class Client:
         # only get the latest data from the server if the client has not disconnected themselves
         if self.connected:
             # receive the updated game over the network from the server
-            received = self.network.send(self.player)
+            received = self.network.update(self.player)
             if type(received) is str:
                 self.kicked = True
                 self.disconnect()
                 return False
             else:
                 self.game = received
+                # line up changes the server made to the client's player with the client's own movement
+                corrections = self.network.take_corrections()
+                if corrections:
+                    self.reconcile_player(corrections)
                 return True
 
+    def reconcile_player(self, corrections):
+        for sprite_player in self.players:
+            if sprite_player.player_id == self.player_id:
+                sprite_player.reconcile(corrections)
+                # the sprite player is matched to the network player every frame, so they have to stay the same
+                update_net_object(self.player, sprite_player)
+                return
+        # there is no sprite player yet, so there is no movement to line the changes up with
+        for input_sequence, attributes in corrections:
+            for attr, value in attributes.items():
+                setattr(self.player, attr, value)
+
     def game_update(self):
         # update client's player with data received over the network
         self.player = self.game['players'][self.player_id]
@@ -654,13 +673,13 @@ class Client:
                 update_net_object(self.player, sprite_player)
 
         # overlay data updates
-        self.game_overlay_left = [f"Players: {len(self.game['players'])}/{MAX_CLIENTS}"]
+        self.game_overlay_left = [f"Players: {self.game['player count']}/{MAX_CLIENTS}"]
         self.game_overlay_right = [f"Game Time Left: {format_time(self.game['game time'])}"]
         self.player_status_overlay = [f"Ammo: {self.player.ammo}",
                                       f"Deaths: {self.player.deaths}",
                                       f"Kills: {self.player.kills}"]
         self.debug_overlay = [f"Client ID: {self.player_id}",
-                              f"Username: {self.username}"]
+                              f"Username: {self.username}"] + self.network.telemetry.lines()
 
         # update display caption
         if self.debug:
@@ -789,6 +808,10 @@ class Client:
             self.draw_text(f"FPS: {round(self.clock.get_fps(), 2)}", OVERLAY_SIZE, TEXT_COLOR,
                            self.screen_width / 2, OVERLAY_HEIGHT_DISTANCE * 3,
                            align="n", font_name=self.theme_font)
+            # the round trip time to the server
+            self.draw_text(self.network.telemetry.lines()[0], OVERLAY_SIZE, TEXT_COLOR,
+                           self.screen_width / 2, OVERLAY_HEIGHT_DISTANCE * 5,
+                           align="n", font_name=self.theme_font)
 
         for sprite_bullet in self.bullets.sprites():
             self.screen.blit(sprite_bullet.image, self.camera.apply_sprite(sprite_bullet))
@@ -0,0 +1,1009 @@
+from struct import Struct, pack, unpack_from, calcsize, error as StructError
+from types import MappingProxyType
+import numpy as np
+from pygame.math import Vector2 as Vec
+from entities import NetPlayer, NO_INPUT
+from settings import *
+
+# message types, sent as the first byte of every message
+PLAYER_MESSAGE = 1
+VERIFY_MESSAGE = 2
+SNAPSHOT_MESSAGE = 3
+UPDATE_MESSAGE = 4
+STATE_MESSAGE = 5
+EVENTS_MESSAGE = 6
+OVERRIDE_MESSAGE = 7
+JOIN_MESSAGE = 8
+PING_MESSAGE = 9
+PROFILE_MESSAGE = 10
+LEAVE_MESSAGE = 11
+
+MESSAGE_TYPE = Struct("!B")
+COUNT = Struct("!H")
+STRING_LENGTH = Struct("!B")
+NONE_STRING = 255  # a string length of this means the string is None
+MAX_STRING_LENGTH = NONE_STRING - 1  # in bytes
+NO_IDS = COUNT.pack(0)  # an empty list of ids
+
+# strings that can only be one of a few values are sent as their index in one of these lists
+IMAGE_COLORS = list(PLAYER_IMGS.keys())
+IMAGE_STRINGS = list(PLAYER_IMGS.values())
+ITEM_NAMES = ["None", "random"] + list(ITEM_IMGS.keys())
+ITEM_INDEXES = dict((name, index) for index, name in enumerate(ITEM_NAMES))
+NONE_INDEX = 255  # an index of this means the value is None
+# the order the lists of player overwrites are sent in
+OVERWRITE_TYPES = ["collisions", "items", "new bullets", "kill bullets", "deaths by"]
+
+# [0] is the item id, [1] is active or not, [2] is the item spawn type, [3] is the actual current item
+ITEM = Struct("!H?BB")
+# player ids are sent in 4 bytes, as the server never gives two clients the same id
+# [0] is the bullet id, [1] and [2] are the position, [3] is the angle, [4] is the owner player id
+BULLET = Struct("!IhhHI")
+# the same as BULLET, so the bullets of a whole game can be packed and unpacked all at once
+BULLET_RECORD = np.dtype([("bullet_id", ">u4"), ("x", ">i2"), ("y", ">i2"), ("angle", ">u2"), ("owner", ">u4")])
+# a bullet that does not have an id yet, sent by the client in the new bullets overwrite
+NEW_BULLET = Struct("!hhHI")
+# [0] is if the game is active, [1] is the game time, [2] is the score time, [3] is how many players are connected
+# the times are in milliseconds, the player count is sent since clients are only sent the players near them
+GAME_HEADER = Struct("!?iiH")
+# positions are sent as whole sub-pixel units, so both sides round them the same way and unchanged ones compare equal
+POSITION_SCALE = 8  # units in a pixel
+POSITION_MIN = -0x8000  # positions further than fit in 2 bytes are sent at the edge, 4096 pixels from 0
+POSITION_MAX = 0x7FFF
+# angles are sent as a fraction of a turn in 2 bytes
+ANGLE_SCALE = 0x10000 / 360  # units in a degree
+# [0] is if the client was verified, [1] is the session token the client sends with everything over udp,
+# [2] is the compression chosen for the connection, [3] is the room the client is playing in,
+# [4] is the port to send to over udp
+VERIFY = Struct("!?IBBH")
+# [0] has a bit set for every compression the client has, [1] is the room the client wants to play in,
+# [2] is the session token of the connection the client lost, to get back the player it had
+JOIN = Struct("!BBI")
+ANY_ROOM = 0xFF  # the client is put in the first room with space
+NO_SESSION = 0  # a session token of this means the client is joining with a new player
+CHANGED = Struct("!?")
+# [0] is the tick of the snapshot, [1] is the tick of the snapshot it only has the changes since,
+# [2] is the time on the server when the snapshot was made in milliseconds
+SNAPSHOT_TICKS = Struct("!III")
+NO_BASE = 0xFFFFFFFF  # a base tick of this means the snapshot is a keyframe with everything in it
+# how a whole game starts, the same for every whole game
+KEYFRAME_START = MESSAGE_TYPE.pack(SNAPSHOT_MESSAGE) + SNAPSHOT_TICKS.pack(0, NO_BASE, 0) + CHANGED.pack(True)
+# [0] is the player id, [1] has a bit set for every field of the player that is sent
+PLAYER_CHANGES = Struct("!II")
+# the tick of the latest snapshot the client has received
+ACK = Struct("!I")
+# [0] is the player id, [1] is the session token, [2] is the sequence number,
+# [3] is the tick of the latest snapshot the client has received, [4] is the time the client sent it in milliseconds
+STATE_HEADER = Struct("!IIIII")
+# [0] is the time of the latest state a client sent, sent back with snapshots sent over udp
+# to work out the round trip time
+# [1] is how long the server held the state before sending the snapshot in milliseconds
+ECHO = Struct("!IH")
+# the time the client sent a ping in milliseconds, the server sends the ping straight back
+PING = Struct("!I")
+# has a bit set for every field of the player that is overwritten, or that is sent in a profile
+OVERRIDE_MASK = Struct("!I")
+# what the client did on one frame, sent every frame instead of its whole player
+# [0] is the input sequence, [1] has a bit set for every key held, [2] and [3] are the position, [4] is the rotation
+COMMAND = Struct("!IBhhH")
+
+
+def to_index(values):
+    # send a string as its position in a list of values it can be
+    indexes = dict((value, index) for index, value in enumerate(values))
+    indexes[None] = NONE_INDEX
+
+    def convert(value):
+        try:
+            return indexes[value]
+        except KeyError:
+            raise ValueError(f"Cannot Send {value!r}, It Is Not One Of The Values It Can Be")
+    return convert
+
+
+def from_index(values):
+    def convert(index):
+        if index == NONE_INDEX:
+            return None
+        if index >= len(values):
+            raise ValueError(f"Invalid Message: No Value With The Index {index}")
+        return values[index]
+    return convert
+
+
+def to_fixed(value):
+    # a position in pixels as sub-pixel units
+    units = round(value * POSITION_SCALE)
+    if units > POSITION_MAX:
+        return POSITION_MAX
+    if units < POSITION_MIN:
+        return POSITION_MIN
+    return units
+
+
+def to_position(pos):
+    # both coordinates of a position as sub-pixel units, the same as to_fixed
+    x = round(pos.x * POSITION_SCALE)
+    y = round(pos.y * POSITION_SCALE)
+    if not POSITION_MIN <= x <= POSITION_MAX:
+        x = POSITION_MAX if x > POSITION_MAX else POSITION_MIN
+    if not POSITION_MIN <= y <= POSITION_MAX:
+        y = POSITION_MAX if y > POSITION_MAX else POSITION_MIN
+    return x, y
+
+
+def from_position(x, y):
+    return Vec(x / POSITION_SCALE, y / POSITION_SCALE)
+
+
+def from_fixed(units):
+    return units / POSITION_SCALE
+
+
+def to_angle(degrees):
+    # any rotation, wrapped around to less than one turn
+    return round(degrees % 360 * ANGLE_SCALE) & 0xFFFF
+
+
+def from_angle(units):
+    return units / ANGLE_SCALE
+
+
+def to_milliseconds(seconds):
+    return round(seconds * 1000)
+
+
+def from_milliseconds(milliseconds):
+    return milliseconds / 1000.0
+
+
+def clamp(value, low, high):
+    # a count too large or too small for its field is sent at the edge of what fits, instead of failing to pack
+    if value > high:
+        return high
+    if value < low:
+        return low
+    return value
+
+
+def to_destroy(destroy):
+    # destroy[1] is -1 when no player destroyed them
+    if destroy[1] is None:
+        return destroy[0], -1
+    return destroy
+
+
+def from_destroy(destroy, by):
+    return destroy, None if by < 0 else by
+
+
+def to_timer(value):
+    # timers are either False or the time in milliseconds, False is sent as -1
+    if value is False:
+        return -1
+    return int(value)
+
+
+def from_timer(value):
+    if value < 0:
+        return False
+    return value
+
+
+class Schema:
+    def __init__(self, fields, values, set_values):
+        # each field is (attribute, struct format, from wire function)
+        # the function is None if the attribute is sent as is, or else it makes the attribute from the field's values
+        self.fields = fields
+        # values(obj) returns every field of an object as the values that are sent, in the order of the fields
+        # set_values(obj, values) sets every field of an object from them
+        # they are written out for each schema, as going through the fields for every object sent is much slower
+        self.values = values
+        self.set_values = set_values
+        self.struct = Struct("!" + "".join(field[1] for field in fields))
+        self.size = self.struct.size
+        # where each field's values start and end in the list of all values
+        self.ranges = []
+        index = 0
+        for attribute, fmt, from_wire in fields:
+            self.ranges.append((index, index + len(fmt)))
+            index += len(fmt)
+        self.value_count = index
+        # a mask with the bit for every field set
+        self.all_fields = (1 << len(fields)) - 1
+        # structs for only some of the fields, by the mask of the fields
+        self.changed_structs = {}
+
+    def pack(self, obj):
+        return self.struct.pack(*self.values(obj))
+
+    def unpack_into(self, obj, data, offset):
+        self.set_values(obj, self.struct.unpack_from(data, offset))
+        return offset + self.size
+
+    def attribute_mask(self, attributes):
+        # set the bit of every field in a list of attributes
+        mask = 0
+        for i, field in enumerate(self.fields):
+            if field[0] in attributes:
+                mask |= 1 << i
+        return mask
+
+    def attributes(self, values, mask):
+        # the attributes in the mask and their values
+        attributes = {}
+        for i, ((attribute, fmt, from_wire), (start, end)) in enumerate(zip(self.fields, self.ranges)):
+            if mask & 1 << i:
+                if from_wire is None:
+                    attributes[attribute] = values[start]
+                else:
+                    attributes[attribute] = from_wire(*values[start:end])
+        return attributes
+
+    def changed_mask(self, old_values, new_values):
+        # set the bit of every field that has a different value
+        mask = 0
+        for i, (start, end) in enumerate(self.ranges):
+            if old_values[start:end] != new_values[start:end]:
+                mask |= 1 << i
+        return mask
+
+    def changed_struct(self, mask):
+        if mask not in self.changed_structs:
+            fmt = "".join(field[1] for i, field in enumerate(self.fields) if mask & 1 << i)
+            self.changed_structs[mask] = Struct("!" + fmt)
+        return self.changed_structs[mask]
+
+    def pack_changed(self, values, mask):
+        # only the fields in the mask
+        if mask & self.all_fields == self.all_fields:
+            return self.struct.pack(*values[:self.value_count])
+        changed_values = []
+        for i, (start, end) in enumerate(self.ranges):
+            if mask & 1 << i:
+                changed_values.extend(values[start:end])
+        return self.changed_struct(mask & self.all_fields).pack(*changed_values)
+
+    def unpack_changed(self, values, data, offset, mask):
+        # overwrite the fields in the mask of a list of values
+        if mask & self.all_fields == self.all_fields:
+            values[:self.value_count] = self.struct.unpack_from(data, offset)
+            return offset + self.size
+        changed_struct = self.changed_struct(mask & self.all_fields)
+        changed_values = changed_struct.unpack_from(data, offset)
+        index = 0
+        for i, (start, end) in enumerate(self.ranges):
+            if mask & 1 << i:
+                values[start:end] = changed_values[index:index + end - start]
+                index += end - start
+        return offset + changed_struct.size
+
+
+to_image_color = to_index(IMAGE_COLORS)
+from_image_color = from_index(IMAGE_COLORS)
+to_image_string = to_index(IMAGE_STRINGS)
+from_image_string = from_index(IMAGE_STRINGS)
+
+
+def player_values(player):
+    # the values of every field of PLAYER_SCHEMA, in the same order
+    x, y = to_position(player.pos)
+    destroy, destroyed_by = to_destroy(player.destroy)
+    red, green, blue = player.fillcolor
+    return [player.player_id, clamp(player.ammo, -0x8000, 0x7FFF), clamp(player.kills, 0, 0xFFFF),
+            clamp(player.deaths, 0, 0xFFFF), clamp(player.score, -0x80000000, 0x7FFFFFFF), x, y, to_angle(player.rot),
+            player.frozen, player.respawn, destroy, destroyed_by, to_timer(player.current_crash_time),
+            to_timer(player.current_respawn_time), player.power_invincible, to_image_color(player.image_color),
+            to_image_string(player.image_string), red, green, blue, player.input_sequence]
+
+
+def set_player_values(player, values):
+    # set every field of PLAYER_SCHEMA from the values in the same order as player_values
+    # the values of a player's state have its username after them
+    (player.player_id, player.ammo, player.kills, player.deaths, player.score, x, y, rot,
+     player.frozen, player.respawn, destroy, destroyed_by, current_crash_time,
+     current_respawn_time, player.power_invincible, image_color,
+     image_string, red, green, blue, player.input_sequence) = values[:PLAYER_SCHEMA.value_count]
+    player.pos = from_position(x, y)
+    player.rot = from_angle(rot)
+    player.destroy = from_destroy(destroy, destroyed_by)
+    player.current_crash_time = from_timer(current_crash_time)
+    player.current_respawn_time = from_timer(current_respawn_time)
+    player.image_color = from_image_color(image_color)
+    player.image_string = from_image_string(image_string)
+    player.fillcolor = (red, green, blue)
+
+
+# the fixed width part of a net player, the username is sent after it
+PLAYER_SCHEMA = Schema([
+    ("player_id", "I", None),
+    ("ammo", "h", None),
+    ("kills", "H", None),
+    ("deaths", "H", None),
+    ("score", "i", None),
+    ("pos", "hh", from_position),
+    ("rot", "H", from_angle),
+    ("frozen", "?", None),
+    ("respawn", "?", None),
+    ("destroy", "?i", from_destroy),
+    ("current_crash_time", "i", from_timer),
+    ("current_respawn_time", "i", from_timer),
+    ("power_invincible", "?", None),
+    ("image_color", "B", from_image_color),
+    ("image_string", "B", from_image_string),
+    ("fillcolor", "BBB", lambda red, green, blue: (red, green, blue)),
+    ("input_sequence", "I", None),
+], player_values, set_player_values)
+
+
+def pack_string(string):
+    if string is None:
+        return STRING_LENGTH.pack(NONE_STRING)
+    encoded = string.encode("utf-8")
+    if len(encoded) > MAX_STRING_LENGTH:
+        raise ValueError(f"String Is Too Long To Send ({len(encoded)}/{MAX_STRING_LENGTH} Bytes)")
+    return STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def unpack_string(data, offset):
+    length = STRING_LENGTH.unpack_from(data, offset)[0]
+    offset += STRING_LENGTH.size
+    if length == NONE_STRING:
+        return None, offset
+    if offset + length > len(data):
+        raise ValueError("String Goes Past The End Of The Message")
+    return bytes(data[offset:offset + length]).decode("utf-8"), offset + length
+
+
+def pack_player(player):
+    return PLAYER_SCHEMA.pack(player) + pack_string(player.username)
+
+
+def unpack_player(data, offset):
+    player = NetPlayer(0)
+    offset = PLAYER_SCHEMA.unpack_into(player, data, offset)
+    player.username, offset = unpack_string(data, offset)
+    return player, offset
+
+
+def pack_ids(ids, fmt):
+    # a list of ids starting with how many there are
+    # the struct module keeps the formats it used last, so they aren't made again for every list
+    if not ids:
+        return NO_IDS
+    return COUNT.pack(len(ids)) + pack(f"!{len(ids)}{fmt}", *ids)
+
+
+def unpack_ids(data, offset, fmt):
+    count = COUNT.unpack_from(data, offset)[0]
+    ids_format = f"!{count}{fmt}"
+    return unpack_from(ids_format, data, offset + COUNT.size), offset + COUNT.size + calcsize(ids_format)
+
+
+def pack_overwrites(overwrites):
+    parts = []
+    for overwrite_type in OVERWRITE_TYPES:
+        overwrite_data = overwrites[overwrite_type]
+        parts.append(COUNT.pack(len(overwrite_data)))
+        if overwrite_type == "new bullets":
+            for pos, angle, owner_player_id in overwrite_data:
+                parts.append(NEW_BULLET.pack(to_fixed(pos.x), to_fixed(pos.y), to_angle(angle), owner_player_id))
+        else:
+            parts.append(pack(f"!{len(overwrite_data)}I", *overwrite_data))
+    return b"".join(parts)
+
+
+def unpack_overwrites(overwrites, data, offset):
+    for overwrite_type in OVERWRITE_TYPES:
+        count = COUNT.unpack_from(data, offset)[0]
+        offset += COUNT.size
+        if overwrite_type == "new bullets":
+            for i in range(count):
+                x, y, angle, owner_player_id = NEW_BULLET.unpack_from(data, offset)
+                overwrites[overwrite_type].append([Vec(from_fixed(x), from_fixed(y)), from_angle(angle),
+                                                   owner_player_id])
+                offset += NEW_BULLET.size
+        else:
+            ids_format = f"!{count}I"
+            overwrites[overwrite_type].extend(unpack_from(ids_format, data, offset))
+            offset += calcsize(ids_format)
+    return offset
+
+
+def pack_keys(keys):
+    # a bit for every key held, in the order the player reads them
+    bits = 0
+    for i, held in enumerate(keys):
+        if held:
+            bits |= 1 << i
+    return bits
+
+
+def unpack_keys(bits):
+    return tuple(bool(bits & 1 << i) for i in range(len(NO_INPUT)))
+
+
+def pack_command(player):
+    return COMMAND.pack(player.input_sequence, pack_keys(player.keys), to_fixed(player.pos.x), to_fixed(player.pos.y),
+                        to_angle(player.rot))
+
+
+def unpack_command(data, offset):
+    # [0] is the input sequence, [1] is the keys held, [2] is the position, [3] is the rotation
+    input_sequence, keys, x, y, rot = COMMAND.unpack_from(data, offset)
+    command = (input_sequence, unpack_keys(keys), Vec(from_fixed(x), from_fixed(y)), from_angle(rot))
+    return command, offset + COMMAND.size
+
+
+# the player, the username is sent after the fixed width fields
+USERNAME_FIELD = 1 << len(PLAYER_SCHEMA.fields)
+ALL_PLAYER_FIELDS = PLAYER_SCHEMA.all_fields | USERNAME_FIELD
+# the fields that change slowly, only sent by the client when they change
+# the player id is never changed by the client, and the rest is sent in every command
+NOT_PROFILE = ["player_id", "pos", "rot", "input_sequence"]
+PROFILE_FIELDS = ALL_PLAYER_FIELDS & ~PLAYER_SCHEMA.attribute_mask(NOT_PROFILE)
+# the values of a new net player, which a player sent for the first time starts with
+NEW_PLAYER_VALUES = PLAYER_SCHEMA.values(NetPlayer(0)) + [None]
+# where the position of a player is in its values
+PLAYER_POS = PLAYER_SCHEMA.ranges[[field[0] for field in PLAYER_SCHEMA.fields].index("pos")][0]
+# a snapshot to send the changes since when the client has no snapshots yet
+EMPTY_STATE = {"header": None, "players": {}, "items": {}, "bullets": {}}
+
+
+def player_pos(values):
+    # the x and y of a player in a state, in pixels
+    return from_fixed(values[PLAYER_POS]), from_fixed(values[PLAYER_POS + 1])
+
+
+def bullet_pos(values):
+    return from_fixed(values[0]), from_fixed(values[1])
+
+
+def invalid_players(state):
+    # the ids of the players in a state with a value that can't be packed, such as a value of the wrong type
+    invalid = []
+    for player_id, values in state['players'].items():
+        try:
+            PLAYER_CHANGES.pack(player_id, ALL_PLAYER_FIELDS)
+            PLAYER_SCHEMA.pack_changed(values, ALL_PLAYER_FIELDS)
+            pack_string(values[-1])
+        except (ValueError, StructError):
+            invalid.append(player_id)
+    return invalid
+
+
+def game_state(game):
+    # the game as the values that are sent, so snapshots can be compared to find what changed
+    # lists of items are made first as other threads can add to the game while this runs
+    state = {"header": (game['active'], to_milliseconds(game['game time']), to_milliseconds(game['score time']),
+                        len(game['players']), game['current map']),
+             "players": {},
+             "items": {},
+             "bullets": {}
+             }
+    for player_id, player in list(game['players'].items()):
+        values = PLAYER_SCHEMA.values(player)
+        values.append(player.username)
+        state['players'][player_id] = tuple(values)
+    state['items'] = item_states(game['items'])
+    state['bullets'] = bullet_states(game['bullets'])
+    return state
+
+
+def item_states(items):
+    # item id to the values that are sent
+    return dict([(item_id, (item_data[0], ITEM_INDEXES[item_data[1]], ITEM_INDEXES[item_data[2]]))
+                 for item_id, item_data in list(items.items())])
+
+
+def bullet_states(bullets):
+    # bullet id to the values that are sent
+    if not isinstance(bullets, dict):
+        # the server keeps its bullets in a BulletStore, which rounds all of them at once
+        return bullets.states()
+    states = {}
+    for bullet_id, (pos, angle, owner_player_id) in list(bullets.items()):
+        x, y = to_position(pos)
+        states[bullet_id] = (x, y, to_angle(angle), owner_player_id)
+    return states
+
+
+def freeze_state(state):
+    # a state that can't be changed, so every thread can read it at the same time without a lock or a copy
+    return MappingProxyType(dict([(key, MappingProxyType(value) if isinstance(value, dict) else value)
+                                  for key, value in state.items()]))
+
+
+def state_game(state):
+    # turn the values of a snapshot back into the game
+    if state['header'] is None:
+        raise ValueError("Invalid Message: The Snapshot Has No Game Data")
+    active, game_time, score_time, player_count, current_map = state['header']
+    game = {"players": {},
+            "current map": current_map,
+            "game time": from_milliseconds(game_time),
+            "score time": from_milliseconds(score_time),
+            "player count": player_count,
+            "items": {},
+            "bullets": {},
+            "active": active
+            }
+    for player_id, values in state['players'].items():
+        player = NetPlayer(player_id)
+        PLAYER_SCHEMA.set_values(player, values)
+        player.username = values[-1]
+        game['players'][player_id] = player
+    try:
+        for item_id, (active, spawn_type, current_item) in state['items'].items():
+            game['items'][item_id] = [active, ITEM_NAMES[spawn_type], ITEM_NAMES[current_item]]
+    except IndexError:
+        raise ValueError("Invalid Message: An Item Has An Index With No Item")
+    # the same as from_position and from_angle, without calling them for every bullet
+    for bullet_id, (x, y, angle, owner_player_id) in state['bullets'].items():
+        game['bullets'][bullet_id] = [Vec(x / POSITION_SCALE, y / POSITION_SCALE), angle / ANGLE_SCALE,
+                                      owner_player_id]
+    return game
+
+
+def pack_records(record_struct, records):
+    # items or bullets and their ids, starting with how many there are
+    # all of them are packed at once instead of one at a time
+    values = []
+    for record_id, record in records:
+        values.append(record_id)
+        values.extend(record)
+    return COUNT.pack(len(records)) + pack("!" + record_struct.format[1:] * len(records), *values)
+
+
+def unpack_records(record_struct, data, offset):
+    # the items or bullets packed by pack_records, and where they end
+    count = COUNT.unpack_from(data, offset)[0]
+    offset += COUNT.size
+    end = offset + count * record_struct.size
+    if end > len(data):
+        raise ValueError("Invalid Message: The Records Go Past The End Of The Message")
+    return record_struct.iter_unpack(data[offset:end]), end
+
+
+def pack_removed(old_entities, new_entities, fmt):
+    return pack_ids([entity_id for entity_id in old_entities if entity_id not in new_entities], fmt)
+
+
+def pack_player_changes(player_id, values, mask):
+    player_changes = PLAYER_CHANGES.pack(player_id, mask) + PLAYER_SCHEMA.pack_changed(values, mask)
+    if mask & USERNAME_FIELD:
+        player_changes += pack_string(values[-1])
+    return player_changes
+
+
+def encode_snapshot(tick, base_tick, base_state, state, server_time=0):
+    # only what changed since the base snapshot is sent, a keyframe is sent against the empty state
+    parts = [MESSAGE_TYPE.pack(SNAPSHOT_MESSAGE), SNAPSHOT_TICKS.pack(tick, base_tick, server_time)]
+
+    # the game header
+    if state['header'] != base_state['header']:
+        active, game_time, score_time, player_count, current_map = state['header']
+        parts.append(CHANGED.pack(True))
+        parts.append(GAME_HEADER.pack(active, game_time, score_time, player_count))
+        parts.append(pack_string(current_map))
+    else:
+        parts.append(CHANGED.pack(False))
+
+    # players only send the fields that changed
+    changed = []
+    base_players = base_state['players']
+    for player_id, values in state['players'].items():
+        base_values = base_players.get(player_id)
+        if base_values is None:
+            mask = ALL_PLAYER_FIELDS
+        else:
+            mask = PLAYER_SCHEMA.changed_mask(base_values, values)
+            if base_values[-1] != values[-1]:
+                mask |= USERNAME_FIELD
+        if mask:
+            changed.append(pack_player_changes(player_id, values, mask))
+    parts.append(COUNT.pack(len(changed)))
+    parts.extend(changed)
+    parts.append(pack_removed(base_players, state['players'], "I"))
+
+    # items and bullets are small, so all of an item or bullet is sent if any of it changed
+    base_items = base_state['items']
+    parts.append(pack_records(ITEM, [(item_id, values) for item_id, values in state['items'].items()
+                                     if base_items.get(item_id) != values]))
+    parts.append(pack_removed(base_items, state['items'], "H"))
+    base_bullets = base_state['bullets']
+    parts.append(pack_records(BULLET, [(bullet_id, values) for bullet_id, values in state['bullets'].items()
+                                       if base_bullets.get(bullet_id) != values]))
+    parts.append(pack_removed(base_bullets, state['bullets'], "I"))
+    return b"".join(parts)
+
+
+def encode_game(game):
+    # a whole game as a keyframe, the same as encode_snapshot(0, NO_BASE, EMPTY_STATE, game_state(game))
+    # everything is sent, so it is packed straight from the game instead of making its state to compare first
+    players = list(game['players'].items())
+    parts = [KEYFRAME_START,
+             GAME_HEADER.pack(game['active'], to_milliseconds(game['game time']), to_milliseconds(game['score time']),
+                              len(players)),
+             pack_string(game['current map']), COUNT.pack(len(players))]
+    for player_id, player in players:
+        parts.append(PLAYER_CHANGES.pack(player_id, ALL_PLAYER_FIELDS))
+        parts.append(PLAYER_SCHEMA.pack(player))
+        parts.append(pack_string(player.username))
+    parts.append(NO_IDS)
+    items = list(game['items'].items())
+    parts.append(COUNT.pack(len(items)))
+    parts.extend([ITEM.pack(item_id, item_data[0], ITEM_INDEXES[item_data[1]], ITEM_INDEXES[item_data[2]])
+                  for item_id, item_data in items])
+    parts.append(NO_IDS)
+    parts.append(pack_bullets(game['bullets']))
+    parts.append(NO_IDS)
+    return b"".join(parts)
+
+
+def pack_bullets(bullets):
+    # every bullet of a game, starting with how many there are
+    if not isinstance(bullets, dict):
+        return pack_records(BULLET, list(bullets.states().items()))
+    if not bullets:
+        return NO_IDS
+    # rounded all at once the same way as to_position and to_angle, as there can be many more bullets than players
+    bullets = list(bullets.items())
+    values = np.array([(pos.x, pos.y, angle, owner_player_id)
+                       for bullet_id, (pos, angle, owner_player_id) in bullets]).reshape(-1, 4)
+    records = np.empty(len(bullets), BULLET_RECORD)
+    records['bullet_id'] = [bullet_id for bullet_id, bullet_data in bullets]
+    records['x'] = np.clip(np.rint(values[:, 0] * POSITION_SCALE), POSITION_MIN, POSITION_MAX)
+    records['y'] = np.clip(np.rint(values[:, 1] * POSITION_SCALE), POSITION_MIN, POSITION_MAX)
+    records['angle'] = np.rint(values[:, 2] % 360 * ANGLE_SCALE).astype(np.int64) & 0xFFFF
+    records['owner'] = values[:, 3]
+    return COUNT.pack(len(bullets)) + records.tobytes()
+
+
+def snapshot_ticks(data):
+    # the tick of a snapshot, the tick of the snapshot it has the changes since, and when it was made
+    try:
+        if MESSAGE_TYPE.unpack_from(data, 0)[0] != SNAPSHOT_MESSAGE:
+            raise ValueError("Invalid Message: Expected A Snapshot")
+        return SNAPSHOT_TICKS.unpack_from(data, MESSAGE_TYPE.size)
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def decode_snapshot(data, base_state):
+    # apply the changes in a snapshot to the base snapshot, the base snapshot is not changed
+    try:
+        offset = MESSAGE_TYPE.size + SNAPSHOT_TICKS.size
+
+        # the game header
+        header = base_state['header']
+        if CHANGED.unpack_from(data, offset)[0]:
+            active, game_time, score_time, player_count = GAME_HEADER.unpack_from(data, offset + CHANGED.size)
+            current_map, offset = unpack_string(data, offset + CHANGED.size + GAME_HEADER.size)
+            header = (active, game_time, score_time, player_count, current_map)
+        else:
+            offset += CHANGED.size
+
+        # players
+        players = dict(base_state['players'])
+        count = COUNT.unpack_from(data, offset)[0]
+        offset += COUNT.size
+        for i in range(count):
+            player_id, mask = PLAYER_CHANGES.unpack_from(data, offset)
+            offset += PLAYER_CHANGES.size
+            # every field is sent, so there are no values to start from
+            if mask & ALL_PLAYER_FIELDS == ALL_PLAYER_FIELDS:
+                values = PLAYER_SCHEMA.struct.unpack_from(data, offset)
+                username, offset = unpack_string(data, offset + PLAYER_SCHEMA.size)
+                players[player_id] = values + (username,)
+                continue
+            # a new player starts with the values of a new net player, with its own id as the first value
+            if player_id in players:
+                values = list(players[player_id])
+            else:
+                values = list(NEW_PLAYER_VALUES)
+                values[0] = player_id
+            offset = PLAYER_SCHEMA.unpack_changed(values, data, offset, mask)
+            if mask & USERNAME_FIELD:
+                values[-1], offset = unpack_string(data, offset)
+            players[player_id] = tuple(values)
+        removed, offset = unpack_ids(data, offset, "I")
+        for player_id in removed:
+            players.pop(player_id, None)
+
+        # items and bullets are fixed width, so they are unpacked all at once
+        items = dict(base_state['items'])
+        records, offset = unpack_records(ITEM, data, offset)
+        for item_id, active, spawn_type, current_item in records:
+            items[item_id] = (active, spawn_type, current_item)
+        removed, offset = unpack_ids(data, offset, "H")
+        for item_id in removed:
+            items.pop(item_id, None)
+        bullets = dict(base_state['bullets'])
+        records, offset = unpack_records(BULLET, data, offset)
+        for bullet_id, x, y, angle, owner_player_id in records:
+            bullets[bullet_id] = (x, y, angle, owner_player_id)
+        removed, offset = unpack_ids(data, offset, "I")
+        for bullet_id in removed:
+            bullets.pop(bullet_id, None)
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+    return {"header": header, "players": players, "items": items, "bullets": bullets}
+
+
+def unpack_bullets(data, offset):
+    # every bullet of a game and the offset after them, turned back into pixels and degrees all at once
+    count = COUNT.unpack_from(data, offset)[0]
+    offset += COUNT.size
+    if not count:
+        return {}, offset
+    end = offset + count * BULLET.size
+    if end > len(data):
+        raise ValueError("Invalid Message: The Records Go Past The End Of The Message")
+    records = np.frombuffer(data, BULLET_RECORD, count, offset)
+    bullets = dict([(bullet_id, [Vec(x, y), angle, owner_player_id])
+                    for bullet_id, x, y, angle, owner_player_id in zip(records['bullet_id'].tolist(),
+                                                                       (records['x'] / POSITION_SCALE).tolist(),
+                                                                       (records['y'] / POSITION_SCALE).tolist(),
+                                                                       (records['angle'] / ANGLE_SCALE).tolist(),
+                                                                       records['owner'].tolist())])
+    return bullets, end
+
+
+def decode_game(data):
+    # a keyframe turned straight into the game, the same as state_game(decode_snapshot(data, EMPTY_STATE))
+    try:
+        offset = MESSAGE_TYPE.size + SNAPSHOT_TICKS.size
+        if not CHANGED.unpack_from(data, offset)[0]:
+            raise ValueError("Invalid Message: The Snapshot Has No Game Data")
+        active, game_time, score_time, player_count = GAME_HEADER.unpack_from(data, offset + CHANGED.size)
+        current_map, offset = unpack_string(data, offset + CHANGED.size + GAME_HEADER.size)
+        game = {"players": {},
+                "current map": current_map,
+                "game time": from_milliseconds(game_time),
+                "score time": from_milliseconds(score_time),
+                "player count": player_count,
+                "items": {},
+                "bullets": {},
+                "active": active
+                }
+
+        players = game['players']
+        count = COUNT.unpack_from(data, offset)[0]
+        offset += COUNT.size
+        for i in range(count):
+            player_id, mask = PLAYER_CHANGES.unpack_from(data, offset)
+            offset += PLAYER_CHANGES.size
+            player = NetPlayer(player_id)
+            if mask & ALL_PLAYER_FIELDS == ALL_PLAYER_FIELDS:
+                offset = PLAYER_SCHEMA.unpack_into(player, data, offset)
+            else:
+                # the fields that aren't sent keep the values of a new net player
+                values = PLAYER_SCHEMA.values(player)
+                offset = PLAYER_SCHEMA.unpack_changed(values, data, offset, mask)
+                PLAYER_SCHEMA.set_values(player, values)
+            if mask & USERNAME_FIELD:
+                player.username, offset = unpack_string(data, offset)
+            players[player_id] = player
+        removed, offset = unpack_ids(data, offset, "I")
+        for player_id in removed:
+            players.pop(player_id, None)
+
+        items = game['items']
+        records, offset = unpack_records(ITEM, data, offset)
+        for item_id, active, spawn_type, current_item in records:
+            items[item_id] = [active, ITEM_NAMES[spawn_type], ITEM_NAMES[current_item]]
+        removed, offset = unpack_ids(data, offset, "H")
+        for item_id in removed:
+            items.pop(item_id, None)
+        bullets, offset = unpack_bullets(data, offset)
+        game['bullets'] = bullets
+        removed, offset = unpack_ids(data, offset, "I")
+        for bullet_id in removed:
+            bullets.pop(bullet_id, None)
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+    except IndexError:
+        raise ValueError("Invalid Message: An Item Has An Index With No Item")
+    return game
+
+
+def encode_update(player, ack):
+    # what the client's player did this frame, and the latest snapshot the client received
+    return MESSAGE_TYPE.pack(UPDATE_MESSAGE) + pack_command(player) + ACK.pack(ack)
+
+
+def update_ack(data):
+    # the ack is at the end of an update, so it can be read without decoding the command
+    try:
+        if MESSAGE_TYPE.unpack_from(data, 0)[0] != UPDATE_MESSAGE:
+            raise ValueError("Invalid Message: Expected An Update")
+        return ACK.unpack_from(data, len(data) - ACK.size)[0]
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def decode_update(data):
+    try:
+        if MESSAGE_TYPE.unpack_from(data, 0)[0] != UPDATE_MESSAGE:
+            raise ValueError("Invalid Message: Expected An Update")
+        command, offset = unpack_command(data, MESSAGE_TYPE.size)
+        return command, ACK.unpack_from(data, offset)[0]
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def message_type(data):
+    try:
+        return MESSAGE_TYPE.unpack_from(data, 0)[0]
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def encode_state(player, token, sequence, ack, sent_time):
+    # the command of the client's player sent over udp, which can be lost or arrive out of order
+    return (MESSAGE_TYPE.pack(STATE_MESSAGE) + STATE_HEADER.pack(player.player_id, token, sequence, ack, sent_time)
+            + pack_command(player))
+
+
+def state_header(data):
+    # [0] is the player id, [1] is the session token, [2] is the sequence number, [3] is the ack, [4] is the time sent
+    try:
+        if MESSAGE_TYPE.unpack_from(data, 0)[0] != STATE_MESSAGE:
+            raise ValueError("Invalid Message: Expected A State")
+        return STATE_HEADER.unpack_from(data, MESSAGE_TYPE.size)
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def decode_state(data):
+    header = state_header(data)
+    try:
+        command, offset = unpack_command(data, MESSAGE_TYPE.size + STATE_HEADER.size)
+        return header, command
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def encode_events(overwrites):
+    # the data the server has to process, sent over tcp when the player's state is sent over udp
+    return MESSAGE_TYPE.pack(EVENTS_MESSAGE) + pack_overwrites(overwrites)
+
+
+def decode_events(data):
+    overwrites = NetPlayer(0).overwrites
+    try:
+        unpack_overwrites(overwrites, data, MESSAGE_TYPE.size)
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+    return overwrites
+
+
+def pack_attributes(message_type, values, mask):
+    message = MESSAGE_TYPE.pack(message_type) + OVERRIDE_MASK.pack(mask) + PLAYER_SCHEMA.pack_changed(values, mask)
+    if mask & USERNAME_FIELD:
+        message += pack_string(values[-1])
+    return message
+
+
+def unpack_attributes(data):
+    # the attributes in the mask of an override or profile, and their values
+    try:
+        mask = OVERRIDE_MASK.unpack_from(data, MESSAGE_TYPE.size)[0]
+        values = list(NEW_PLAYER_VALUES)
+        offset = PLAYER_SCHEMA.unpack_changed(values, data, MESSAGE_TYPE.size + OVERRIDE_MASK.size, mask)
+        attributes = PLAYER_SCHEMA.attributes(values, mask)
+        if mask & USERNAME_FIELD:
+            attributes['username'] = unpack_string(data, offset)[0]
+        return attributes
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def encode_override(player, attributes):
+    # attributes of the client's player the server changed, with their values from the player
+    # the input sequence is always sent, so the client knows which of its own states the changes were made to
+    mask = PLAYER_SCHEMA.attribute_mask(list(attributes) + ["input_sequence"])
+    if "username" in attributes:
+        mask |= USERNAME_FIELD
+    return pack_attributes(OVERRIDE_MESSAGE, PLAYER_SCHEMA.values(player) + [player.username], mask)
+
+
+def decode_override(data):
+    return unpack_attributes(data)
+
+
+def encode_profile(player, base_values):
+    # the slowly changing fields of the client's player that changed since the base values, sent over tcp
+    # returns None if none changed, and the values to compare the next profile to
+    values = PLAYER_SCHEMA.values(player) + [player.username]
+    if base_values is None:
+        mask = PROFILE_FIELDS
+    else:
+        mask = PLAYER_SCHEMA.changed_mask(base_values, values) & PROFILE_FIELDS
+        if base_values[-1] != values[-1]:
+            mask |= USERNAME_FIELD
+    if not mask:
+        return None, values
+    return pack_attributes(PROFILE_MESSAGE, values, mask), values
+
+
+def decode_profile(data):
+    # a client can only send the fields of a profile, never its player id
+    attributes = unpack_attributes(data)
+    for attribute in NOT_PROFILE:
+        attributes.pop(attribute, None)
+    return attributes
+
+
+def encode_ping(sent_time):
+    # measures the round trip time over tcp, udp uses the time sent with every state instead
+    return MESSAGE_TYPE.pack(PING_MESSAGE) + PING.pack(sent_time)
+
+
+def decode_ping(data):
+    try:
+        return PING.unpack_from(data, MESSAGE_TYPE.size)[0]
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def encode_leave():
+    # the client is quitting, so the server removes its player instead of keeping it to be resumed
+    return MESSAGE_TYPE.pack(LEAVE_MESSAGE)
+
+
+def encode_join(player, compressions, room=ANY_ROOM, resume_token=NO_SESSION):
+    # the player chosen at the main menu, the compressions the client has, the room it wants to play in,
+    # and the token of the session to resume after losing the connection
+    return MESSAGE_TYPE.pack(JOIN_MESSAGE) + pack_player(player) + JOIN.pack(compressions, room, resume_token)
+
+
+def decode_join(data):
+    try:
+        if MESSAGE_TYPE.unpack_from(data, 0)[0] != JOIN_MESSAGE:
+            raise ValueError("Invalid Message: Expected A Join")
+        player, offset = unpack_player(data, MESSAGE_TYPE.size)
+        compressions, room, resume_token = JOIN.unpack_from(data, offset)
+        return player, compressions, room, resume_token
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+
+
+def encode(message):
+    # choose how to encode the message by what it is
+    if isinstance(message, NetPlayer):
+        return MESSAGE_TYPE.pack(PLAYER_MESSAGE) + pack_player(message) + pack_overwrites(message.overwrites)
+    elif isinstance(message, tuple):
+        # message[0] is if the client was verified, message[1] is the reason it was not, message[2] is the token,
+        # message[3] is the compression chosen, message[4] is the room, message[5] is the udp port
+        return (MESSAGE_TYPE.pack(VERIFY_MESSAGE) + VERIFY.pack(message[0], message[2], message[3], message[4],
+                                                                message[5])
+                + pack_string(message[1]))
+    elif isinstance(message, dict):
+        # a whole game is sent as a keyframe
+        return encode_game(message)
+    raise TypeError(f"Cannot Encode A Message Of Type {type(message).__name__}")
+
+
+def decode(data):
+    # decoding never runs code from the message, anything invalid raises a ValueError
+    try:
+        message_type = MESSAGE_TYPE.unpack_from(data, 0)[0]
+        offset = MESSAGE_TYPE.size
+        if message_type == PLAYER_MESSAGE:
+            player, offset = unpack_player(data, offset)
+            unpack_overwrites(player.overwrites, data, offset)
+            return player
+        elif message_type == VERIFY_MESSAGE:
+            verify, token, compression, room, udp_port = VERIFY.unpack_from(data, offset)
+            reason, offset = unpack_string(data, offset + VERIFY.size)
+            return verify, reason, token, compression, room, udp_port
+        elif message_type == SNAPSHOT_MESSAGE:
+            if snapshot_ticks(data)[1] != NO_BASE:
+                raise ValueError("Invalid Message: Only Keyframes Can Be Decoded Without A Base Snapshot")
+            return decode_game(data)
+    except StructError as e:
+        raise ValueError(f"Invalid Message: {e}")
+    raise ValueError(f"Invalid Message: Unknown Message Type {message_type}")
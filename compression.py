@@ -0,0 +1,100 @@
+import zlib
+from time import perf_counter
+from settings import *
+
+# lz4 is faster than zlib but compresses less, it is only used if it is installed on both sides
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+# each compression is a bit, so the client can send every compression it has in one byte
+NO_COMPRESSION = 0
+ZLIB_COMPRESSION = 1
+LZ4_COMPRESSION = 2
+COMPRESSION_NAMES = {NO_COMPRESSION: "None", ZLIB_COMPRESSION: "zlib", LZ4_COMPRESSION: "lz4"}
+
+
+def supported_compressions():
+    if not USE_COMPRESSION:
+        return NO_COMPRESSION
+    compressions = ZLIB_COMPRESSION
+    if lz4 is not None:
+        compressions |= LZ4_COMPRESSION
+    return compressions
+
+
+def choose_compression(client_compressions):
+    # the fastest compression both sides have
+    compressions = supported_compressions() & client_compressions
+    if compressions & LZ4_COMPRESSION:
+        return LZ4_COMPRESSION
+    elif compressions & ZLIB_COMPRESSION:
+        return ZLIB_COMPRESSION
+    return NO_COMPRESSION
+
+
+class Compressor:
+    def __init__(self, compression):
+        # compresses the messages of one connection, and keeps track of how well it works
+        self.compression = compression
+        self.name = COMPRESSION_NAMES[compression]
+        self.messages = 0
+        self.compressed_messages = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.compress_time = 0.0  # in seconds
+        self.decompress_time = 0.0  # in seconds
+
+    def compress(self, message):
+        # returns if the message was compressed and the message to send
+        # small messages are sent as they are, since compressing them saves little or makes them larger
+        self.messages += 1
+        self.raw_bytes += len(message)
+        if self.compression != NO_COMPRESSION and len(message) >= COMPRESSION_THRESHOLD:
+            start_time = perf_counter()
+            if self.compression == LZ4_COMPRESSION:
+                compressed = lz4.block.compress(message, store_size=True)
+            else:
+                compressed = zlib.compress(message, COMPRESSION_LEVEL)
+            self.compress_time += perf_counter() - start_time
+            if len(compressed) < len(message):
+                self.compressed_messages += 1
+                self.sent_bytes += len(compressed)
+                return True, compressed
+        self.sent_bytes += len(message)
+        return False, message
+
+    def decompress(self, data):
+        start_time = perf_counter()
+        try:
+            if self.compression == LZ4_COMPRESSION:
+                # the size of the message is stored first, check it before the space for it is made
+                if len(data) < 4 or int.from_bytes(data[:4], "little") > MAX_MESSAGE_SIZE:
+                    raise ValueError(f"Message Is Too Large (Over {MAX_MESSAGE_SIZE} Bytes)")
+                message = lz4.block.decompress(data)
+            elif self.compression == ZLIB_COMPRESSION:
+                decompressor = zlib.decompressobj()
+                message = decompressor.decompress(data, MAX_MESSAGE_SIZE)
+                if decompressor.unconsumed_tail:
+                    raise ValueError(f"Message Is Too Large (Over {MAX_MESSAGE_SIZE} Bytes)")
+            else:
+                raise ValueError("Invalid Message: Compressed Without A Compression Chosen")
+        except (zlib.error, RuntimeError) as e:
+            # lz4 raises a RuntimeError for invalid data
+            raise ValueError(f"Invalid Message: {e}")
+        self.decompress_time += perf_counter() - start_time
+        if len(message) > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Message Is Too Large ({len(message)}/{MAX_MESSAGE_SIZE} Bytes)")
+        return message
+
+    def ratio(self):
+        # how many times smaller the messages sent are than the messages before compression
+        if not self.sent_bytes:
+            return 1.0
+        return self.raw_bytes / self.sent_bytes
+
+    def stats(self):
+        return (f"Compression: {self.name} - Messages: {self.compressed_messages}/{self.messages} Compressed - "
+                f"Ratio: {self.ratio():.2f} - Compress Time: {self.compress_time * 1000:.1f} ms - "
+                f"Decompress Time: {self.decompress_time * 1000:.1f} ms")
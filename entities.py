@@ -1,4 +1,5 @@
 from random import choice, randint
+from collections import deque
 from itertools import chain
 from pytweening import easeInOutSine
 import pygame as pg
@@ -7,6 +8,14 @@ from pygame.math import Vector2 as Vec
 from settings import *
 
 
+# changes from the server to these attributes keep what the client changed since, such as ammo used on shots
+RECONCILE_COUNTERS = ("ammo", "kills", "deaths", "score")
+# changes from the server to these attributes replay the client's movement since
+RECONCILE_MOVEMENT = ("pos", "rot", "frozen")
+# no keys pressed, used when the player can't move
+NO_INPUT = (False, False, False, False, False)
+
+
 def update_net_object(old_player, new_player):
     # change all of the old player's attributes to match the corresponding attribute in the new player
     for attr in new_player.__dict__:
@@ -72,6 +81,10 @@ class NetPlayer:
         self.current_crash_time = False
         self.current_respawn_time = False
         self.power_invincible = False
+        # counts every frame the client has moved the player, so changes from the server can be lined up with them
+        self.input_sequence = 0
+        # the keys the client held on its latest frame, sent every frame instead of the whole player
+        self.keys = NO_INPUT
         # data for server to process
         self.overwrites = {"collisions": [],  # the player collided with a player should should be killed
                            "items": [],  # the player picked up an item
@@ -119,6 +132,11 @@ class SpritePlayer(pg.sprite.Sprite):
         self.current_crash_time = net_player.current_crash_time
         self.power_invincible = False
         self.power_time = False
+        # the client's own movement, to replay after the server changes the player
+        # [0] is the input sequence, [1] is the keys pressed, [2] is the frame time, [3] is the state after moving
+        self.input_sequence = net_player.input_sequence
+        self.input_history = deque(maxlen=INPUT_HISTORY)
+        self.keys = NO_INPUT
         # keep track of which players the client has killed recently to not send multiple kill messages to the server
         self.recent_collisions = dict([(player_id, False) for player_id in client.player_ids])
         # data for the server to process
@@ -185,6 +203,11 @@ class SpritePlayer(pg.sprite.Sprite):
         net_player = self.client.game['players'][self.player_id]
         # overwrite attributes
         update_net_object(self, net_player)
+        # show other players between the snapshots received, so they move smoothly even when snapshots arrive unevenly
+        if self.player_id != self.client.player_id:
+            pose = self.client.network.interpolation.player_pose(self.player_id)
+            if pose is not None:
+                self.pos, self.rot = pose
         # change the image to match the new data
         self.update_image()
         # change client username to match received username from net player
@@ -192,9 +215,11 @@ class SpritePlayer(pg.sprite.Sprite):
             self.client.username = self.username
 
     def update(self):
-        # remove the player if they have disconnected from the server
+        # remove the player if they have disconnected from the server, or are too far away to be sent
         if self.player_id not in self.client.game['players']:
             self.kill()
+            # the player gets a new sprite if they are sent again
+            self.client.player_ids.remove(self.player_id)
         # if they are still connected, update
         else:
             # update the sprite with the latest data
@@ -210,20 +235,25 @@ class SpritePlayer(pg.sprite.Sprite):
                 bullet_data = [Vec(self.pos.x, self.pos.y), self.rot + shoot_angle, self.player_id]
                 self.overwrites['new bullets'].append(bullet_data)
 
-    def apply_keys(self):
-        # get key presses
+    def read_keys(self):
+        # get key presses, as left, right, forward, backward, and shoot
         keys = pg.key.get_pressed()
+        return (bool(keys[K_a] or keys[K_LEFT]), bool(keys[K_d] or keys[K_RIGHT]), bool(keys[K_w] or keys[K_UP]),
+                bool(keys[K_s] or keys[K_DOWN]), bool(keys[K_SPACE]))
+
+    def apply_keys(self, player_input):
+        left, right, forward, backward, shoot = player_input
 
         # apply key presses
-        if keys[K_a] or keys[K_LEFT]:
+        if left:
             self.rot_acc = PLAYER_ROT_ACC
-        if keys[K_d] or keys[K_RIGHT]:
+        if right:
             self.rot_acc = -PLAYER_ROT_ACC
-        if keys[K_w] or keys[K_UP]:
+        if forward:
             self.acc = Vec(PLAYER_ACC, 0).rotate(-self.rot)
-        if keys[K_s] or keys[K_DOWN]:
+        if backward:
             self.acc = Vec(-PLAYER_ACC / 3, 0).rotate(-self.rot)
-        if keys[K_SPACE]:
+        if shoot:
             self.shoot()
 
         # move faster during power mode
@@ -336,15 +366,10 @@ class SpritePlayer(pg.sprite.Sprite):
         # test for collision
         hits = pg.sprite.spritecollide(self, self.client.bullets, False, collide_hit_rect_both)
         for hit in hits:
-            # only count as a kill if it wasn't a bullet made by the client player
+            # bullets made by the client player don't hit it
             if hit.owner_player_id != self.player_id:
-                # destroy the bullet
-                self.overwrites['kill bullets'].append(hit.bullet_id)
+                # hide the bullet, the server removes it and tells the client if its player was destroyed
                 hit.kill()
-                # only count it as a kill if the player can be legally killed
-                if not self.power_invincible and self.current_crash_time is False and self.current_respawn_time is False:
-                    # destroy the player
-                    self.destroy_player(hit.owner_player_id)
 
     def destroy_player(self, killed_by_player_id):
         self.overwrites['deaths by'].append(killed_by_player_id)
@@ -359,6 +384,10 @@ class SpritePlayer(pg.sprite.Sprite):
         self.recent_collisions = dict([(player_id, False) for player_id in self.client.player_ids])
 
     def update_client(self):
+        # a new frame of movement
+        self.input_sequence += 1
+        player_input = NO_INPUT
+
         # new game respawn
         if self.client.new_game:
             self.new_game_player_reset()
@@ -388,7 +417,8 @@ class SpritePlayer(pg.sprite.Sprite):
         # if the player isn't crashed, they can move
         if self.crash_time is False:
             # update the players velocity with key presses
-            self.apply_keys()
+            player_input = self.read_keys()
+            self.apply_keys(player_input)
         # if they are crashed, respawn after they have stayed crashed long enough
         else:
             self.current_crash_time = pg.time.get_ticks() - self.crash_time
@@ -407,6 +437,33 @@ class SpritePlayer(pg.sprite.Sprite):
                 self.power_invincible = False
                 self.power_time = False
 
+        old_pos = self.move(self.client.dt)
+
+        # reset hit rect for player hit detection
+        self.hit_rect.center = (old_pos.x, old_pos.y)
+        # player hits collision detection
+        self.hit_rect.centerx = self.pos.x
+        self.player_hit("x")
+        self.hit_rect.centery = self.pos.y
+        self.player_hit("y")
+        # match the sprite's rect with where it should be based on the hit rect
+        self.rect.center = self.hit_rect.center
+
+        # if two players crash into each other
+        self.player_collisions()
+        # player gets item
+        self.item_collisions()
+        # bullet collisions
+        self.bullet_collisions()
+
+        # remember this frame, to replay it if the server changes the player
+        self.input_history.append([self.input_sequence, player_input, self.client.dt, self.movement_state()])
+        self.keys = player_input
+
+        # update the image with the correct positioning
+        self.update_image()
+
+    def move(self, dt):
         # move the sprite player, if there are no restrictions in place (such as being frozen)
         if not self.frozen:
             # change position
@@ -416,11 +473,11 @@ class SpritePlayer(pg.sprite.Sprite):
 
             # new velocity after
             # vf = vi + at
-            self.vel = self.vel + self.acc * self.client.dt
+            self.vel = self.vel + self.acc * dt
 
             # displacement
             # d = vit + 1/2at^2
-            displacement = self.vel * self.client.dt + 0.5 * self.acc * self.client.dt ** 2
+            displacement = self.vel * dt + 0.5 * self.acc * dt ** 2
             self.pos += displacement
 
             # change image
@@ -429,11 +486,11 @@ class SpritePlayer(pg.sprite.Sprite):
             self.rot_acc += self.rot_vel * self.apply_friction("rot")
 
             # new velocity after
-            self.rot_vel = self.rot_vel + self.rot_acc * self.client.dt
+            self.rot_vel = self.rot_vel + self.rot_acc * dt
 
             # displacement
-            rot_displacement = self.rot_vel * self.client.dt + 0.5 * self.rot_acc * self.client.dt ** 2
-            self.rot += rot_displacement % 360
+            rot_displacement = self.rot_vel * dt + 0.5 * self.rot_acc * dt ** 2
+            self.rot = (self.rot + rot_displacement) % 360
 
         # save pos for doing hit rect on players
         old_pos = Vec(self.pos.x, self.pos.y)
@@ -445,26 +502,53 @@ class SpritePlayer(pg.sprite.Sprite):
         collide_group(self, self.client.walls, "y")
         # match the sprite's rect with where it should be based on the hit rect
         self.rect.center = self.hit_rect.center
+        return old_pos
+
+    def movement_state(self):
+        state = dict([(attr, getattr(self, attr)) for attr in RECONCILE_COUNTERS])
+        state['pos'] = Vec(self.pos.x, self.pos.y)
+        state['vel'] = Vec(self.vel.x, self.vel.y)
+        state['rot'] = self.rot
+        state['rot_vel'] = self.rot_vel
+        return state
+
+    def reconcile(self, corrections):
+        # apply changes from the server, each made to the player as it was at one of the client's input sequences
+        for input_sequence, attributes in corrections:
+            # the state the client had at that input sequence, if it is still remembered
+            history_index = None
+            if self.input_history:
+                history_index = input_sequence - self.input_history[0][0]
+                if not 0 <= history_index < len(self.input_history):
+                    history_index = None
+            if history_index is None:
+                # too old to line up, so just take the server's values
+                for attr, value in attributes.items():
+                    setattr(self, attr, value)
+                continue
+
+            state = self.input_history[history_index][3]
+            for attr, value in attributes.items():
+                if attr in RECONCILE_COUNTERS:
+                    # keep what the client changed after that input sequence
+                    value += getattr(self, attr) - state[attr]
+                if attr not in ("pos", "rot"):
+                    setattr(self, attr, value)
+
+            # move from the corrected state again with every frame of keys pressed since
+            if any(attr in attributes for attr in RECONCILE_MOVEMENT):
+                self.pos = Vec(attributes.get("pos", state['pos']))
+                self.rot = attributes.get("rot", state['rot'])
+                self.vel = Vec(state['vel'])
+                self.rot_vel = state['rot_vel']
+                for frame in list(self.input_history)[history_index + 1:]:
+                    self.acc = Vec(0, 0)
+                    self.rot_acc = 0
+                    # replayed frames never shoot again
+                    self.apply_keys(frame[1][:4] + (False,))
+                    self.move(frame[2])
+                    frame[3] = self.movement_state()
 
-        # reset hit rect for player hit detection
-        self.hit_rect.center = (old_pos.x, old_pos.y)
-        # player hits collision detection
-        self.hit_rect.centerx = self.pos.x
-        self.player_hit("x")
-        self.hit_rect.centery = self.pos.y
-        self.player_hit("y")
-        # match the sprite's rect with where it should be based on the hit rect
-        self.rect.center = self.hit_rect.center
-
-        # if two players crash into each other
-        self.player_collisions()
-        # player gets item
-        self.item_collisions()
-        # bullet collisions
-        self.bullet_collisions()
-
-        # update the image with the correct positioning
-        self.update_image()
 
 
 class Obstacle(pg.sprite.Sprite):
@@ -545,14 +629,19 @@ class SpriteBullet(pg.sprite.Sprite):
 
     def update(self):
         # remove the bullet if it no longer exists in the game
+        # the bullet is also not in the game if it is too far away to be sent, then it gets a new sprite if sent again
         if self.bullet_id not in self.client.game['bullets']:
             self.kill()  # there is no need to tell the server to delete it, as it has already been deleted server-side
+            self.client.bullet_ids.remove(self.bullet_id)
         # if the bullet still exists, check if it should be killed
         elif pg.sprite.spritecollideany(self, self.client.walls):
             self.destroy()
         # update the bullet with the latest position
         else:
-            new_pos = self.client.game['bullets'][self.bullet_id][0]
+            # show the bullet between the snapshots received, so it moves smoothly
+            new_pos = self.client.network.interpolation.bullet_pos(self.bullet_id)
+            if new_pos is None:
+                new_pos = self.client.game['bullets'][self.bullet_id][0]
             self.total_distance += self.pos - new_pos
             # kill the bullet if it has moved as far as it can, use squares as it is faster to calculate
             if self.total_distance.length_squared() >= BULLET_RANGE ** 2:
@@ -564,6 +653,5 @@ class SpriteBullet(pg.sprite.Sprite):
                 self.rect.center = self.pos
 
     def destroy(self):
-        # tell the server to delete the sprite if it hits a wall
-        self.client.player.overwrites['kill bullets'].append(self.bullet_id)
+        # hide the bullet once it hits a wall or goes too far, the server removes it from the game by itself
         self.kill()
@@ -0,0 +1,92 @@
+from collections import deque
+from pygame.math import Vector2 as Vec
+from settings import *
+
+
+def lerp_angle(start, end, fraction):
+    # turn the shortest way around, so a ship going from 350 to 10 degrees doesn't spin the other way
+    difference = (end - start + 180) % 360 - 180
+    return start + difference * fraction
+
+
+class InterpolationBuffer:
+    def __init__(self, delay=INTERPOLATION_DELAY, size=INTERPOLATION_BUFFER):
+        # games received from the server by the time they were made on the server, in milliseconds
+        # remote players and bullets are shown a little in the past, between the two snapshots around that time
+        self.delay = delay
+        self.snapshots = deque(maxlen=size)
+        # the time on the server minus the time on the client, smoothed over many snapshots
+        self.offset = None
+        # the two games to show between, and how far between them
+        self.before = None
+        self.after = None
+        self.fraction = 0.0
+
+    def add(self, server_time, local_time, game):
+        offset = server_time - local_time
+        if self.offset is None:
+            self.offset = offset
+        else:
+            self.offset += (offset - self.offset) * CLOCK_SMOOTHING
+        # snapshots are already in order, the network drops older ones
+        self.snapshots.append((server_time, game))
+
+    def clear(self):
+        self.snapshots.clear()
+        self.offset = None
+        self.before = None
+        self.after = None
+
+    def sample(self, local_time):
+        # find the two snapshots around the time to show, should be done once a frame before getting positions
+        if not self.snapshots:
+            return
+        render_time = local_time + self.offset - self.delay
+
+        # not enough snapshots yet, or the time to show is before all of them
+        if len(self.snapshots) == 1 or render_time <= self.snapshots[0][0]:
+            self.before = self.after = self.snapshots[0][1]
+            self.fraction = 0.0
+            return
+
+        # snapshots have stopped arriving, keep moving the way things were moving for a short time
+        if render_time >= self.snapshots[-1][0]:
+            before_time, self.before = self.snapshots[-2]
+            after_time, self.after = self.snapshots[-1]
+            render_time = min(render_time, after_time + MAX_EXTRAPOLATION)
+        else:
+            for index in range(len(self.snapshots) - 1, 0, -1):
+                if self.snapshots[index - 1][0] <= render_time:
+                    before_time, self.before = self.snapshots[index - 1]
+                    after_time, self.after = self.snapshots[index]
+                    break
+        if after_time > before_time:
+            self.fraction = (render_time - before_time) / (after_time - before_time)
+        else:
+            self.fraction = 1.0
+
+    def player_pose(self, player_id):
+        # the position and rotation to show a remote player at, or None if it isn't in the snapshots shown
+        if self.after is None:
+            return None
+        before = self.before['players'].get(player_id)
+        after = self.after['players'].get(player_id)
+        if after is None:
+            return None
+        if before is None or before.pos.distance_squared_to(after.pos) > SNAP_DISTANCE ** 2:
+            return Vec(after.pos), after.rot
+        # the fraction is over 1 when moving past the newest snapshot, so lerp() can't be used
+        pos = before.pos + (after.pos - before.pos) * self.fraction
+        return pos, lerp_angle(before.rot, after.rot, self.fraction)
+
+    def bullet_pos(self, bullet_id):
+        # the position to show a bullet at, or None if it isn't in the snapshots shown
+        if self.after is None:
+            return None
+        before = self.before['bullets'].get(bullet_id)
+        after = self.after['bullets'].get(bullet_id)
+        if after is None:
+            return None
+        if before is None:
+            return Vec(after[0])
+        return before[0] + (after[0] - before[0]) * self.fraction
@@ -0,0 +1,31 @@
+from collections import deque
+from settings import *
+
+
+class JitterBuffer:
+    def __init__(self, depth=JITTER_BUFFER_DEPTH, size=JITTER_BUFFER_SIZE):
+        # commands from a client, played one every tick so commands that arrive unevenly are played evenly
+        self.depth = depth
+        # the oldest command is dropped once it is full
+        self.commands = deque(maxlen=size)
+        # commands are only played once enough have arrived to cover one arriving late
+        self.playing = False
+
+    def add(self, command):
+        self.commands.append(command)
+
+    def next_command(self):
+        # returns None when there is no command to play, the player then stays as it is
+        if not self.playing:
+            if len(self.commands) < self.depth:
+                return None
+            self.playing = True
+        if not self.commands:
+            # the client fell behind, so wait for the buffer to fill up again
+            self.playing = False
+            return None
+        # the client got ahead, so skip to its newer commands instead of staying behind it
+        if len(self.commands) == self.commands.maxlen:
+            while len(self.commands) > self.depth:
+                self.commands.popleft()
+        return self.commands.popleft()
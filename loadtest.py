@@ -0,0 +1,258 @@
+import socket
+import asyncio
+from argparse import ArgumentParser
+from math import cos, sin, radians
+from random import choice, random, uniform
+from time import monotonic
+from pygame.math import Vector2 as Vec
+from codec import (encode_join, encode_update, encode_events, encode_profile, encode_ping, encode_leave, decode,
+                   decode_ping,
+                   decode_override, decode_snapshot, snapshot_ticks, message_type, NO_BASE, EMPTY_STATE, ANY_ROOM,
+                   OVERRIDE_MESSAGE, PING_MESSAGE)
+from compression import NO_COMPRESSION
+from network import MessageBuffer, frame_message, MESSAGE_HEADER
+from snapshot import SnapshotHistory
+from settings import *
+
+# bots move in a circle, this many pixels across and this many seconds around
+BOT_CIRCLE_RADIUS = 200
+BOT_CIRCLE_TIME = 8
+# the size of the area bots start in, in pixels
+BOT_AREA_WIDTH = 3200
+BOT_AREA_HEIGHT = 1920
+PERCENTILES = [50, 90, 99]
+
+
+def percentile(sorted_values, percent):
+    # the value that this percent of the values are below
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Results:
+    def __init__(self):
+        # what every bot measured, in milliseconds
+        self.latencies = []
+        self.connected = 0
+        self.rooms = {}
+        self.denied = {}
+        self.errors = {}
+        self.snapshots = 0
+        self.overrides = 0
+        self.bullets = 0
+        self.pickups = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def count(self, reasons, reason):
+        reasons[reason] = reasons.get(reason, 0) + 1
+
+    def print_results(self, bots, duration):
+        print(f"\nBots Connected: {self.connected}/{bots}")
+        for room, amount in sorted(self.rooms.items()):
+            print(f"\t- Room {room}: {amount} Bots")
+        for reason, amount in self.denied.items():
+            print(f"\t- Denied Access ({amount}): {reason}")
+        for reason, amount in self.errors.items():
+            print(f"\t- Connection Error ({amount}): {reason}")
+        print(f"Snapshots Received: {self.snapshots / duration:.1f}/s "
+              f"({self.snapshots / max(self.connected, 1) / duration:.1f}/s Per Bot)")
+        print(f"Overrides Received: {self.overrides}")
+        print(f"Bullets Shot: {self.bullets} - Items Picked Up: {self.pickups}")
+        print(f"In: {self.bytes_in / duration / 1000:.1f} KB/s - Out: {self.bytes_out / duration / 1000:.1f} KB/s")
+        latencies = sorted(self.latencies)
+        if latencies:
+            print(f"Reply Latency ({len(latencies)} Pings): " +
+                  " - ".join(f"P{percent}: {percentile(latencies, percent):.1f} ms" for percent in PERCENTILES) +
+                  f" - Max: {latencies[-1]:.1f} ms")
+        else:
+            print("Reply Latency: No Pings Were Answered")
+
+
+class Bot:
+    def __init__(self, loop, address, results, args, bot_number):
+        # a client without a window, that sends what a real client would send
+        self.loop = loop
+        self.address = address
+        self.results = results
+        self.args = args
+        self.bot_number = bot_number
+        self.connection = None
+        self.buffer = None
+        self.player = None
+        # the profile fields sent last, so only the ones that change are sent again like a real client
+        self.profile = None
+        self.snapshots = SnapshotHistory()
+        self.running = False
+        self.start_time = monotonic()
+        self.center = Vec(uniform(0, BOT_AREA_WIDTH), uniform(0, BOT_AREA_HEIGHT))
+
+    def current_time(self):
+        # in milliseconds, wrapping around to fit in 4 bytes
+        return int((monotonic() - self.start_time) * 1000) & 0xFFFFFFFF
+
+    async def send(self, message):
+        message = frame_message(message)
+        await self.loop.sock_sendall(self.connection, message)
+        self.results.bytes_out += len(message)
+
+    async def receive(self):
+        data = await self.buffer.receive_async(self.loop)
+        self.results.bytes_in += MESSAGE_HEADER.size + len(data)
+        return data
+
+    async def run(self, end_time):
+        self.connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connection.setblocking(False)
+        self.buffer = MessageBuffer(self.connection)
+        try:
+            await self.loop.sock_connect(self.connection, self.address)
+            if await self.join():
+                self.running = True
+                await asyncio.gather(self.send_loop(end_time), self.receive_loop())
+        except (EOFError, ValueError, OSError) as e:
+            self.results.count(self.results.errors, str(e) or type(e).__name__)
+        finally:
+            self.running = False
+            self.connection.close()
+
+    async def join(self):
+        # the server sends a player to fill in, then verifies it, the same as the main menu of a real client
+        self.player = decode(await self.receive())
+        self.player.username = f"Bot {self.bot_number}"
+        self.player.image_color = choice(PLAYER_IMGS_CYCLE)
+        self.player.image_string = PLAYER_IMGS[self.player.image_color]
+        self.player.pos = Vec(self.center)
+        # bots don't use compression, so the time spent compressing is only on the server
+        await self.send(encode_join(self.player, NO_COMPRESSION, self.args.room))
+        verify, reason, token, compression, room, udp_port = decode(await self.receive())
+        if not verify:
+            self.results.count(self.results.denied, reason)
+            return False
+        self.results.connected += 1
+        self.results.count(self.results.rooms, room)
+        return True
+
+    def move(self, elapsed_time):
+        # go around a circle, facing the way the player is going
+        angle = 360 * elapsed_time / BOT_CIRCLE_TIME + self.bot_number * 37
+        self.player.pos = self.center + Vec(cos(radians(angle)), sin(radians(angle))) * BOT_CIRCLE_RADIUS
+        self.player.rot = (-angle - 90) % 360
+        self.player.input_sequence += 1
+        # always holding forward, and turning
+        self.player.keys = (True, False, True, False, False)
+
+    def add_events(self, frame_length):
+        # each frame has a chance of shooting or picking up an item, so they happen at about the rate chosen
+        if random() < self.args.shoot_rate * frame_length:
+            self.player.overwrites['new bullets'].append([Vec(self.player.pos), self.player.rot,
+                                                          self.player.player_id])
+            self.player.keys = self.player.keys[:4] + (True,)
+            self.results.bullets += 1
+        if random() < self.args.pickup_rate * frame_length:
+            state = self.snapshots.latest()
+            if state is not None:
+                active_items = [item_id for item_id, values in state['items'].items() if values[0]]
+                if active_items:
+                    self.player.overwrites['items'].append(choice(active_items))
+                    self.results.pickups += 1
+
+    async def send_loop(self, end_time):
+        frame_length = 1.0 / self.args.rate
+        start_time = next_time = monotonic()
+        next_ping = start_time
+        while self.running and next_time < end_time:
+            self.move(next_time - start_time)
+            self.add_events(frame_length)
+            profile, self.profile = encode_profile(self.player, self.profile)
+            if profile is not None:
+                await self.send(profile)
+            if any(self.player.overwrites.values()):
+                await self.send(encode_events(self.player.overwrites))
+                for overwrite_data in self.player.overwrites.values():
+                    overwrite_data.clear()
+            ack = self.snapshots.latest_tick
+            await self.send(encode_update(self.player, NO_BASE if ack is None else ack))
+            # the server sends a ping straight back, the time it takes is the latency measured
+            if next_time >= next_ping:
+                await self.send(encode_ping(self.current_time()))
+                next_ping += 1.0 / self.args.ping_rate
+            next_time += frame_length
+            await asyncio.sleep(max(0.0, next_time - monotonic()))
+        # the bot quits, so the server removes its player instead of keeping it to be resumed
+        if self.running:
+            try:
+                await self.send(encode_leave())
+            except OSError:
+                pass
+        self.running = False
+        # stop waiting for the server
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    async def receive_loop(self):
+        while self.running:
+            try:
+                data = await self.receive()
+            except (EOFError, OSError):
+                if self.running:
+                    raise
+                break
+            if message_type(data) == PING_MESSAGE:
+                self.results.latencies.append((self.current_time() - decode_ping(data)) & 0xFFFFFFFF)
+            elif message_type(data) == OVERRIDE_MESSAGE:
+                attributes = decode_override(data)
+                attributes.pop("input_sequence")
+                for attr, value in attributes.items():
+                    setattr(self.player, attr, value)
+                self.results.overrides += 1
+            else:
+                self.apply_snapshot(data)
+
+    def apply_snapshot(self, data):
+        # snapshots are decoded like a real client, so the items to pick up are known
+        tick, base_tick, server_time = snapshot_ticks(data)
+        base_state = EMPTY_STATE if base_tick == NO_BASE else self.snapshots.get(base_tick)
+        if base_state is None:
+            return
+        self.snapshots.add(tick, decode_snapshot(data, base_state))
+        self.results.snapshots += 1
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    results = Results()
+    address = (args.host, args.port)
+    print(f"Starting {args.bots} Bots Against {args.host}:{args.port} For {args.duration} Seconds...")
+    end_time = monotonic() + args.duration
+    tasks = []
+    for bot_number in range(args.bots):
+        bot = Bot(loop, address, results, args, bot_number)
+        tasks.append(loop.create_task(bot.run(end_time)))
+        # connecting every bot at once can fill the server's queue of new connections
+        await asyncio.sleep(args.ramp)
+    await asyncio.gather(*tasks)
+    results.print_results(args.bots, args.duration)
+
+
+if __name__ == "__main__":
+    # the server only lets MAX_CLIENTS clients into each of its ROOMS rooms
+    # raise them in settings.py to test with more bots
+    parser = ArgumentParser(description="Connect bots without a window to a server to measure how it handles them.")
+    parser.add_argument("bots", type=int, nargs="?", default=MAX_CLIENTS, help="how many bots to connect")
+    parser.add_argument("--host", default=socket.gethostname(), help="the server's ip or hostname")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--duration", type=float, default=30, help="in seconds, how long every bot sends for")
+    parser.add_argument("--rate", type=float, default=FPS, help="how many times a second each bot sends its player")
+    parser.add_argument("--shoot-rate", type=float, default=1, help="how many bullets each bot shoots a second")
+    parser.add_argument("--pickup-rate", type=float, default=0.2,
+                        help="how many items each bot picks up a second")
+    parser.add_argument("--ping-rate", type=float, default=5, help="how many pings each bot sends a second")
+    parser.add_argument("--room", type=int, default=ANY_ROOM,
+                        help="the room every bot joins, by default bots fill the first room with space")
+    parser.add_argument("--ramp", type=float, default=0.05, help="in seconds, the time between bots connecting")
+    asyncio.run(run(parser.parse_args()))
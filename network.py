@@ -1,7 +1,208 @@
 import socket
-from pickle import dumps, loads
+import asyncio
+from struct import Struct
+from threading import Lock, Condition
+from _thread import start_new_thread
+from secrets import randbits
+from select import select
+from time import sleep, monotonic, perf_counter
+from codec import (encode, decode, encode_join, encode_update, encode_state, encode_events, encode_profile,
+                   encode_leave, decode_override, encode_ping, decode_ping, snapshot_ticks, decode_snapshot, state_game,
+                   message_type, NO_BASE, EMPTY_STATE, ECHO, ANY_ROOM, OVERRIDE_MESSAGE, PING_MESSAGE,
+                   MAX_STRING_LENGTH)
+from compression import Compressor, supported_compressions, NO_COMPRESSION
+from snapshot import SnapshotHistory
+from interpolation import InterpolationBuffer
+from telemetry import Telemetry
 from settings import *
 
+# every message starts with a header holding the length of the message in bytes
+MESSAGE_HEADER = Struct("!I")
+# set in the header of a compressed message, messages are never large enough to use this bit for their length
+COMPRESSED_FLAG = 0x80000000
+
+
+def frame_message(message, compressor=None):
+    # prefix the message with its length so the receiver knows where the message ends
+    if compressor is None:
+        return MESSAGE_HEADER.pack(len(message)) + message
+    compressed, message = compressor.compress(message)
+    return MESSAGE_HEADER.pack(len(message) | COMPRESSED_FLAG if compressed else len(message)) + message
+
+
+def send_message(connection, message, compressor=None, telemetry=None):
+    message = frame_message(message, compressor)
+    connection.sendall(message)
+    if telemetry is not None:
+        telemetry.sent(len(message))
+
+
+class MessageBuffer:
+    def __init__(self, connection, size=RECEIVE_LIMIT, telemetry=None):
+        self.connection = connection
+        self.telemetry = telemetry
+        # messages are reassembled into a preallocated buffer instead of a new bytes object every receive
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.header = bytearray(MESSAGE_HEADER.size)
+        self.header_view = memoryview(self.header)
+        # set once the compression is chosen during verification
+        self.compressor = None
+        self.compressed = False
+
+    def receive_into(self, view):
+        # tcp can split a message into multiple parts, so keep receiving until the view is full
+        received = 0
+        while received < len(view):
+            received_now = self.connection.recv_into(view[received:])
+            # nothing was received, so the other side closed the connection
+            if not received_now:
+                raise EOFError("Connection Closed")
+            received += received_now
+
+    async def receive_into_async(self, loop, view):
+        # the same as receive_into, but waits on the event loop instead of blocking a thread
+        received = 0
+        while received < len(view):
+            received_now = await loop.sock_recv_into(self.connection, view[received:])
+            if not received_now:
+                raise EOFError("Connection Closed")
+            received += received_now
+
+    def receive(self):
+        # get the length of the next message
+        self.receive_into(self.header_view)
+        message = self.message_view()
+        self.receive_into(message)
+        self.count_received(message)
+        return self.decompress(message)
+
+    async def receive_async(self, loop):
+        await self.receive_into_async(loop, self.header_view)
+        message = self.message_view()
+        await self.receive_into_async(loop, message)
+        self.count_received(message)
+        return self.decompress(message)
+
+    def count_received(self, message):
+        # the size received over the connection, before the message is decompressed
+        if self.telemetry is not None:
+            self.telemetry.received(MESSAGE_HEADER.size + len(message))
+
+    def decompress(self, message):
+        if not self.compressed:
+            return message
+        if self.compressor is None:
+            raise ValueError("Invalid Message: Compressed Before A Compression Was Chosen")
+        return self.compressor.decompress(message)
+
+    def message_view(self):
+        # the length of the next message is in the header that was just received
+        length = MESSAGE_HEADER.unpack(self.header)[0]
+        self.compressed = bool(length & COMPRESSED_FLAG)
+        length &= ~COMPRESSED_FLAG
+        if length > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Message Is Too Large ({length}/{MAX_MESSAGE_SIZE} Bytes)")
+
+        # grow the buffer if the message is bigger than any message received before
+        if length > len(self.buffer):
+            self.buffer = bytearray(max(length, len(self.buffer) * 2))
+            self.view = memoryview(self.buffer)
+
+        # the returned view is only valid until the next message is received
+        return self.view[:length]
+
+
+class Session:
+    def __init__(self, connection):
+        # a client connected to the server
+        self.connection = connection
+        # the round trip time, bytes and messages per second, and time spent encoding and decoding for this client
+        self.telemetry = Telemetry()
+        self.buffer = MessageBuffer(connection, telemetry=self.telemetry)
+        # snapshots sent to this client, so only what changed since the latest one it received is sent
+        self.snapshots = SnapshotHistory()
+        # the client sends this token with everything sent over udp, so no one else can send as this client
+        # it is also sent to get back the player after losing the connection, so it is never NO_SESSION
+        self.token = randbits(32) or 1
+        self.udp_address = None
+        self.udp_sequence = 0
+        # the latest snapshot the client has received, snapshots are sent with what changed since it
+        self.ack = NO_BASE
+        # the ids of the players, items, and bullets near the client's player that it is being sent
+        self.interest = {"players": set(), "items": set(), "bullets": set()}
+        # the time sent with the latest state received over udp, and when it was received
+        self.echo_time = 0
+        self.echo_received = 0.0
+        # a snapshot sent over tcp that is waiting to be sent, only one is sent at a time so a slow client falls behind
+        # instead of snapshots piling up for it
+        self.snapshot = None
+        self.sending = False
+        # messages that have to arrive, like overrides, sent in order before the next snapshot
+        self.messages = []
+        self.closed = False
+        # the client said it is quitting, so its player is not kept after the connection closes
+        self.left = False
+        self.snapshot_ready = Condition()
+        # the client thread and the sender thread can both send to the client over tcp
+        self.send_lock = Lock()
+        # only created when the server runs on an event loop
+        self.async_send_lock = None
+        # the compressions the client has, and the compressor once one is chosen during verification
+        self.compressions = NO_COMPRESSION
+        self.compressor = None
+
+    def send(self, message):
+        with self.send_lock:
+            send_message(self.connection, message, self.compressor, self.telemetry)
+
+    def set_compression(self, compression):
+        # both directions use the same compression
+        self.compressor = Compressor(compression)
+        self.buffer.compressor = self.compressor
+
+    def queue_snapshot(self, snapshot):
+        with self.snapshot_ready:
+            self.snapshot = snapshot
+            self.sending = True
+            self.snapshot_ready.notify()
+
+    def queue_message(self, message):
+        with self.snapshot_ready:
+            self.messages.append(message)
+            self.snapshot_ready.notify()
+
+    def next_messages(self):
+        # wait for messages or a snapshot to send, returns None once the session is closed
+        with self.snapshot_ready:
+            while self.snapshot is None and not self.messages and not self.closed:
+                self.snapshot_ready.wait()
+            if self.closed:
+                return None
+            messages, snapshot = self.messages, self.snapshot
+            self.messages = []
+            self.snapshot = None
+            return messages, snapshot
+
+    def close(self):
+        with self.snapshot_ready:
+            self.closed = True
+            self.snapshot_ready.notify_all()
+
+    def echo(self):
+        # the time of the latest state the client sent, and how long ago it was received in milliseconds
+        held_time = min(int((monotonic() - self.echo_received) * 1000), 0xFFFF)
+        return ECHO.pack(self.echo_time, held_time)
+
+    async def send_async(self, loop, message):
+        # messages sent by different tasks must not be mixed together
+        if self.async_send_lock is None:
+            self.async_send_lock = asyncio.Lock()
+        async with self.async_send_lock:
+            message = frame_message(message, self.compressor)
+            await loop.sock_sendall(self.connection, message)
+            self.telemetry.sent(len(message))
+
 
 class Network:
     def __init__(self, server_ip, port):
@@ -10,6 +211,42 @@ class Network:
         self.server_ip = server_ip
         self.server_port = port
         self.address = (self.server_ip, self.server_port)
+        # the round trip time, bytes and messages per second, and time spent encoding and decoding
+        self.telemetry = Telemetry()
+        self.buffer = MessageBuffer(self.client, telemetry=self.telemetry)
+        # snapshots received from the server, the server only sends what changed since the latest one
+        self.snapshots = SnapshotHistory()
+        self.game = None
+        # udp is only set up after the client is verified, and only if it is turned on
+        self.udp = None
+        self.token = None
+        self.compressor = None
+        self.room = None
+        self.sequence = 0
+        self.datagram = bytearray(MAX_DATAGRAM_SIZE)
+        self.datagram_view = memoryview(self.datagram)
+        # the round trip time is measured with the time sent with every state over udp, or with a ping over tcp
+        self.start_time = monotonic()
+        self.ping_time = None
+        # games received, and changes to the client's player, waiting for the game to use them
+        self.running = False
+        self.error = None
+        self.received_games = []
+        self.new_snapshots = []
+        # changes the server made to the client's player, kept until the game lines them up with its own history
+        self.overrides = []
+        self.corrections = []
+        # remote players and bullets are shown between the games received
+        self.interpolation = InterpolationBuffer()
+        self.latest_ready = Condition()
+        # messages waiting to be sent to the server
+        self.outgoing_events = []
+        self.outgoing_player = None
+        # the profile fields of the player sent last, only the ones that change after are sent again
+        self.profile = None
+        self.send_ready = Condition()
+        # the send thread and close() both send over tcp, so messages aren't sent at the same time
+        self.write_lock = Lock()
         self.player = self.connect()
 
     def get_player(self):
@@ -18,20 +255,331 @@ class Network:
     def connect(self):
         try:
             self.client.connect(self.address)
-            return loads(self.client.recv(RECEIVE_LIMIT))
-        except socket.error:
+            return decode(self.buffer.receive())
+        except (socket.error, EOFError, ValueError):
             print(f"Error Connecting To {self.server_ip}:{self.server_port}")
 
+    def close(self):
+        # stop the network threads
+        with self.latest_ready:
+            connected = self.running
+            self.running = False
+        with self.send_ready:
+            self.send_ready.notify()
+        # let the server know the client quit, so the player is removed instead of kept for the client to resume
+        if connected:
+            with self.write_lock:
+                try:
+                    send_message(self.client, encode_leave(), self.compressor, self.telemetry)
+                except OSError:
+                    pass
+        self.client.close()
+        if self.udp is not None:
+            self.udp.close()
+
     def send(self, data):
         try:
-            self.client.send(dumps(data))
-            return loads(self.client.recv(RECEIVE_LIMIT))
-        except EOFError:
+            send_message(self.client, encode(data), telemetry=self.telemetry)
+            return decode(self.buffer.receive())
+        except (EOFError, ValueError, ConnectionError, socket.timeout) as e:
+            return self.connection_error(e)
+
+    def verify(self, player, room=ANY_ROOM):
+        # send the player chosen at the main menu, and get back if the server verified the client
+        # a username too long to send is turned down here, as the server would never get it
+        if player.username is not None and len(player.username.encode("utf-8")) > MAX_STRING_LENGTH:
+            return False, f"Username Is Too Long ({len(player.username.encode('utf-8'))}/{MAX_STRING_LENGTH} Bytes)"
+        try:
+            send_message(self.client, encode_join(player, supported_compressions(), room), telemetry=self.telemetry)
+            reply = decode(self.buffer.receive())
+        except (EOFError, ValueError, ConnectionError, socket.timeout) as e:
+            return False, self.connection_error(e)
+        verify, reason, self.token, compression, self.room, udp_port = reply
+        # everything sent after verification uses the compression the server chose
+        self.compressor = Compressor(compression)
+        self.buffer.compressor = self.compressor
+        if verify and USE_UDP:
+            # the udp socket only sends to and receives from the server, which can use a different port for udp
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.connect((self.server_ip, udp_port))
+            self.udp.setblocking(False)
+        if verify:
+            self.running = True
+            self.start()
+        return verify, reason
+
+    def current_time(self):
+        # in milliseconds, wrapping around to fit in 4 bytes
+        return int((monotonic() - self.start_time) * 1000) & 0xFFFFFFFF
+
+    def apply_snapshot(self, data):
+        # the snapshot only has what changed since a snapshot received before, unless it is a keyframe
+        tick, base_tick, server_time = snapshot_ticks(data)
+        # snapshots sent over udp can arrive after a newer one, so older snapshots are dropped
+        if self.snapshots.latest_tick is not None and tick <= self.snapshots.latest_tick:
+            return False
+        if base_tick == NO_BASE:
+            base_state = EMPTY_STATE
+        else:
+            base_state = self.snapshots.get(base_tick)
+            if base_state is None:
+                return False
+        start_time = perf_counter()
+        self.snapshots.add(tick, decode_snapshot(data, base_state))
+        self.telemetry.decoded(perf_counter() - start_time)
+        self.new_snapshots.append((tick, server_time, self.current_time()))
+        return True
+
+    def start(self):
+        # sending and receiving happen on their own threads, so the game never waits for the server
+        start_new_thread(self.threaded_receive, ())
+        start_new_thread(self.threaded_send, ())
+
+    def update(self, player):
+        # queue the client's player to be sent, and get the latest game received from the server
+        if self.error is not None:
+            return self.error
+        self.queue_player(player)
+
+        with self.latest_ready:
+            # wait for the first snapshot, after that only use what has already arrived
+            if self.game is None and not self.received_games:
+                self.latest_ready.wait_for(lambda: self.received_games or self.error is not None, CONN_TIMEOUT)
+            if self.error is not None:
+                return self.error
+            if self.game is None and not self.received_games:
+                return self.connection_error(socket.timeout())
+            received_games = self.received_games
+            self.received_games = []
+            overrides = self.overrides
+            self.overrides = []
+
+        # every game received is kept to show remote players and bullets between, the newest is used for the rest
+        for server_time, local_time, game in received_games:
+            self.interpolation.add(server_time, local_time, game)
+            self.game = game
+        self.interpolation.sample(self.current_time())
+
+        # attributes the server changed, with the input sequence of the client's player they were made to
+        for attributes in overrides:
+            self.corrections.append((attributes.pop("input_sequence"), attributes))
+
+        # the client's own player is never replaced by the server, the server changes it by overriding attributes
+        self.game['players'][player.player_id] = player
+        return self.game
+
+    def take_corrections(self):
+        corrections = self.corrections
+        self.corrections = []
+        return corrections
+
+    def sockets(self):
+        if self.udp is None:
+            return [self.client]
+        return [self.client, self.udp]
+
+    def queue_player(self, player):
+        # the player is encoded now, so the game can keep changing it while it is being sent
+        ack = self.snapshots.latest_tick
+        if ack is None:
+            ack = NO_BASE
+        current_time = self.current_time()
+        with self.send_ready:
+            start_time = perf_counter()
+            # fields that change slowly, such as the score or the image, are only sent when they change
+            # they have to arrive, so they are sent over tcp like events
+            profile, self.profile = encode_profile(player, self.profile)
+            if profile is not None:
+                self.outgoing_events.append(profile)
+            # events have to arrive, so every one is sent over tcp
+            if any(player.overwrites.values()):
+                self.outgoing_events.append(encode_events(player.overwrites))
+                # the events have been queued, so they aren't sent again
+                for overwrite_data in player.overwrites.values():
+                    overwrite_data.clear()
+            # only the latest command of the player is sent, an older one that hasn't been sent yet is replaced
+            if self.udp is None:
+                # let the server know the latest snapshot received with the command
+                self.outgoing_player = encode_update(player, ack)
+                # the server sends the ping straight back
+                if self.ping_time is None or (current_time - self.ping_time) & 0xFFFFFFFF >= PING_INTERVAL:
+                    self.ping_time = current_time
+                    self.outgoing_events.append(encode_ping(current_time))
+            else:
+                self.sequence += 1
+                self.outgoing_player = encode_state(player, self.token, self.sequence, ack, current_time)
+            self.telemetry.encoded(perf_counter() - start_time)
+            self.send_ready.notify()
+
+    def threaded_send(self):
+        # the server doesn't reply, it sends snapshots to every client at its own rate
+        while self.running:
+            with self.send_ready:
+                self.send_ready.wait_for(lambda: self.outgoing_events or self.outgoing_player or not self.running)
+                events = self.outgoing_events
+                self.outgoing_events = []
+                player = self.outgoing_player
+                self.outgoing_player = None
+            connection = self.client
+            try:
+                with self.write_lock:
+                    while events:
+                        send_message(connection, events[0], self.compressor, self.telemetry)
+                        # an event is only let go of once it has been sent
+                        del events[0]
+                    if player is None:
+                        continue
+                    if self.udp is None:
+                        send_message(connection, player, self.compressor, self.telemetry)
+                    else:
+                        # the player's command is sent every frame, so a lost one is replaced by the next one
+                        try:
+                            self.udp.send(player)
+                            self.telemetry.sent(len(player))
+                        except OSError:
+                            pass
+            except OSError:
+                # the socket was closed by the client
+                if not self.running:
+                    break
+                # otherwise the connection was lost, the receive thread connects again and this thread carries on
+                # the events that weren't sent go out first, once there is a new connection to send them over
+                with self.send_ready:
+                    self.outgoing_events[:0] = events
+                    self.send_ready.wait_for(lambda: self.client is not connection or not self.running)
+
+    def threaded_receive(self):
+        while self.running:
+            try:
+                # the server sends snapshots many times a second, so a long silence means the connection was lost
+                if not select(self.sockets(), [], [], CONNECTION_LOST_TIME / 1000.0)[0]:
+                    raise socket.timeout
+                if self.receive_all():
+                    games = [(server_time, local_time, state_game(self.snapshots.get(tick)))
+                             for tick, server_time, local_time in self.new_snapshots]
+                    self.new_snapshots.clear()
+                    # publish the new games for the game to use on its next update
+                    with self.latest_ready:
+                        self.received_games.extend(games)
+                        self.latest_ready.notify_all()
+            except (EOFError, ConnectionError, socket.timeout) as e:
+                # the game keeps going while the client connects again, so a short drop doesn't end the game
+                if not self.reconnect():
+                    self.stop(e)
+            except ValueError as e:
+                self.stop(e)
+            except OSError:
+                # the socket was closed by the client
+                break
+
+    def reconnect(self):
+        # connect again and get back the player the server kept, returns False if it can't be resumed in time
+        if not self.running:
+            return False
+        print("\nConnection Lost, Trying To Resume...")
+        end_time = monotonic() + RECONNECT_GRACE_PERIOD / 1000.0
+        while self.running and monotonic() < end_time:
+            connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            connection.settimeout(CONN_TIMEOUT)
+            buffer = MessageBuffer(connection, telemetry=self.telemetry)
+            try:
+                connection.connect(self.address)
+                # the join is sent without waiting for the new player the server sends every new connection
+                # so a supervisor can tell the client is resuming, and hand it to the worker that kept the player
+                send_message(connection, encode_join(self.player, supported_compressions(), self.room, self.token),
+                             telemetry=self.telemetry)
+                # the player it kept is resumed instead of the new player
+                decode(buffer.receive())
+                verify, reason, token, compression, room, udp_port = decode(buffer.receive())
+            except (EOFError, ValueError, OSError):
+                connection.close()
+                sleep(RECONNECT_INTERVAL / 1000.0)
+                continue
+            if not verify:
+                connection.close()
+                print(f"Could Not Resume: {reason}")
+                return False
+
+            old_connection = self.client
+            old_udp = self.udp
+            with self.send_ready:
+                self.client = connection
+                if old_udp is not None:
+                    # the server that resumed the player can use a different port for udp
+                    self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    self.udp.connect((self.server_ip, udp_port))
+                    self.udp.setblocking(False)
+                self.buffer = buffer
+                self.token = token
+                self.compressor = Compressor(compression)
+                self.buffer.compressor = self.compressor
+                # the new session has sent no snapshots, so it starts with a keyframe of the whole game
+                self.snapshots.clear()
+                # and the server is sent every profile field again
+                self.profile = None
+                self.send_ready.notify()
+            old_connection.close()
+            if old_udp is not None:
+                old_udp.close()
+            print("Resumed The Connection To The Server")
+            return True
+        return False
+
+    def stop(self, error):
+        # only the first error is kept, the game gets it on its next update
+        with self.latest_ready:
+            if self.running:
+                self.error = self.connection_error(error)
+            self.running = False
+            self.latest_ready.notify_all()
+        with self.send_ready:
+            self.send_ready.notify()
+
+    def receive_all(self):
+        # handle everything that has arrived from the server, returns True if there is a newer snapshot
+        new_snapshot = False
+        readable = select(self.sockets(), [], [], 0)[0]
+        while readable:
+            # attributes the server changed, or a snapshot when not using udp or when it is too large for udp
+            if self.client in readable:
+                data = self.buffer.receive()
+                if message_type(data) == OVERRIDE_MESSAGE:
+                    start_time = perf_counter()
+                    overrides = decode_override(data)
+                    self.telemetry.decoded(perf_counter() - start_time)
+                    with self.latest_ready:
+                        self.overrides.append(overrides)
+                elif message_type(data) == PING_MESSAGE:
+                    self.telemetry.add_rtt((self.current_time() - decode_ping(data)) & 0xFFFFFFFF)
+                elif self.apply_snapshot(data):
+                    new_snapshot = True
+            # snapshots, each sent with the time of the latest state the server received
+            if self.udp is not None and self.udp in readable:
+                try:
+                    size = self.udp.recv_into(self.datagram)
+                except (BlockingIOError, ConnectionRefusedError):
+                    size = 0
+                if size:
+                    self.telemetry.received(size)
+                if size > ECHO.size:
+                    sent_time, held_time = ECHO.unpack_from(self.datagram)
+                    if self.apply_snapshot(self.datagram_view[ECHO.size:size]):
+                        new_snapshot = True
+                    # the time the server held the state until its next snapshot is not part of the round trip
+                    self.telemetry.add_rtt(max(((self.current_time() - sent_time) & 0xFFFFFFFF) - held_time, 0))
+            readable = select(self.sockets(), [], [], 0)[0]
+        return new_snapshot
+
+    def connection_error(self, error):
+        if isinstance(error, EOFError):
             print("\nConnection Closed: Error Sending Data To The Server")
             return "Error: Error Sending Data To The Server"
-        except ConnectionResetError:
+        elif isinstance(error, ValueError):
+            print("\nConnection Closed: Invalid Data Received From The Server")
+            return "Error: Invalid Data Received From The Server"
+        elif isinstance(error, ConnectionError):
             print("\nConnection Closed: Connection Was Reset")
             return "Error: Connection Was Reset"
-        except socket.timeout:
+        else:
             print("\nConnection Timed Out")
             return "Error: Connection Timed Out"
@@ -0,0 +1,64 @@
+from struct import Struct
+from multiprocessing import shared_memory
+from settings import *
+
+# the latest tick written to the ring
+RING_HEADER = Struct("!I")
+# the tick in a slot and the length of its data, the tick is set to NO_TICK while the slot is being written
+SLOT_HEADER = Struct("!II")
+NO_TICK = 0
+
+
+class SnapshotRing:
+    def __init__(self, name=None, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        # one process writes a tick of data into shared memory, any other process can read it without a copy of it
+        # being sent to each of them, the process that creates the ring passes its name to the others
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=RING_HEADER.size + slots * slot_size)
+            RING_HEADER.pack_into(self.memory.buf, 0, NO_TICK)
+            for slot in range(slots):
+                SLOT_HEADER.pack_into(self.memory.buf, self.slot_offset(slot), NO_TICK, 0)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+    def slot_offset(self, slot):
+        return RING_HEADER.size + slot * self.slot_size
+
+    def write(self, tick, data):
+        # returns False if the data doesn't fit in a slot, ticks have to go up by at least one and can't be NO_TICK
+        if SLOT_HEADER.size + len(data) > self.slot_size:
+            return False
+        offset = self.slot_offset(tick % self.slots)
+        buffer = self.memory.buf
+        # readers can tell the slot changed while they read it, as its tick is different after
+        SLOT_HEADER.pack_into(buffer, offset, NO_TICK, 0)
+        buffer[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(data)] = data
+        SLOT_HEADER.pack_into(buffer, offset, tick, len(data))
+        RING_HEADER.pack_into(buffer, 0, tick)
+        return True
+
+    def latest_tick(self):
+        return RING_HEADER.unpack_from(self.memory.buf, 0)[0]
+
+    def read(self, tick):
+        # the data of the tick, or None if the tick has been written over
+        offset = self.slot_offset(tick % self.slots)
+        buffer = self.memory.buf
+        slot_tick, length = SLOT_HEADER.unpack_from(buffer, offset)
+        if slot_tick != tick:
+            return None
+        data = bytes(buffer[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length])
+        # the writer went all the way around the ring while the data was copied
+        if SLOT_HEADER.unpack_from(buffer, offset)[0] != tick:
+            return None
+        return data
+
+    def close(self):
+        self.memory.close()
+        # the memory is freed once the process that created it is done with it
+        if self.owner:
+            self.memory.unlink()
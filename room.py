@@ -0,0 +1,345 @@
+from os import path
+from functools import lru_cache
+from random import randint, choice
+from threading import Lock
+from copy import copy
+from pygame.math import Vector2 as Vec
+import pytmx
+from bullets import BulletStore, WallGrid
+from codec import game_state, freeze_state
+from jitter import JitterBuffer
+from tickclock import TickClock
+from timers import TickTimers
+from tilemap import format_map
+from settings import *
+
+
+@lru_cache(maxsize=None)
+def load_tilemap_data(map_file):
+    # the images of the map aren't needed by the server, so only the map data is loaded, once for every room
+    return pytmx.TiledMap(map_file)
+
+
+@lru_cache(maxsize=None)
+def load_item_spawns(map_file):
+    # the center, spawn type, and item of every item spawn on a map
+    tilemap_data = load_tilemap_data(map_file)
+    item_spawns = []
+    for tile_object in tilemap_data.objects:
+        if tile_object.type == "item":
+            item_spawns.append((tile_object.x + tile_object.width / 2, tile_object.y + tile_object.height / 2,
+                                tile_object.name))
+    return tuple(item_spawns)
+
+
+@lru_cache(maxsize=None)
+def load_wall_grid(map_file):
+    # where the walls of a map are, to remove the bullets that hit them
+    tilemap_data = load_tilemap_data(map_file)
+    walls = [(tile_object.x, tile_object.y, tile_object.width, tile_object.height)
+             for tile_object in tilemap_data.objects if tile_object.type == "obstacle" and tile_object.name == "wall"]
+    return WallGrid(walls, tilemap_data.width * tilemap_data.tilewidth, tilemap_data.height * tilemap_data.tileheight)
+
+
+class Room:
+    def __init__(self, room_id, maps, map_folder, destroy_player):
+        # one game on the server, with its own players, map rotation, and timers
+        self.room_id = room_id
+        # tells the client of a player that its player was destroyed, and by which player
+        self.destroy_player = destroy_player
+        # every tick moves the game forward by the same time, however long the server took to run it
+        self.tick_clock = TickClock()
+        # runs a function after a delay in seconds, on a tick of the room
+        self.timers = TickTimers(self.tick_clock)
+        # start time, game times are counted in ticks so they move at the same pace as the game
+        self.game_start_tick = 0
+        self.game_time_left = 0
+        self.game_end_tick = 0
+        self.current_game_end_time = 0
+        self.game_end_time_left = 0
+        # create another list of maps, where random maps will be popped from
+        # this will make sure the same maps aren't chosen, but it is still random
+        self.maps = maps
+        self.map_folder = map_folder
+        self.unplayed_maps = self.maps.copy()
+        # game attributes
+        self.current_bullet_id = 0
+        self.current_game_id = 0
+        # the walls of the current map, and the tick each player was last destroyed by a bullet
+        self.wall_grid = None
+        self.bullet_hit_ticks = {}
+        # changes the clients' threads make to the game, such as players joining and bullets launched
+        # they are made at the start of the next tick, so only the tick ever changes self.game
+        self.changes = []
+        self.changes_lock = Lock()
+        # every player in the room, changed right away as clients join and leave, for the clients' threads to read
+        # self.game['players'] only has them from the tick after they joined until the tick after they left
+        self.players = {}
+        # the center of each item spawn, to only send clients the items near them
+        self.item_positions = {}
+        # the game as it was after the latest tick, read by other threads while the tick changes self.game
+        # a new snapshot is made every tick and swapped in whole, so readers never see a tick half done
+        self.snapshot = None
+        # client id to the commands its client sent, played one every tick
+        self.jitter_buffers = {}
+        # create the game
+        self.game = {"players": {},
+                     "current map": None,
+                     "game time": self.game_time_left,
+                     "score time": self.game_end_time_left,
+                     "items": {},
+                     "bullets": BulletStore(),
+                     "active": True
+                     }
+
+    def full(self):
+        return len(self.players) >= MAX_CLIENTS
+
+    def prepare_new_game(self):
+        # set the game to inactive
+        self.game['active'] = False
+
+        # items of the game that ended are not respawned
+        self.timers.cancel_group(self.current_game_id)
+        # a new game is started so changed the id up one
+        self.current_game_id += 1
+
+        # get the game end tick, to figure out how long until a new game should start
+        self.game_end_tick = self.tick_clock.ticks
+
+        # start a new game in the room
+        print(f"\nStarting A New Game In Room {self.room_id}...")
+
+        # select a new map that hasn"t been played in the current cycle through all the maps
+        self.game['current map'] = self.unplayed_maps.pop(randint(0, (len(self.unplayed_maps) - 1)))
+        print(f"The Chosen Map Is: {format_map(self.game['current map'])}")
+
+        # reset game data
+        self.game['items'].clear()
+        self.game['bullets'].clear()
+        self.bullet_hit_ticks.clear()
+        self.item_positions.clear()
+        self.wall_grid = load_wall_grid(path.join(self.map_folder, self.game['current map']))
+
+        # counters to give each item spawn and bullet a unique id for their group
+        current_item_id = 0
+        self.current_bullet_id = 0
+
+        # keep track of how many special items spawned, to remove any extras after
+        # the removal is special items is done after, so that it is not always the same item which gets priority
+        # this is because the tilemap_data is in the same order every time for a map
+        special_items_spawned = 0
+
+        # add each item to a dictionary to keep track if it is active or not
+        for x, y, spawn_type in load_item_spawns(path.join(self.map_folder, self.game['current map'])):
+            self.item_positions[current_item_id] = Vec(x, y)
+            self.game['items'][current_item_id] = [True, spawn_type]
+            # choose a random item only if it is a random item spawn
+            if spawn_type == "random":
+                item_name = choice(ITEM_WEIGHTS_LIST)
+                self.game['items'][current_item_id].append(item_name)
+            else:
+                self.game['items'][current_item_id].append(spawn_type)
+                if spawn_type in SPECIAL_ITEMS:
+                    special_items_spawned += 1
+            current_item_id += 1
+
+        # get special items that are currently spawned
+        spawned_special_item_ids = []
+        for item_id, item_data in self.game['items'].items():
+            if item_data[1] in SPECIAL_ITEMS:
+                spawned_special_item_ids.append(item_id)
+
+        # choose random ones to despawn until the desired limit is reached
+        while special_items_spawned > SPECIAL_ITEM_MAX_FIRST_SPAWN:
+            special_items_spawned -= 1
+            despawn_special_item_id = choice(spawned_special_item_ids)
+            # make the item inactive
+            self.game['items'][despawn_special_item_id][0] = False
+            self.schedule_item_respawn(despawn_special_item_id)
+
+        # reset unplayed maps if it is empty
+        if len(self.unplayed_maps) == 0:
+            self.unplayed_maps = self.maps.copy()
+            print(f"\nAll Maps Have Been Played In Room {self.room_id}, Refilled Map Selection With All Maps")
+
+        print(f"\nWaiting {END_GAME_LENGTH / 1000.0} Seconds Until The Game In Room {self.room_id} Is Started...")
+
+    def update_score_time(self):
+        # update the time until the next game starts, returns True once enough time has passed
+        self.current_game_end_time = self.tick_clock.time_since(self.game_end_tick) * 1000  # in milliseconds
+        self.game_end_time_left = (END_GAME_LENGTH - self.current_game_end_time) / 1000.0
+        self.game['score time'] = self.game_end_time_left
+        return self.current_game_end_time >= END_GAME_LENGTH
+
+    def start_game(self):
+        self.game_start_tick = self.tick_clock.ticks
+
+        # turn the game back on
+        self.game['active'] = True
+
+        print(f"\nThe Game In Room {self.room_id} Is Now Active")
+
+    def schedule_item_respawn(self, item_id):
+        # the respawn is cancelled when the game ends
+        game_id = self.current_game_id
+        self.timers.schedule(self.item_respawn_time(item_id), self.respawn_item, item_id, game_id, group=game_id)
+
+    def item_respawn_time(self, item_id):
+        # the time until the item respawns depends on the item, in seconds
+        if self.game['items'][item_id][1] in SPECIAL_ITEMS:
+            return randint(SPECIAL_ITEM_RESPAWN_TIME_MIN, SPECIAL_ITEM_RESPAWN_TIME_MAX)
+        else:
+            return NORMAL_ITEM_RESPAWN_TIME
+
+    def set_item(self, item_id, active, game_id):
+        # a client can pick up an item right as the game ends, so items of a map that is not being played are ignored
+        if self.current_game_id != game_id or item_id not in self.game['items']:
+            return
+        was_active = self.game['items'][item_id][0]
+        self.game['items'][item_id][0] = active
+        # more than one client can pick up the same item, it only respawns once
+        if was_active and not active:
+            self.schedule_item_respawn(item_id)
+
+    def respawn_item(self, item_id, game_id):
+        # the game_id makes sure an item from a different game isn't respawned
+        # a client can pick up an item right as the game ends, after the respawns of the game were cancelled
+        if self.current_game_id == game_id:
+            # if it is a random item spawn, choose the random item that will spawn
+            if self.game['items'][item_id][1] == "random":
+                item_name = choice(ITEM_WEIGHTS_LIST)
+                self.game['items'][item_id][2] = item_name
+                self.game['items'][item_id][0] = True
+            else:
+                self.game['items'][item_id][0] = True
+
+    def queue_change(self, function, *args):
+        # run the function at the start of the next tick
+        with self.changes_lock:
+            self.changes.append((function, args))
+
+    def apply_changes(self):
+        # the changes are swapped out first so none queued meanwhile are lost
+        with self.changes_lock:
+            changes = self.changes
+            self.changes = []
+        for function, args in changes:
+            function(*args)
+
+    def add_player(self, player_id, player):
+        # the clients' threads change self.players, the game has its own copy that only the tick changes
+        self.players[player_id] = player
+        self.queue_change(self.join_game, player_id, copy(player))
+
+    def remove_player(self, player_id):
+        del self.players[player_id]
+        self.queue_change(self.leave_game, player_id)
+
+    def join_game(self, player_id, player):
+        self.game['players'][player_id] = player
+
+    def leave_game(self, player_id):
+        self.game['players'].pop(player_id, None)
+        self.bullet_hit_ticks.pop(player_id, None)
+
+    def update_player(self, player_id, attributes):
+        # the player can leave before the change is made
+        player = self.game['players'].get(player_id)
+        if player is not None:
+            for attr, value in attributes.items():
+                setattr(player, attr, value)
+
+    def add_bullet(self, pos, angle, owner_player_id, game_id):
+        # bullets launched right as the game ended are not added to the next game
+        if self.current_game_id != game_id:
+            return
+        self.game['bullets'].add(self.current_bullet_id, pos, angle, owner_player_id, self.tick_clock.ticks)
+        self.current_bullet_id += 1
+
+    def kill_bullet(self, bullet_id, game_id):
+        # bullet ids start from 0 again every game, so a bullet of the game that ended could have the id of a new one
+        if self.current_game_id == game_id:
+            self.game['bullets'].remove(bullet_id)
+
+    def bullet_hits(self):
+        bullets = self.game['bullets']
+        for player_id, player in list(self.game['players'].items()):
+            hits = bullets.hits(player.pos, player_id)
+            if not hits.any():
+                continue
+            owner_player_id = int(bullets.owner[hits.argmax()])
+            bullets.remove_where(hits)
+            # only destroy the player if it can be legally killed
+            if not self.can_be_killed(player_id, player):
+                continue
+            self.bullet_hit_ticks[player_id] = self.tick_clock.ticks
+            self.destroy_player(player_id, owner_player_id)
+
+    def can_be_killed(self, player_id, player):
+        if player.power_invincible:
+            return False
+        if player.respawn is not False or player.current_respawn_time is not False:
+            return False
+        if player.current_crash_time is not False:
+            return False
+        # the client takes a moment to say its player crashed, so a player isn't destroyed again until then
+        last_hit_tick = self.bullet_hit_ticks.get(player_id)
+        if last_hit_tick is None:
+            return True
+        return (self.tick_clock.ticks - last_hit_tick) * self.tick_clock.tick_length * 1000 >= PLAYER_CRASH_DURATION
+
+    def queue_command(self, player_id, command):
+        if player_id not in self.jitter_buffers:
+            self.jitter_buffers[player_id] = JitterBuffer()
+        self.jitter_buffers[player_id].add(command)
+
+    def play_commands(self):
+        # move players with the commands their clients sent
+        for player_id, jitter_buffer in list(self.jitter_buffers.items()):
+            player = self.game['players'].get(player_id)
+            if player is None:
+                # the player has left the room
+                del self.jitter_buffers[player_id]
+                continue
+            command = jitter_buffer.next_command()
+            if command is not None:
+                player.keys, player.pos, player.rot = command[1:]
+
+    def tick(self):
+        # moves the room forward one tick, returns True once the game is over and a new game has to be prepared
+        # counted here, as a new game can start before every due tick is run
+        self.tick_clock.ticks += 1
+        self.apply_changes()
+        self.timers.run_due()
+        if self.game['active']:
+            game_over = self.update_game()
+        else:
+            # players still move on the score screen
+            self.play_commands()
+            if self.update_score_time():
+                self.start_game()
+            game_over = False
+        self.publish()
+        return game_over
+
+    def publish(self):
+        self.snapshot = freeze_state(game_state(self.game))
+
+    def update_game(self):
+        self.play_commands()
+
+        # move bullets, then remove the ones that went as far as they can, hit a wall, or hit a player
+        bullets = self.game['bullets']
+        bullets.move(self.tick_clock.tick_length)
+        bullets.remove_where(bullets.expired(self.tick_clock.ticks, self.tick_clock.tick_length)
+                             | self.wall_grid.collide(bullets))
+        self.bullet_hits()
+
+        # current game times
+        time_since_game_start = self.tick_clock.time_since(self.game_start_tick) // 1.0  # in whole seconds
+        self.game_time_left = GAME_LENGTH - time_since_game_start
+        self.game['game time'] = self.game_time_left
+
+        # returns True when the game is over
+        return time_since_game_start > GAME_LENGTH
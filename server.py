@@ -1,39 +1,41 @@
 from os import path, listdir
-from time import sleep
-from random import randint, choice
+from time import sleep, monotonic, perf_counter
+from struct import error as StructError
 import socket
+from threading import Lock
 from _thread import start_new_thread
-from pickle import dumps, loads
 import pygame as pg
-from pygame.math import Vector2 as Vec
-import pytmx
 from entities import NetPlayer
+from network import Session
+from codec import (encode, decode_join, decode_update, decode_state, decode_events, decode_profile, encode_override,
+                   encode_snapshot, player_pos, bullet_pos, invalid_players, message_type, NO_BASE, EMPTY_STATE, ECHO,
+                   ANY_ROOM, NO_SESSION, EVENTS_MESSAGE, PING_MESSAGE, PROFILE_MESSAGE, LEAVE_MESSAGE,
+                   MAX_STRING_LENGTH)
+from compression import choose_compression, NO_COMPRESSION
+from room import Room
 from tilemap import format_map
 from settings import *
 
 
 class Server:
-    def __init__(self):
+    def __init__(self, room_ids=None):
         # start pygame
         pg.init()
         self.icon = None
         self.screen = None
         self.window_clock = None
-        self.game_clock = None
         self.window_dt = 0.0
-        self.game_dt = 0.0
         # start time
         self.server_start_time = pg.time.get_ticks() // 1000.0  # in whole seconds
-        self.game_start_time = 0
-        self.game_time_left = 0
-        self.game_end_time = 0
-        self.current_game_end_time = 0
-        self.game_end_time_left = 0
         # get machine's information to create a server
         self.server_name = socket.gethostname()
         self.server_ip = socket.gethostbyname(self.server_name)
         self.server_port = PORT
+        # the same as the tcp port unless the server is a worker of a supervisor, clients are told it when verified
+        self.udp_port = None
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # clients that use udp send their player's state and get snapshots over this socket
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         # server attributes
         self.running = True
         self.open = True
@@ -41,29 +43,31 @@ class Server:
         self.threaded_clients = {}  # if client id is connected or not
         self.client_id_username = {}  # client id to username finder
         self.client_changes = {}
+        # the tick, the command line, and the clients' threads all add changes, while a client's thread sends them
+        self.client_changes_lock = Lock()
+        self.sessions = {}  # client id to the session of its connection
+        # session token to the client id of a player kept after its client lost its connection, so it can be resumed
+        self.held_players = {}
+        # a client resuming its player and its old connection closing can happen at once
+        self.session_lock = Lock()
         self.server_commands = ["help", "listall", "getusername", "getid", "setattr", "setusername", "setcolor",
                                 "kick", "kickall", "respawn", "freeze", "unfreeze", "freezeall", "unfreezeall",
-                                "setitem", "addammo", "open", "close"]
+                                "setitem", "addammo", "open", "close", "compression", "telemetry", "rooms"]
         self.current_player = 0  # the current client id
         # game attributes
         self.maps = []
-        self.unplayed_maps = []
-        self.current_bullet_id = 0
-        self.current_game_id = 0
-        # create the game
-        self.game = {"players": {},
-                     "current map": None,
-                     "game time": self.game_time_left,
-                     "score time": self.game_end_time_left,
-                     "items": {},
-                     "bullets": {},
-                     "active": True
-                     }
+        # every room plays its own game, clients share the sockets and threads of the server
+        self.rooms = []
+        self.player_rooms = {}  # client id to the room the client is playing in
+        # snapshots are numbered by the tick they were made on, which is the same for every client
+        self.current_tick = 0
+        # the snapshots encoded this tick
+        self.tick_snapshots = {}
         # load data
         self.map_folder = None
-        self.load()
+        self.load(range(ROOMS) if room_ids is None else room_ids)
 
-    def load(self):
+    def load(self, room_ids):
         # folders
         game_folder = path.dirname(__file__)
         img_folder = path.join(game_folder, "img")
@@ -78,14 +82,18 @@ class Server:
         for filename in listdir(map_folder):
             if filename.endswith(".tmx") and filename != MENU_BG_IMG and filename != GAME_BG_IMG:
                 self.maps.append(filename)
-        # create another list of maps, where random maps will be popped from
-        # this will make sure the same maps aren't chosen, but it is still random
-        self.unplayed_maps = self.maps.copy()
+
+        # create the rooms, each goes through the maps in its own order
+        for room_id in room_ids:
+            self.rooms.append(Room(room_id, self.maps, self.map_folder, self.bullet_hit))
 
     def create_socket(self):
         # try to create a server, port must be unused
+        if self.udp_port is None:
+            self.udp_port = self.server_port
         try:
             self.socket.bind((self.server_name, self.server_port))
+            self.udp_socket.bind((self.server_name, self.udp_port))
         except socket.error as e:
             print(e)
             print(f"Error Creating A Server On {self.server_name} At {self.server_ip}:{self.server_port}")
@@ -99,8 +107,8 @@ class Server:
         # start a thread for input
         start_new_thread(self.threaded_input, ())
 
-        # start the game thread
-        start_new_thread(self.threaded_game, ())
+        # start the game and snapshot threads
+        self.start_games()
 
         # start the accept new connections thread
         start_new_thread(self.threaded_socket, ())
@@ -109,44 +117,62 @@ class Server:
             # pause
             self.window_dt = self.window_clock.tick(FPS) / 1000.0
 
-            # events
-            for event in pg.event.get():
-                if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
-                    self.end()
-
-            # update
-            pg.display.set_caption(
-                f"Server - IP: {self.server_ip} - Port: {self.server_port} - Clients: {len(self.connections)}")
-
-            # draw
-            self.screen.fill(WHITE)
-            pg.display.flip()
+            self.update_window()
 
         # quit program
         print("Quiting Pygame...")
         pg.quit()
         print("\nProcess Finished")
 
+    def start_games(self):
+        # start a game thread for every room
+        for room in self.rooms:
+            start_new_thread(self.threaded_game, (room,))
+
+        # start the thread sending snapshots to every client
+        start_new_thread(self.threaded_broadcast, ())
+
+    def update_window(self):
+        # events
+        for event in pg.event.get():
+            if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+                self.end()
+
+        # update
+        pg.display.set_caption(
+            f"Server - IP: {self.server_ip} - Port: {self.server_port} - Clients: {len(self.connections)}")
+
+        # draw
+        self.screen.fill(WHITE)
+        pg.display.flip()
+
     def threaded_socket(self):
         # create a socket to host the server
         self.create_socket()
 
         # have the server socket start listening for client connections
         self.socket.listen()
-        print(f"\nServer Started On {self.server_name}:\n\t- IP: {self.server_ip}\n\t- Port: {self.server_port}")
-        print("Waiting for a connection...")
+        # start the thread for clients using udp
+        start_new_thread(self.threaded_udp, ())
+        self.print_started()
 
         while self.running:
             try:
                 conn, addr = self.socket.accept()
-
-                print(f"\nClient {self.current_player} Has Connected From IP: {addr[0]}")
-
-                start_new_thread(self.threaded_client, (conn, self.current_player))
-                self.current_player += 1
+                self.accept_client(conn, addr)
             except ConnectionAbortedError:
                 print("Socket Connection Aborted - Server Closed")
 
+    def accept_client(self, conn, addr):
+        print(f"\nClient {self.current_player} Has Connected From IP: {addr[0]}")
+
+        start_new_thread(self.threaded_client, (conn, self.current_player))
+        self.current_player += 1
+
+    def print_started(self):
+        print(f"\nServer Started On {self.server_name}:\n\t- IP: {self.server_ip}\n\t- Port: {self.server_port}")
+        print("Waiting for a connection...")
+
     def end(self):
         print("\nStarting Server Termination")
         # stop all loops
@@ -155,137 +181,29 @@ class Server:
         # close down the socket
         print("Closing Server Socket...")
         self.socket.close()
+        self.udp_socket.close()
 
-    def new_game(self):
-        # set the game to inactive
-        self.game['active'] = False
-
-        # a new game is started so changed the id up one
-        self.current_game_id += 1
-
-        # get the current time to figure out how long until a new game should start
-        self.game_end_time = pg.time.get_ticks()
-
-        # get the game end time
-        self.game_end_time = pg.time.get_ticks()
-
-        # start a new game on the server
-        print("\nStarting A New Game...")
-
-        # select a new map that hasn"t been played in the current cycle through all the maps
-        self.game['current map'] = self.unplayed_maps.pop(randint(0, (len(self.unplayed_maps) - 1)))
-        print(f"The Chosen Map Is: {format_map(self.game['current map'])}")
-
-        # reset game data
-        self.game['items'].clear()
-        self.game['bullets'].clear()
-
-        # counters to give each item spawn and bullet a unique id for their group
-        current_item_id = 0
-        self.current_bullet_id = 0
-
-        # keep track of how many special items spawned, to remove any extras after
-        # the removal is special items is done after, so that it is not always the same item which gets priority
-        # this is because the tilemap_data is in the same order every time for a map
-        special_items_spawned = 0
-
-        # get data about the current map
-        tilemap_data = pytmx.load_pygame(path.join(self.map_folder, self.game['current map']), pixelalpha=True)
-        for tile_object in tilemap_data.objects:
-            # add each item to a dictionary to keep track if it is active or not
-            if tile_object.type == "item":
-                self.game['items'][current_item_id] = [True, tile_object.name]
-                # choose a random item only if it is a random item spawn
-                if tile_object.name == "random":
-                    item_name = choice(ITEM_WEIGHTS_LIST)
-                    self.game['items'][current_item_id].append(item_name)
-                else:
-                    self.game['items'][current_item_id].append(tile_object.name)
-                    if tile_object.name in SPECIAL_ITEMS:
-                        special_items_spawned += 1
-                current_item_id += 1
-
-        # get special items that are currently spawned
-        spawned_special_item_ids = []
-        for item_id, item_data in self.game['items'].items():
-            if item_data[1] in SPECIAL_ITEMS:
-                spawned_special_item_ids.append(item_id)
-
-        # choose random ones to despawn until the desired limit is reached
-        while special_items_spawned > SPECIAL_ITEM_MAX_FIRST_SPAWN:
-            special_items_spawned -= 1
-            despawn_special_item_id = choice(spawned_special_item_ids)
-            # make the item inactive
-            self.game['items'][despawn_special_item_id][0] = False
-            start_new_thread(self.threaded_item_respawn, (despawn_special_item_id, self.current_game_id))
-
-        # reset unplayed maps if it is empty
-        if len(self.unplayed_maps) == 0:
-            self.unplayed_maps = self.maps.copy()
-            print("\nAll Maps Have Been Played, Refilled Map Selection With All Maps")
-
-        print(f"\nWaiting {END_GAME_LENGTH / 1000.0} Seconds Until The Game Is Started...")
-
-        # wait until enough time has passed
-        self.current_game_end_time = pg.time.get_ticks() - self.game_end_time
-        self.game_end_time_left = (END_GAME_LENGTH - self.current_game_end_time) / 1000.0
-        self.game['score time'] = self.game_end_time_left
-        while self.current_game_end_time < END_GAME_LENGTH:
-            sleep(0.5)
-            self.current_game_end_time = pg.time.get_ticks() - self.game_end_time
-            self.game_end_time_left = (END_GAME_LENGTH - self.current_game_end_time) / 1000.0
-            self.game['score time'] = self.game_end_time_left
-
-        self.game_start_time = pg.time.get_ticks()
-
-        # turn the game back on
-        self.game['active'] = True
-
-        print("\nThe Game Is Now Active")
-
-    def threaded_item_respawn(self, item_id, game_id):
-        # wait until enough time has passed, then set the item's active state back to True
-        # the time until the item respawns depends on the item
-        # the game_id makes sure this thread doesn't respawn an item from a different game
-        # if this function is called right before a game ends, it would sleep through the eng game screen
-        if self.game['items'][item_id][1] in SPECIAL_ITEMS:
-            sleep(randint(SPECIAL_ITEM_RESPAWN_TIME_MIN, SPECIAL_ITEM_RESPAWN_TIME_MAX))
-        else:
-            sleep(NORMAL_ITEM_RESPAWN_TIME)
-        if self.current_game_id == game_id:
-            # if it is a random item spawn, choose the random item that will spawn
-            if self.game['items'][item_id][1] == "random":
-                item_name = choice(ITEM_WEIGHTS_LIST)
-                self.game['items'][item_id][2] = item_name
-                self.game['items'][item_id][0] = True
-            else:
-                self.game['items'][item_id][0] = True
+    def bullet_hit(self, player_id, killed_by_player_id):
+        # a bullet hit the player, the client destroys its player and says who killed it in its deaths by
+        if player_id in self.client_changes:
+            self.overwrite_player_data(player_id, "destroy", (True, killed_by_player_id))
 
-    def threaded_game(self):
-        # setup
-        self.game_clock = pg.time.Clock()
+    def threaded_game(self, room):
         # start a new game
-        self.new_game()
+        room.prepare_new_game()
+        room.tick_clock.restart()
         # start the game timer
         while self.running:
-            # pause
-            self.game_dt = self.game_clock.tick(FPS) / 1000.0
-
-            # update
-            # move bullets
-            for bullet_id, bullet_data in self.game['bullets'].items():
-                angle = self.game['bullets'][bullet_id][1]
-                self.game['bullets'][bullet_id][0] += Vec(BULLET_VEL, 0).rotate(-angle) * self.game_dt
-
-            # current game times
-            time_since_game_start = (pg.time.get_ticks() - self.game_start_time) // 1000.0  # in whole seconds
-            self.game_time_left = GAME_LENGTH - time_since_game_start
-            self.game['game time'] = self.game_time_left
-
-            # reset the game after enough time has passed
-            if time_since_game_start > GAME_LENGTH:
-                # end current game and start a new game
-                self.new_game()
+            # pause until the next tick is due
+            sleep(room.tick_clock.time_until_tick())
+
+            # run every tick that is due, so the game keeps the same pace even after a slow tick
+            for tick in range(room.tick_clock.due_ticks()):
+                # reset the game after enough time has passed
+                if room.tick():
+                    # end current game and start a new game
+                    room.prepare_new_game()
+                    break
 
     def verify_id_command(self, min_length, command):
         if len(command) >= min_length:
@@ -321,183 +239,230 @@ class Server:
     def threaded_input(self):
         while self.running:
             # split the text command received into words
-            command = input().split()
-            # only execute a command if
-            if command:
-
-                # show a list of valid commands
-                # syntax: help
-                if command[0] == "help":
-                    print("Valid Commands Are As Follows:")
-                    for command in self.server_commands:
-                        print(f"\t- {command}")
-
-                # list all player ids and their respective usernames connected to the server
-                # syntax: listall
-                elif command[0] == "listall":
-                    if len(self.game['players']) > 0:
-                        print("All Players Connected Are As Follows:")
-                        for player_id, username in self.client_id_username.items():
-                            if type(player_id) is int:
-                                print(f"\t- ID: {player_id} - Username: {username}")
-                    else:
-                        print("Command Error: There Are No Clients Currently Connected To The Server")
-
-                # get a player username by id
-                # syntax: getusername <player_id>
-                elif command[0] == "getusername":
-                    if self.verify_id_command(2, command):
-                        player_id = int(command[1])
-                        print(
-                            f"Client ID {player_id} Has The Username {self.client_id_username[player_id]}")
-
-                # get a player id by username
-                # syntax: getid <player_username>
-                elif command[0] == "getid":
-                    if self.verify_name_command(2, command):
-                        username = " ".join(command[1:])
-                        player_id = self.client_id_username[username]
-                        print(f"Client With The Username {username} Has The ID {player_id}")
-
-                # change the username of a client
-                # syntax: setusername <client_id> <new_player_username>
-                elif command[0] == "setusername":
-                    if self.verify_id_command(2, command):
-                        player_id = int(command[1])
-                        new_username = " ".join(command[2:])
-
-                        self.overwrite_player_data(player_id, "username", new_username)
-                        print(f"Changed The Username Of Client ID {player_id} To {new_username}")
-
-                # change the username color of a client
-                elif command[0] == "setcolor":
-                    pass
-                    #if self.verify_id_command()
-
-                # kick a client from the server
-                # syntax: kick <client_id>
-                elif command[0] == "kick":
-                    if self.verify_id_command(2, command):
-                        player_id = int(command[1])
+            self.run_command(input().split())
+
+    def run_command(self, command):
+        # only execute a command if
+        if command:
+
+            # show a list of valid commands
+            # syntax: help
+            if command[0] == "help":
+                print("Valid Commands Are As Follows:")
+                for command in self.server_commands:
+                    print(f"\t- {command}")
+
+            # list all player ids and their respective usernames connected to the server
+            # syntax: listall
+            elif command[0] == "listall":
+                if len(self.player_rooms) > 0:
+                    print("All Players Connected Are As Follows:")
+                    for player_id, username in list(self.client_id_username.items()):
+                        if type(player_id) is int and player_id in self.player_rooms:
+                            print(f"\t- ID: {player_id} - Username: {username} - "
+                                  f"Room: {self.player_rooms[player_id].room_id}")
+                else:
+                    print("Command Error: There Are No Clients Currently Connected To The Server")
+
+            # get a player username by id
+            # syntax: getusername <player_id>
+            elif command[0] == "getusername":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    print(
+                        f"Client ID {player_id} Has The Username {self.client_id_username[player_id]}")
+
+            # get a player id by username
+            # syntax: getid <player_username>
+            elif command[0] == "getid":
+                if self.verify_name_command(2, command):
+                    username = " ".join(command[1:])
+                    player_id = self.client_id_username[username]
+                    print(f"Client With The Username {username} Has The ID {player_id}")
+
+            # change the username of a client
+            # syntax: setusername <client_id> <new_player_username>
+            elif command[0] == "setusername":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    new_username = " ".join(command[2:])
+
+                    self.overwrite_player_data(player_id, "username", new_username)
+                    print(f"Changed The Username Of Client ID {player_id} To {new_username}")
+
+            # change the username color of a client
+            elif command[0] == "setcolor":
+                pass
+                #if self.verify_id_command()
+
+            # kick a client from the server
+            # syntax: kick <client_id>
+            elif command[0] == "kick":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    self.threaded_clients[player_id] = False
+                    print(f"Kicked Client {player_id}")
+
+            # kick all current players from the server
+            # syntax: kickall
+            elif command[0] == "kickall":
+                if len(self.player_rooms) > 0:
+                    print(f"All {len(self.player_rooms)} Clients Have Been Kicked From The Server")
+                    for player_id in list(self.player_rooms):
                         self.threaded_clients[player_id] = False
-                        print(f"Kicked Client {player_id}")
-
-                # kick all current players from the server
-                # syntax: kickall
-                elif command[0] == "kickall":
-                    if len(self.game['players']) > 0:
-                        print(f"All {len(self.game['players'])} Clients Have Been Kicked From The Server")
-                        for player_id in self.game['players']:
-                            self.threaded_clients[player_id] = False
-                    else:
-                        print("Command Error: There Are No Clients Currently Connected To The Server")
-
-                # change a player"s position to be the spawn location
-                # syntax: respawn <client_id>
-                elif command[0] == "respawn":
-                    if self.verify_id_command(2, command):
-                        player_id = int(command[1])
-                        self.overwrite_player_data(player_id, "respawn", True)
-                        print(f"Respawned The Player With Client ID {player_id}")
-
-                # stop a player from moving
-                # syntax: freeze <client_id>
-                elif command[0] == "freeze":
-                    if self.verify_id_command(2, command):
-                        player_id = int(command[1])
-                        self.overwrite_player_data(player_id, "frozen", True)
-                        print(f"Player {player_id} Has Been Frozen")
-
-                # allow a player to move again
-                # syntax: unfreeze <client_id>
-                elif command[0] == "unfreeze":
-                    if self.verify_id_command(2, command):
-                        player_id = int(command[1])
-                        self.overwrite_player_data(player_id, "frozen", False)
-                        print(f"Player {player_id} Has Been Unfrozen")
-
-                # freeze all players
-                # syntax: freezeall
-                elif command[0] == "freezeall":
-                    for player_id in self.game['players']:
-                        self.overwrite_player_data(player_id, "frozen", True)
-                    print("All Players Have Been Frozen")
-
-                # unfreeze all players
-                # syntax: unfreezeall
-                elif command[0] == "unfreezeall":
-                    for player_id in self.game['players']:
-                        self.overwrite_player_data(player_id, "frozen", False)
-                    print("All Players Have Been Unfrozen")
-
-                # set an item to either be active (True) or inactive (False)
-                # syntax: setitem <item_id> <status>
-                elif command[0] == "setitem":
-                    item_id = command[1]
-                    # if the item id passed in is an integer
-                    if item_id.isdigit():
-                        item_id = int(item_id)
-                        # if the item id exisits
-                        if item_id in self.game['items']:
-                            if command[2] == "True" or command[2] == "False":
-                                if command[2] == "True":
-                                    # make the item active
-                                    self.game['items'][item_id][0] = True
-                                    print(f"The Item With ID {item_id} Is Now Active")
-                                else:
-                                    # make the item inactive
-                                    self.game['items'][item_id][0] = False
-                                    start_new_thread(self.threaded_item_respawn, (item_id, self.current_game_id))
-                                    print(f"The Item With ID {item_id} Is Now Inactive")
+                else:
+                    print("Command Error: There Are No Clients Currently Connected To The Server")
+
+            # change a player"s position to be the spawn location
+            # syntax: respawn <client_id>
+            elif command[0] == "respawn":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    self.overwrite_player_data(player_id, "respawn", True)
+                    print(f"Respawned The Player With Client ID {player_id}")
+
+            # stop a player from moving
+            # syntax: freeze <client_id>
+            elif command[0] == "freeze":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    self.overwrite_player_data(player_id, "frozen", True)
+                    print(f"Player {player_id} Has Been Frozen")
+
+            # allow a player to move again
+            # syntax: unfreeze <client_id>
+            elif command[0] == "unfreeze":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    self.overwrite_player_data(player_id, "frozen", False)
+                    print(f"Player {player_id} Has Been Unfrozen")
+
+            # freeze all players
+            # syntax: freezeall
+            elif command[0] == "freezeall":
+                for player_id in list(self.player_rooms):
+                    self.overwrite_player_data(player_id, "frozen", True)
+                print("All Players Have Been Frozen")
+
+            # unfreeze all players
+            # syntax: unfreezeall
+            elif command[0] == "unfreezeall":
+                for player_id in list(self.player_rooms):
+                    self.overwrite_player_data(player_id, "frozen", False)
+                print("All Players Have Been Unfrozen")
+
+            # set an item to either be active (True) or inactive (False), in the first room if no room is given
+            # syntax: setitem <item_id> <status> [<room_id>]
+            elif command[0] == "setitem":
+                item_id = command[1]
+                room_id = command[3] if len(command) > 3 else str(self.rooms[0].room_id)
+                room = self.find_room(int(room_id)) if room_id.isdigit() else None
+                # if the item id passed in is an integer
+                if room is None:
+                    print("Room ID Not Found, Do rooms For A List Of Rooms")
+                elif item_id.isdigit():
+                    item_id = int(item_id)
+                    # if the item id exisits
+                    if item_id in room.game['items']:
+                        if command[2] == "True" or command[2] == "False":
+                            # the item is changed on the next tick of its room
+                            if command[2] == "True":
+                                # make the item active
+                                room.queue_change(room.set_item, item_id, True, room.current_game_id)
+                                print(f"The Item With ID {item_id} In Room {room.room_id} Is Now Active")
                             else:
-                                print("You Must Pass In \"True\" or \"False\" After The Item ID To Set The State")
+                                # make the item inactive
+                                room.queue_change(room.set_item, item_id, False, room.current_game_id)
+                                print(f"The Item With ID {item_id} In Room {room.room_id} Is Now Inactive")
                         else:
-                            print("Item ID Not Found, "
-                                  f"Item IDs On The Current Map Go From 0-{(len(self.game['items']) - 1)}")
+                            print("You Must Pass In \"True\" or \"False\" After The Item ID To Set The State")
+                    else:
+                        print("Item ID Not Found, "
+                              f"Item IDs On The Current Map Go From 0-{(len(room.game['items']) - 1)}")
+                else:
+                    print("Item IDs Must Be An Integer")
+
+            # give or remove ammo from a player
+            # syntax: addammo <client_id> <amount>
+            elif command[0] == "addammo":
+                if self.verify_id_command(2, command):
+                    player_id = int(command[1])
+                    amount = command[2]
+                    if amount.isdigit():
+                        amount = int(amount)
+                        self.overwrite_player_data(player_id, "ammo", amount, "add")
+                        print(f"Player {player_id} Has Been Given {amount} Ammo")
                     else:
-                        print("Item IDs Must Be An Integer")
+                        print("The Amount Of Ammo Must Be An Integer")
+
+            # open the server to new client connections
+            # syntax: open
+            elif command[0] == "open":
+                if self.open:
+                    print("Server Is Already Open")
+                else:
+                    self.open = True
+                    print("Server Will Now Open")
+
+            # close the server to new client connections
+            # syntax: close
+            elif command[0] == "close":
+                if not self.open:
+                    print("Server Is Already Closed")
+                else:
+                    self.open = False
+                    print("Server Will Now Close")
+
+            # show how well compression works for each client
+            # syntax: compression
+            elif command[0] == "compression":
+                if self.sessions:
+                    print("Compression For Each Client:")
+                    for player_id, session in list(self.sessions.items()):
+                        if session.compressor is not None:
+                            print(f"\t- ID: {player_id} - {session.compressor.stats()}")
+                else:
+                    print("Command Error: There Are No Clients Currently Connected To The Server")
 
-                # give or remove ammo from a player
-                # syntax: addammo <client_id> <amount>
-                elif command[0] == "addammo":
+            # show the round trip time, bytes and messages per second, and encode and decode time of clients
+            # syntax: telemetry [<client_id>]
+            elif command[0] == "telemetry":
+                if len(command) > 1:
                     if self.verify_id_command(2, command):
                         player_id = int(command[1])
-                        amount = command[2]
-                        if amount.isdigit():
-                            amount = int(amount)
-                            self.overwrite_player_data(player_id, "ammo", amount, "add")
-                            print(f"Player {player_id} Has Been Given {amount} Ammo")
-                        else:
-                            print("The Amount Of Ammo Must Be An Integer")
-
-                # open the server to new client connections
-                # syntax: open
-                elif command[0] == "open":
-                    if self.open:
-                        print("Server Is Already Open")
-                    else:
-                        self.open = True
-                        print("Server Will Now Open")
-
-                # close the server to new client connections
-                # syntax: close
-                elif command[0] == "close":
-                    if not self.open:
-                        print("Server Is Already Closed")
+                        print(f"Telemetry For Client ID {player_id}:")
+                        for line in self.sessions[player_id].telemetry.lines():
+                            print(f"\t- {line}")
+                elif self.sessions:
+                    print("Telemetry For Each Client:")
+                    for player_id, session in list(self.sessions.items()):
+                        print(f"\t- ID: {player_id} - {' - '.join(session.telemetry.lines())}")
+                else:
+                    print("Command Error: There Are No Clients Currently Connected To The Server")
+
+            # show the map, players, and time left of every room
+            # syntax: rooms
+            elif command[0] == "rooms":
+                print("All Rooms Are As Follows:")
+                for room in self.rooms:
+                    if room.game['active']:
+                        status = f"Game Time Left: {room.game['game time']:.0f}"
                     else:
-                        self.open = False
-                        print("Server Will Now Close")
-
-                # end the program
-                # syntax: end
-                elif command[0] == "end":
-                    self.end()
+                        status = f"Next Game In: {max(room.game['score time'], 0):.0f}"
+                    print(f"\t- Room: {room.room_id} - Map: {format_map(room.game['current map'] or '')} - "
+                          f"Players: {len(room.players)}/{MAX_CLIENTS} - {status} - "
+                          f"Overrun Ticks: {room.tick_clock.overruns} - Skipped Ticks: {room.tick_clock.skipped}")
 
-                else:
-                    print("Command Error: Not A Valid Command, Do help For A List Of Valid Commands")
+            # end the program
+            # syntax: end
+            elif command[0] == "end":
+                self.end()
 
             else:
-                print("Command Error: No Command Was Given")
+                print("Command Error: Not A Valid Command, Do help For A List Of Valid Commands")
+
+        else:
+            print("Command Error: No Command Was Given")
 
     def overwrite_player_data(self, player_id, attribute, new_value, overwrite_method="replace"):
         # replace the existing attribute value with the provided value
@@ -506,180 +471,624 @@ class Server:
                 # update stored data to match the new data if a username switch happened
                 self.client_id_username[player_id] = new_value
                 self.client_id_username[new_value] = player_id
-        # add the provided value to the existing attribute value
-        elif overwrite_method == "add":
-            old_value = getattr(self.game['players'][player_id], attribute)
-            new_value = old_value + new_value
-
-        # ensure the server will not ignore this change by accepting what the client sends
-        self.client_changes[player_id][attribute] = [True, new_value]
+        with self.client_changes_lock:
+            # add the provided value to the attribute value the client sends next
+            # adding to the value the client sends, instead of the value the server has now, keeps changes the client
+            # made meanwhile (such as shooting) so the client can line the change up with its own history
+            if overwrite_method == "add":
+                # add to a change that has not been sent to the client yet, so neither change is lost
+                changed, old_value, old_method = self.client_changes[player_id][attribute]
+                if changed:
+                    new_value = old_value + new_value
+                    overwrite_method = old_method
+
+            # ensure the server will not ignore this change by accepting what the client sends
+            self.client_changes[player_id][attribute] = [True, new_value, overwrite_method]
 
     def threaded_client(self, connection, player_id):
-        # save the connection to the server
-        self.connections[player_id] = connection
-        # client is connected
-        self.threaded_clients[player_id] = True
+        session = self.open_session(connection, player_id)
 
         # create a new player and send it to the new client
         # the new player is not added to the players dictionary of the game until (and if) they are verified
         new_player = NetPlayer(player_id)
-        connection.send(dumps(new_player))
+        session.send(encode(new_player))
 
-        # send verification to client
-        verify, reason, player_data = self.verify_client(connection)
-        connection.sendall(dumps((verify, reason)))
+        # send verification to client, with the token the client has to send with everything sent over udp
+        verify, reason, player_data, room = self.verify_client(player_id, session)
+        if player_data is not None:
+            compression = self.choose_compression(session, verify)
+            session.send(encode((verify, reason, session.token, compression, self.room_id(room), self.udp_port)))
+            session.set_compression(compression)
 
         if verify:
-            # add the verified player to the dictionary of players for the game
-            self.game['players'][player_id] = player_data
-
-            # update total player count
-            self.count_players()
-
-            # update the client id to username finder
-            self.client_id_username[player_id] = self.game['players'][player_id].username
-            self.client_id_username[self.game['players'][player_id].username] = player_id
+            if player_data.player_id == player_id:
+                self.add_player(player_id, player_data, room)
+            else:
+                # the client got back the player it had before it lost its connection
+                player_id = player_data.player_id
 
-            # reset overwrite data for this client
-            self.client_changes[player_id] = {}
-            player = self.game['players'][player_id]
-            for attr in player.__dict__.items():
-                # attr[0] is the attribute, attr[1] is the attributes value
-                self.client_changes[player_id][attr[0]] = [False, None]
+            # snapshots are sent over tcp on another thread, so this thread only has to wait for the client's messages
+            start_new_thread(self.threaded_sender, (session,))
 
             # this loop will only end when this client disconnects or the server disconnects this client
-            while self.threaded_clients[player_id]:
+            while self.threaded_clients[player_id] and not session.left:
                 try:
-                    # receive data for the client's player
-                    data = loads(connection.recv(RECEIVE_LIMIT))
-
-                    # the players that should be destroyed
-                    for overwrite_type, overwrite_data in data.overwrites.items():
-                        # only overwrite data if the client has data that needs overwriting
-                        if overwrite_data:
-                            # the client player collided with another player that now has to be destroyed
-                            if overwrite_type == "collisions":
-                                for collision_player_id in overwrite_data:
-                                    collision_player = self.game['players'][collision_player_id]
-                                    if collision_player.respawn is False and collision_player.current_respawn_time is False and collision_player.current_crash_time is False:
-                                        self.overwrite_player_data(collision_player_id, "destroy", (True, player_id))
-                            # the player picked up an item
-                            if overwrite_type == "items":
-                                for item_id in overwrite_data:
-                                    self.game['items'][item_id][0] = False
-                                    start_new_thread(self.threaded_item_respawn, (item_id, self.current_game_id))
-                            # the player launched a bullet
-                            elif overwrite_type == "new bullets":
-                                for new_bullet in overwrite_data:
-                                    self.game['bullets'][self.current_bullet_id] = new_bullet
-                                    self.current_bullet_id += 1
-                            # the player launched a bullet
-                            elif overwrite_type == "kill bullets":
-                                for kill_bullet_id in overwrite_data:
-                                    if kill_bullet_id in self.game['bullets'].keys():
-                                        del self.game['bullets'][kill_bullet_id]
-                            # this client's player was killed by another client's player
-                            elif overwrite_type == "deaths by":
-                                for killed_by_player_id in overwrite_data:
-                                    self.overwrite_player_data(player_id, "deaths", 1, "add")
-                                    self.overwrite_player_data(killed_by_player_id, "kills", 1, "add")
-                                    self.overwrite_player_data(killed_by_player_id, "score", 100, "add")
-                                    print(f"\nPlayer ID {player_id} Was Killed By Player ID {killed_by_player_id}")
-                            # clear the data so on the next loop this data isn't overwritten again
-                            overwrite_data.clear()
-
-                    # update the client id to username finder
-                    self.client_id_username[player_id] = self.game['players'][player_id].username
-                    self.client_id_username[self.game['players'][player_id].username] = player_id
-
-                    # update the client's player data
-                    # only do this if the game is currently active
-                    self.game['players'][player_id] = data
-
-                    # override the client's player data changed by the server
-                    for attr, value in self.client_changes[player_id].items():
-                        if value[0]:
-                            # overwrite the changes made by the client to the player data
-                            setattr(self.game['players'][player_id], attr, value[1])
-                    # reset overwrite data for this client
-                    self.client_changes[player_id] = {}
-                    player = self.game['players'][player_id]
-                    for attr in player.__dict__.items():
-                        # attr[0] is the attribute, attr[1] is the attribute's value
-                        self.client_changes[player_id][attr[0]] = [False, None]
-
-                    # send game data to the client if they are connected
-                    if not data:
-                        break
-                    else:
-                        reply = self.game
-                        connection.sendall(dumps(reply))
+                    reply = self.handle_message(player_id, session, session.buffer.receive())
+                    if reply is not None:
+                        session.send(reply)
                 except EOFError:
                     break
+                except (ValueError, StructError):
+                    # the message was too large or was not a valid message, or the reply could not be encoded
+                    break
                 except ConnectionResetError:
                     break
+                except OSError:
+                    # the connection was shut down by the udp thread, or by the client resuming on a new connection
+                    break
 
             # close the connection with the client that has disconnected
-            self.disconnect_client(player_id)
+            self.disconnect_client(player_id, session)
 
         else:
             # disconnect the unverified client
             print(f"Client {player_id} Denied Access:", reason)
 
-            self.disconnect_client(player_id)
+            self.disconnect_client(player_id, session)
 
-    def count_players(self):
-        print(f"There Are {len(self.game['players'])}/{MAX_CLIENTS} Clients Connected")
+    def open_session(self, connection, player_id):
+        # save the connection to the server
+        self.connections[player_id] = connection
+        # client is connected
+        self.threaded_clients[player_id] = True
+        # everything the server keeps track of for this client's connection
+        session = Session(connection)
+        self.sessions[player_id] = session
+        return session
+
+    def add_player(self, player_id, player_data, room):
+        # add the verified player to its room, it is in the room's game from the room's next tick
+        room.add_player(player_id, player_data)
+        self.player_rooms[player_id] = room
+
+        # update total player count
+        self.count_players(room)
+
+        # update the client id to username finder
+        self.client_id_username[player_id] = player_data.username
+        self.client_id_username[player_data.username] = player_id
+
+        # reset overwrite data for this client
+        self.client_changes[player_id] = {}
+        player = player_data
+        for attr in player.__dict__.items():
+            # attr[0] is the attribute, attr[1] is the attributes value
+            self.client_changes[player_id][attr[0]] = [False, None, "replace"]
+
+    def threaded_sender(self, session):
+        # a slow client only slows down the snapshots sent to itself
+        while True:
+            queued = session.next_messages()
+            if queued is None:
+                break
+            messages, snapshot = queued
+            try:
+                for message in messages:
+                    session.send(message)
+                if snapshot is not None:
+                    session.send(snapshot)
+                    session.sending = False
+            except OSError:
+                # the client disconnected, its client thread removes it
+                break
+
+    def handle_message(self, player_id, session, data):
+        # returns the changes the server made to the client's player, or None if the message doesn't get a reply
+        # if the client uses udp, only the data the server has to process is sent over tcp
+        if message_type(data) == EVENTS_MESSAGE:
+            start_time = perf_counter()
+            overwrites = decode_events(data)
+            session.telemetry.decoded(perf_counter() - start_time)
+            self.process_overwrites(player_id, overwrites)
+            return None
+        # a ping is sent straight back, so the client can time the round trip
+        if message_type(data) == PING_MESSAGE:
+            return bytes(data)
+        # the client is quitting, its connection is closed once this message is handled
+        if message_type(data) == LEAVE_MESSAGE:
+            session.left = True
+            return None
+
+        start_time = perf_counter()
+        # the fields of the client's player that change slowly, only sent when they change
+        if message_type(data) == PROFILE_MESSAGE:
+            attributes = decode_profile(data)
+            session.telemetry.decoded(perf_counter() - start_time)
+            self.apply_profile(player_id, attributes)
+        # what the client's player did this frame
+        else:
+            command, session.ack = decode_update(data)
+            session.telemetry.decoded(perf_counter() - start_time)
+            session.telemetry.snapshot_acked(session.ack)
+            self.apply_command(player_id, command)
+        return self.override_message(player_id)
+
+    def process_overwrites(self, player_id, overwrites):
+        # the events of a client only change the game of its own room
+        room = self.player_rooms[player_id]
+        for overwrite_type, overwrite_data in overwrites.items():
+            # only overwrite data if the client has data that needs overwriting
+            if overwrite_data:
+                # the client player collided with another player that now has to be destroyed
+                if overwrite_type == "collisions":
+                    for collision_player_id in overwrite_data:
+                        # ignore players that have already disconnected
+                        if collision_player_id not in room.players:
+                            continue
+                        collision_player = room.players[collision_player_id]
+                        if collision_player.respawn is False and collision_player.current_respawn_time is False and collision_player.current_crash_time is False:
+                            self.overwrite_player_data(collision_player_id, "destroy", (True, player_id))
+                # the items, and bullets, are changed on the next tick of the room
+                # the player picked up an item
+                if overwrite_type == "items":
+                    for item_id in overwrite_data:
+                        room.queue_change(room.set_item, item_id, False, room.current_game_id)
+                # the player launched a bullet
+                elif overwrite_type == "new bullets":
+                    # a client can only launch bullets from its own player, whatever owner it sent
+                    for pos, angle, owner_player_id in overwrite_data:
+                        room.queue_change(room.add_bullet, pos, angle, player_id, room.current_game_id)
+                # the player launched a bullet
+                elif overwrite_type == "kill bullets":
+                    for kill_bullet_id in overwrite_data:
+                        room.queue_change(room.kill_bullet, kill_bullet_id, room.current_game_id)
+                # this client's player was killed by another client's player
+                elif overwrite_type == "deaths by":
+                    for killed_by_player_id in overwrite_data:
+                        if killed_by_player_id not in room.players:
+                            continue
+                        self.overwrite_player_data(player_id, "deaths", 1, "add")
+                        self.overwrite_player_data(killed_by_player_id, "kills", 1, "add")
+                        self.overwrite_player_data(killed_by_player_id, "score", 100, "add")
+                        print(f"\nPlayer ID {player_id} Was Killed By Player ID {killed_by_player_id}")
+                # clear the data so on the next loop this data isn't overwritten again
+                overwrite_data.clear()
+
+    def apply_profile(self, player_id, attributes):
+        room = self.player_rooms[player_id]
+        player = room.players[player_id]
+        if "username" in attributes:
+            # update the client id to username finder
+            self.client_id_username.pop(player.username, None)
+            self.client_id_username[player_id] = attributes['username']
+            self.client_id_username[attributes['username']] = player_id
+        # the game's copy of the player is changed on the next tick of its room
+        for attr, value in attributes.items():
+            setattr(player, attr, value)
+        room.queue_change(room.update_player, player_id, attributes)
+
+    def apply_command(self, player_id, command):
+        # the player is moved by the command on a later tick of its room, once the jitter buffer plays it
+        # the input sequence is kept now, so changes made to the player are lined up with the client's newest frame
+        room = self.player_rooms[player_id]
+        room.players[player_id].input_sequence = command[0]
+        room.queue_change(room.update_player, player_id, {"input_sequence": command[0]})
+        room.queue_command(player_id, command)
+
+    def update_player(self, player_id):
+        room = self.player_rooms[player_id]
+        player = room.players[player_id]
+
+        # the client's thread and the udp thread can both send the changes
+        with self.client_changes_lock:
+            # reset overwrite data for this client, the changes are swapped out first so none made meanwhile are lost
+            reset_changes = {}
+            for attr in player.__dict__.items():
+                # attr[0] is the attribute, attr[1] is the attribute's value
+                reset_changes[attr[0]] = [False, None, "replace"]
+            client_changes = self.client_changes[player_id]
+            self.client_changes[player_id] = reset_changes
+
+            # override the client's player data changed by the server
+            overrides = {}
+            for attr, (changed, value, overwrite_method) in client_changes.items():
+                if changed:
+                    # overwrite the changes made by the client to the player data
+                    if overwrite_method == "add":
+                        value += getattr(player, attr)
+                    setattr(player, attr, value)
+                    overrides[attr] = value
+        # the game's copy of the player is changed on the next tick of its room
+        if overrides:
+            room.queue_change(room.update_player, player_id, overrides)
+        return list(overrides)
+
+    def override_message(self, player_id):
+        # the client keeps its own player, so changes the server made to it are sent back, None if there are none
+        overrides = self.update_player(player_id)
+        if overrides:
+            return encode_override(self.player_rooms[player_id].players[player_id], overrides)
+        return None
+
+    def make_snapshot(self, session, state, server_time):
+        # only send what changed since the latest snapshot the client has received
+        # if the client is too far behind, send everything in a keyframe
+        base_state = session.snapshots.get(session.ack)
+        if base_state is None:
+            base_tick = NO_BASE
+            base_state = EMPTY_STATE
+        else:
+            base_tick = session.ack
+        session.snapshots.add(self.current_tick, state)
+        # clients sent the same state since the same base are sent the same bytes, so it is only encoded once
+        # the states are kept with their snapshot, so their ids can't be reused by other states during the tick
+        key = (base_tick, id(base_state), id(state))
+        shared = self.tick_snapshots.get(key)
+        if shared is not None and shared[0] is base_state and shared[1] is state:
+            return shared[2]
+        start_time = perf_counter()
+        snapshot = encode_snapshot(self.current_tick, base_tick, base_state, state, server_time)
+        session.telemetry.encoded(perf_counter() - start_time)
+        self.tick_snapshots[key] = (base_state, state, snapshot)
+        return snapshot
+
+    def threaded_broadcast(self):
+        # every client is sent snapshots at the same rate, no matter how often it sends its player
+        next_time = monotonic()
+        while self.running:
+            next_time += 1.0 / SNAPSHOT_RATE
+            sleep(max(0.0, next_time - monotonic()))
+            self.broadcast_snapshots()
+
+    def broadcast_snapshots(self):
+        # clients use the time the snapshot was made to show it at the same pace the server made it
+        server_time = pg.time.get_ticks() & 0xFFFFFFFF
+        self.current_tick += 1
+        self.tick_snapshots = {}
+        for room in self.rooms:
+            self.broadcast_room(room, server_time)
+        # the snapshots of this tick are only shared with each other
+        self.tick_snapshots = {}
+
+    def broadcast_room(self, room, server_time):
+        # each client is sent what changed in the room's latest published tick since the client's latest snapshot
+        if room.snapshot is not None:
+            self.broadcast_state(room, room.snapshot, server_time)
+
+    def broadcast_state(self, room, state, server_time):
+        # every client of the room is sent what is near its player, from the same positions
+        positions = self.entity_positions(room, state)
+        for player_id in state['players']:
+            session = self.sessions.get(player_id)
+            # only send to verified clients that haven't been kicked, and aren't still sending the last snapshot
+            if session is None or not self.threaded_clients[player_id] or session.sending:
+                continue
+            try:
+                snapshot = self.make_snapshot(session, self.interest_state(player_id, session, state, positions),
+                                              server_time)
+            except (ValueError, StructError) as e:
+                # only the clients of the players that can't be sent are disconnected
+                # the rest are sent snapshots again once those players have left the game
+                invalid = invalid_players(state) or [player_id]
+                for invalid_player_id in invalid:
+                    if self.threaded_clients.get(invalid_player_id):
+                        self.drop_client(invalid_player_id, f"Its Player Could Not Be Encoded ({e})")
+                continue
+            session.telemetry.snapshot_sent(self.current_tick)
+            try:
+                # snapshots too large to fit in a datagram are sent over tcp instead
+                if session.udp_address is not None and len(snapshot) + ECHO.size <= MAX_DATAGRAM_SIZE:
+                    datagram = session.echo() + snapshot
+                    self.send_datagram(datagram, session.udp_address)
+                    session.telemetry.sent(len(datagram))
+                else:
+                    self.send_snapshot(session, snapshot)
+            except OSError:
+                # the client disconnected, its client thread removes it
+                continue
+
+    def entity_positions(self, room, state):
+        # the positions of the players, items, and bullets in the state, None for the scores at the end of a game
+        if not state['header'][0]:
+            return None
+        return {"players": dict([(player_id, player_pos(values)) for player_id, values in state['players'].items()]),
+                "items": room.item_positions,
+                "bullets": dict([(bullet_id, bullet_pos(bullet_values))
+                                 for bullet_id, bullet_values in state['bullets'].items()])
+                }
+
+    def interest_state(self, player_id, session, state, positions):
+        # everything is sent for the scores at the end of a game
+        if positions is None:
+            for entity_type in session.interest:
+                session.interest[entity_type] = set(state[entity_type])
+            return state
+
+        # only send the players, items, and bullets near the client's player
+        center_x, center_y = positions['players'][player_id]
+        interest_state = {"header": state['header'], "players": {}, "items": {}, "bullets": {}}
+        for entity_type, entity_positions in positions.items():
+            interest = session.interest[entity_type]
+            for entity_id, values in state[entity_type].items():
+                pos = entity_positions.get(entity_id)
+                # something already being sent has to go further away to stop being sent, so it doesn't flicker
+                radius = INTEREST_RADIUS + INTEREST_HYSTERESIS if entity_id in interest else INTEREST_RADIUS
+                if pos is None or (pos[0] - center_x) ** 2 + (pos[1] - center_y) ** 2 <= radius ** 2:
+                    interest_state[entity_type][entity_id] = values
+            session.interest[entity_type] = set(interest_state[entity_type])
+        # the client's own player is always sent
+        interest_state['players'][player_id] = state['players'][player_id]
+        # a client near everything is sent the same state as the game, so its snapshot can be shared with others
+        if all(len(interest_state[entity_type]) == len(state[entity_type]) for entity_type in positions):
+            return state
+        return interest_state
+
+    def send_datagram(self, datagram, address):
+        self.udp_socket.sendto(datagram, address)
+
+    def drop_client(self, player_id, reason):
+        # disconnect a client without stopping the thread every client shares, its client thread removes it
+        print(f"\nClient {player_id} Was Disconnected: {reason}")
+        self.threaded_clients[player_id] = False
+        session = self.sessions.get(player_id)
+        if session is not None:
+            try:
+                session.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def send_snapshot(self, session, snapshot):
+        session.queue_snapshot(snapshot)
+
+    def threaded_udp(self):
+        # clients using udp send their player's state here every frame
+        while self.running:
+            try:
+                data, address = self.udp_socket.recvfrom(MAX_DATAGRAM_SIZE)
+            except ConnectionResetError:
+                # a client that was sent a datagram has closed its udp socket
+                continue
+            except OSError:
+                print("Udp Socket Closed - Server Closed")
+                break
 
-    def verify_client(self, connection):
+            try:
+                reply = self.handle_datagram(data, address)
+            except OSError:
+                # the client disconnected, its client thread removes it
+                continue
+            if reply is None:
+                continue
+            # the client's sender thread sends the messages, so a slow client never holds up this thread
+            session, messages = reply
+            for message in messages:
+                session.queue_message(message)
+
+    def handle_datagram(self, data, address):
+        # returns the client's session and the messages to send it over tcp, or None if the datagram is dropped
+        size = len(data)
+        start_time = perf_counter()
+        try:
+            (player_id, token, sequence, ack, sent_time), command = decode_state(data)
+        except ValueError:
+            return None
+        decode_time = perf_counter() - start_time
+        session = self.accept_datagram(player_id, token, sequence, ack, sent_time, address, size)
+        if session is None:
+            return None
+        session.telemetry.decoded(decode_time)
+
+        self.apply_command(player_id, command)
+        # changes the server made to the player have to arrive, so they are sent over tcp
+        messages = []
+        try:
+            override = self.override_message(player_id)
+        except (ValueError, StructError) as e:
+            self.drop_client(player_id, f"Its Player Could Not Be Encoded ({e})")
+            return None
+        if override is not None:
+            messages.append(override)
+        return session, messages
+
+    def accept_datagram(self, player_id, token, sequence, ack, sent_time, address, size):
+        # returns the client's session, or None if the datagram is dropped
+        # only accept datagrams from verified clients that sent their session token
+        session = self.sessions.get(player_id)
+        if session is None or session.token != token or player_id not in self.player_rooms:
+            return None
+        session.telemetry.received(size)
+        # the client was kicked, shut down the connection so its client thread stops waiting for events
+        if not self.threaded_clients[player_id]:
+            session.connection.shutdown(socket.SHUT_RDWR)
+            return None
+        # drop a datagram that arrived after a newer one
+        if sequence <= session.udp_sequence:
+            return None
+        session.udp_sequence = sequence
+        session.udp_address = address
+        session.ack = ack
+        session.telemetry.snapshot_acked(ack)
+        # sent back with the next snapshot
+        session.echo_time = sent_time
+        session.echo_received = monotonic()
+        return session
+
+    def count_players(self, room):
+        print(f"There Are {len(room.players)}/{MAX_CLIENTS} Clients Connected To Room {room.room_id} "
+              f"({len(self.player_rooms)} Clients In All Rooms)")
+
+    def verify_client(self, player_id, session):
         # verify client has a unique username and the server has room
         try:
-            player_data = loads(connection.recv(RECEIVE_LIMIT))
-        except ConnectionResetError:
-            verify = False
-            reason = "Connection Reset"
+            player_data, session.compressions, requested_room, resume_token = decode_join(session.buffer.receive())
+        except (EOFError, ValueError, ConnectionResetError):
+            return False, "Connection Reset", None, None
+        return self.join_client(player_id, session, player_data, requested_room, resume_token)
+
+    def join_client(self, player_id, session, player_data, requested_room, resume_token):
+        # never let a client change its own player id
+        player_data.player_id = player_id
+        # a client that lost its connection gets back its player, with the same id, score, and position
+        if resume_token != NO_SESSION:
+            return self.resume_client(player_id, session, player_data, resume_token)
+        return self.check_player(player_data, requested_room)
+
+    def resume_client(self, player_id, session, player_data, resume_token):
+        with self.session_lock:
+            held_player_id = self.held_players.pop(resume_token, None)
+            if held_player_id is None:
+                # the server hasn't noticed the old connection was lost yet, so it is shut down
+                for other_player_id, other_session in list(self.sessions.items()):
+                    if (other_session.token == resume_token and other_player_id in self.player_rooms
+                            and self.threaded_clients[other_player_id]):
+                        held_player_id = other_player_id
+                        try:
+                            other_session.connection.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+            if held_player_id is None:
+                return False, "The Player To Resume Is No Longer On The Server", player_data, None
+
+            # the new connection takes the place of the one the client lost
+            self.connections[held_player_id] = self.connections.pop(player_id)
+            self.sessions[held_player_id] = self.sessions.pop(player_id)
+            self.threaded_clients[player_id] = False
+            self.threaded_clients[held_player_id] = True
+            room = self.player_rooms[held_player_id]
+        print(f"\nClient {player_id} Resumed The Player Of Client {held_player_id} In Room {room.room_id}")
+        return True, None, self.held_player(held_player_id, player_data, room), room
+
+    def held_player(self, player_id, player_data, room):
+        # the player the client gets back, as it was when the client lost its connection
+        player = room.players[player_id]
+        # only the game's copy of the player is moved, by the commands the client sent
+        moved_player = room.game['players'].get(player_id)
+        if moved_player is not None:
+            player.pos, player.rot = moved_player.pos, moved_player.rot
+        return player
+
+    def choose_compression(self, session, verify):
+        # the fastest compression both the server and the client have, messages to unverified clients aren't compressed
+        if not verify:
+            return NO_COMPRESSION
+        return choose_compression(session.compressions)
+
+    def choose_room(self, requested_room):
+        # the room the client asked for, or the first room with space, None if there is no such room
+        if requested_room == ANY_ROOM:
+            for room in self.rooms:
+                if not room.full():
+                    return room
+            return None
+        return self.find_room(requested_room)
+
+    def find_room(self, room_id):
+        for room in self.rooms:
+            if room.room_id == room_id:
+                return room
+        return None
+
+    def room_id(self, room):
+        if room is None:
+            return ANY_ROOM
+        return room.room_id
+
+    def check_player(self, player_data, requested_room=ANY_ROOM):
+        # returns if the client is verified, why it is not, its player, and the room it will play in
+        if not isinstance(player_data, NetPlayer):
+            return False, "Invalid Player Data", None, None
         verify = True
         reason = None
+        room = self.choose_room(requested_room)
         if not bool(player_data.username):
             verify = False
             reason = f"Please Enter A Username"
-        for player in self.game['players'].values():
-            # use .lower() to ensure there are no duplicate usernames by case
-            if player.username == player_data.username.lower():
-                verify = False
-                reason = f"Username Is Already Taken ({player_data.username})"
-        if len(self.game['players']) > MAX_CLIENTS:
+        # every message with the player has its username, so it has to fit in one
+        elif len(player_data.username.encode("utf-8")) > MAX_STRING_LENGTH:
+            verify = False
+            reason = f"Username Is Too Long ({len(player_data.username.encode('utf-8'))}/{MAX_STRING_LENGTH} Bytes)"
+        # usernames are unique on the whole server, so commands can find a client by its username
+        for other_room in self.rooms:
+            for player in list(other_room.players.values()):
+                # use .lower() to ensure there are no duplicate usernames by case
+                if player.username == player_data.username.lower():
+                    verify = False
+                    reason = f"Username Is Already Taken ({player_data.username})"
+        if room is None:
             verify = False
-            reason = f"Too Many Clients Connected To Server ({len(self.game['players']) - 1}/{MAX_CLIENTS})"
+            if requested_room == ANY_ROOM:
+                reason = f"Every Room Is Full ({len(self.rooms)} Rooms Of {MAX_CLIENTS} Clients)"
+            else:
+                reason = f"Room {requested_room} Does Not Exist On This Server"
+        elif room.full():
+            verify = False
+            reason = f"Too Many Clients Connected To Room {room.room_id} ({len(room.players)}/{MAX_CLIENTS})"
         if not self.open:
             verify = False
             reason = "The Server Is Currently Not Accepting New Connections"
-        return verify, reason, player_data
+        return verify, reason, player_data, room
 
-    def disconnect_client(self, player_id):
+    def disconnect_client(self, player_id, session):
         # close the connection with the client
-        self.connections[player_id].close()
-
+        session.connection.close()
+        # stop the thread sending snapshots to the client
+        session.close()
+        if session.compressor is not None:
+            print(f"Client {player_id} {session.compressor.stats()}")
+        print(f"Client {player_id} {session.telemetry.stats()}")
+
+        with self.session_lock:
+            # the client has already resumed its player on a new connection
+            if self.sessions.get(player_id) is not session:
+                return
+            # a player whose client lost its connection is kept for a while
+            # kicked players, and players whose client quit, are removed
+            lost = self.threaded_clients[player_id] and not session.left
+            if lost and player_id in self.player_rooms and self.running:
+                self.hold_player(player_id, session.token)
+            else:
+                self.remove_player(player_id)
+
+            # remove the player from the connections list
+            self.threaded_clients[player_id] = False
+            # remove the disconnected client from the connections dictionary
+            del self.connections[player_id]
+            del self.sessions[player_id]
+
+    def hold_player(self, player_id, token):
+        self.held_players[token] = player_id
+        print(f"\nClient {player_id} Lost Its Connection, Its Player Is Kept For "
+              f"{RECONNECT_GRACE_PERIOD / 1000.0} Seconds")
+        self.player_timers(player_id).schedule(RECONNECT_GRACE_PERIOD / 1000.0, self.release_player, token)
+
+    def player_timers(self, player_id):
+        # the timers of the room the player is in, run by the room's ticks
+        return self.player_rooms[player_id].timers
+
+    def release_player(self, token):
+        # the client did not come back in time
+        player_id = self.held_players.pop(token, None)
+        if player_id is not None:
+            self.remove_player(player_id)
+
+    def remove_player(self, player_id):
         try:
             # remove the player from the id to username finder
+            room = self.player_rooms[player_id]
             del self.client_id_username[player_id]
-            del self.client_id_username[self.game['players'][player_id].username]
-            # remove the unverified player from the player dictionary
-            del self.game['players'][player_id]
+            del self.client_id_username[room.players[player_id].username]
+            # remove the unverified player from its room, it leaves the room's game on the room's next tick
+            room.remove_player(player_id)
+            del self.player_rooms[player_id]
 
             # client disconnected server message
-            print(f"\nClient {player_id} Has Disconnected")
+            print(f"\nClient {player_id} Has Disconnected From Room {room.room_id}")
             # update total player count
-            self.count_players()
+            self.count_players(room)
         except KeyError:
             # the client was never verified (clients are only added to client_id_username and game data if verified)
             print(f"Client {player_id} Has Been Forcefully Disconnected By The Server")
 
-        # remove the player from the connections list
-        self.threaded_clients[player_id] = False
-        # remove the disconnected client from the connections dictionary
-        del self.connections[player_id]
-
 
 if __name__ == "__main__":
     s = Server()
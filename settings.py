@@ -1,12 +1,49 @@
 # launch options
 SOUND = True  # you can still toggle sound after starting
 CONN_TIMEOUT = 10  # in seconds
+USE_UDP = False  # send the player and game state over udp, events and server changes still use tcp
+USE_COMPRESSION = True  # compress large messages if the server also uses compression
 
 # server
 SERVER_IP = "localhost"
 PORT = 4242
-RECEIVE_LIMIT = 16384
-MAX_CLIENTS = 6
+RECEIVE_LIMIT = 16384  # starting size of the receive buffer in bytes, it grows for larger messages
+RECONNECT_GRACE_PERIOD = 10000  # in milliseconds, how long the player of a client that lost its connection is kept
+CONNECTION_LOST_TIME = 2000  # in milliseconds, how long the server can be silent before the client reconnects
+RECONNECT_INTERVAL = 500  # in milliseconds, how long the client waits between tries to reconnect
+MAX_MESSAGE_SIZE = 4194304  # in bytes, larger messages are refused
+MAX_CLIENTS = 6  # in each room
+ROOMS = 4  # how many games the server runs at once, clients are put in the first room with space
+WORKERS = 0  # how many processes supervisor.py runs ROOMS rooms each in, 0 is one for every core
+HEALTH_INTERVAL = 1000  # in milliseconds, how often supervisor.py workers report their health
+WORKER_STOP_TIMEOUT = 5  # in seconds, how long a supervisor.py worker has to stop before it is terminated
+RESUME_POLL_INTERVAL = 5  # in milliseconds, how often supervisor.py checks if the rest of a client's join arrived
+RESUME_WAIT = 200  # in milliseconds, how long a new connection has to say which worker kept the player it resumes
+IO_PROCESSES = 2  # how many processes splitserver.py sends and receives the messages of clients in
+RING_SLOTS = 8  # how many ticks of the game splitserver.py keeps in shared memory for its io processes
+RING_SLOT_SIZE = 262144  # in bytes, the most the game of every room can take up in one tick
+RING_POLL_INTERVAL = 2  # in milliseconds, how often io processes check for a new tick
+COMPRESSION_THRESHOLD = 512  # in bytes, smaller messages are not compressed
+COMPRESSION_LEVEL = 1  # zlib compression level, from 1 (fastest) to 9 (smallest)
+MAX_DATAGRAM_SIZE = 1400  # in bytes, larger snapshots are sent over tcp even when using udp
+RTT_SMOOTHING = 0.125  # how much each new round trip time changes the smoothed round trip time
+JITTER_SMOOTHING = 0.0625  # how much each new round trip time changes the smoothed jitter
+PING_INTERVAL = 1000  # in milliseconds, how often clients not using udp send a ping to measure the round trip time
+TELEMETRY_WINDOW = 1000  # in milliseconds, how long the bytes and messages per second are measured over
+SNAPSHOT_RATE = 20  # how many snapshots are sent to every client each second
+TICK_RATE = 60  # how many times a second the server moves the game of every room forward, such as 20, 30, 60, or 120
+MAX_CATCH_UP_TICKS = 5  # the most ticks a room runs at once to catch up after falling behind, the rest are dropped
+SNAPSHOT_HISTORY = 32  # how many snapshots are kept to send only what changed since, a keyframe is sent if older
+INTEREST_RADIUS = 1200  # in pixels, clients are only sent the players, items, and bullets this close to their player
+INTEREST_HYSTERESIS = 200  # in pixels, how much further something already sent can go before it stops being sent
+INTERPOLATION_DELAY = 100  # in milliseconds, remote players and bullets are shown this far behind the server
+MAX_EXTRAPOLATION = 250  # in milliseconds, how long remote players and bullets keep moving when snapshots stop
+INTERPOLATION_BUFFER = 32  # how many snapshots are kept to show remote players and bullets between two of them
+SNAP_DISTANCE = 400  # in pixels, a move further than this between two snapshots is not smoothed (such as a respawn)
+INPUT_HISTORY = 120  # how many frames of the client's own movement are kept to replay after a change from the server
+JITTER_BUFFER_DEPTH = 2  # how many commands from a client the server holds before playing them, to cover late ones
+JITTER_BUFFER_SIZE = 6  # how many commands from a client the server can hold before skipping to the newest
+CLOCK_SMOOTHING = 0.05  # how much each new snapshot changes the estimated time on the server
 
 # game
 GAME_LENGTH = 300  # in seconds, 300 seconds = 5 minutes
@@ -173,6 +210,10 @@ BULLET_VEL = 300  # pixels per second
 BULLET_IMGS = {"basic": "cannonball.png",
                }
 BULLET_SIZE_MULTIPLIER = 2
+# the bullet image scaled up, for the server that has no images
+BULLET_HIT_SIZE = 10 * BULLET_SIZE_MULTIPLIER  # in pixels
+WALL_GRID_SIZE = 8  # in pixels, the size of the cells the server splits a map into to find bullets that hit walls
+BULLET_STORE_SIZE = 256  # how many bullets a room has space for at first, the space doubles whenever it fills up
 NORMAL_SHOOT_ANGLES = [90, -90]
 
 # sounds
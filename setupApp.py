@@ -12,9 +12,14 @@ DATA_FILES = [('', ['snd']),
               ('', ['font']),
               ('', ['img']),
               ('', ['map']),
+              'codec.py',
+              'compression.py',
               'entities.py',
+              'interpolation.py',
               'network.py',
               'settings.py',
+              'snapshot.py',
+              'telemetry.py',
               'tilemap.py',
               'widgets.py',
               ]
@@ -0,0 +1,31 @@
+from collections import deque
+from settings import *
+
+
+class SnapshotHistory:
+    def __init__(self, size=SNAPSHOT_HISTORY):
+        # the most recent snapshots by their tick, older snapshots are forgotten
+        self.size = size
+        self.snapshots = {}
+        self.ticks = deque()
+        self.latest_tick = None
+
+    def add(self, tick, snapshot):
+        self.snapshots[tick] = snapshot
+        self.ticks.append(tick)
+        self.latest_tick = tick
+        # forget the oldest snapshot once there are too many
+        if len(self.ticks) > self.size:
+            del self.snapshots[self.ticks.popleft()]
+
+    def get(self, tick):
+        # None if there never was a snapshot with this tick or it has been forgotten
+        return self.snapshots.get(tick)
+
+    def latest(self):
+        return self.snapshots.get(self.latest_tick)
+
+    def clear(self):
+        self.snapshots.clear()
+        self.ticks.clear()
+        self.latest_tick = None
@@ -0,0 +1,400 @@
+import os
+import socket
+from os import path
+from sys import argv
+from struct import Struct, error as StructError
+from queue import Empty
+from threading import Event
+from multiprocessing import get_context
+from _thread import start_new_thread
+from time import sleep
+import pygame as pg
+from server import Server
+from supervisor import WorkerServer, Worker, threaded_hand_off, close_listening
+from ring import SnapshotRing
+from tickclock import TickClock
+from timers import TickTimers
+from room import load_item_spawns
+from codec import (decode_update, decode_state, decode_events, decode_profile, encode_snapshot, decode_snapshot,
+                   snapshot_ticks, update_ack, state_header, message_type, NO_BASE,
+                   EMPTY_STATE, ANY_ROOM, EVENTS_MESSAGE, PING_MESSAGE, PROFILE_MESSAGE, UPDATE_MESSAGE,
+                   LEAVE_MESSAGE)
+from settings import *
+
+# every room with players is written to the ring each tick as its id, the length of its keyframe, then the keyframe
+ROOM_ENTRY = Struct("!BI")
+
+
+class RoomMirror:
+    def __init__(self, room_id, map_folder):
+        # what a worker knows about a room, from the keyframes the simulation writes to the ring
+        self.room_id = room_id
+        self.map_folder = map_folder
+        self.current_map = None
+        self.item_positions = {}
+
+    def update(self, state):
+        # items are numbered in the order the room loads them, so their positions are loaded the same way
+        current_map = state['header'][4]
+        if current_map != self.current_map:
+            self.current_map = current_map
+            self.item_positions = dict(enumerate((x, y) for x, y, spawn_type in
+                                                 load_item_spawns(path.join(self.map_folder, current_map))))
+
+
+class IOServer(WorkerServer):
+    def __init__(self, worker_id, udp_port, ring_name, handoff, inbox, outbox, reports):
+        # a worker without rooms, it sends snapshots from the ring and forwards what clients send to the simulation
+        super().__init__(worker_id, [], udp_port, handoff, reports)
+        self.ring = SnapshotRing(ring_name)
+        # messages from clients go to the simulation in the inbox, its replies come back in the outbox
+        self.inbox = inbox
+        self.outbox = outbox
+        self.room_mirrors = {}  # room id to what this worker knows about the room
+        # client id to the event set once the simulation has verified the client, and the verification
+        self.verifications = {}
+        # the rooms are in the simulation, so this worker's timers are run by the ticks it reads from the ring
+        self.ring_clock = TickClock(SNAPSHOT_RATE)
+        self.timers = TickTimers(self.ring_clock)
+
+    def print_started(self):
+        print(f"\nWorker {self.worker_id} Started, Clients Using Udp Are Sent To Port {self.udp_port}")
+
+    def start_games(self):
+        # the games are played in the simulation, this worker only sends them to its clients
+        start_new_thread(self.threaded_ring, ())
+        start_new_thread(self.threaded_outbox, ())
+
+    def accept_client(self, conn, message):
+        # the simulation gives every client its id, so ids are unique across every worker
+        addr, player_id = message
+        start_new_thread(self.threaded_client, (conn, player_id))
+
+    def room_mirror(self, room_id):
+        if room_id not in self.room_mirrors:
+            self.room_mirrors[room_id] = RoomMirror(room_id, self.map_folder)
+        return self.room_mirrors[room_id]
+
+    def check_player(self, player_data, requested_room=ANY_ROOM):
+        # the simulation knows every room, so the client's thread waits for it to verify the client
+        verification = [Event(), None]
+        self.verifications[player_data.player_id] = verification
+        self.inbox.put(("join", player_data.player_id, self.worker_id, player_data, requested_room))
+        replied = verification[0].wait(CONN_TIMEOUT)
+        del self.verifications[player_data.player_id]
+        if not replied:
+            return False, "The Server Did Not Reply", player_data, None
+        verify, reason, room_id = verification[1]
+        room = None if room_id == ANY_ROOM else self.room_mirror(room_id)
+        return verify, reason, player_data, room
+
+    def add_player(self, player_id, player_data, room):
+        # the simulation has already added the player to its room
+        self.player_rooms[player_id] = room
+
+    def player_timers(self, player_id):
+        return self.timers
+
+    def held_player(self, player_id, player_data, room):
+        # the simulation still has the player, the client's thread only needs its id
+        player_data.player_id = player_id
+        return player_data
+
+    def remove_player(self, player_id):
+        # the simulation removes the player from its room
+        self.player_rooms.pop(player_id, None)
+        self.inbox.put(("leave", player_id))
+
+    def handle_message(self, player_id, session, data):
+        # a ping is sent straight back, everything else is decoded by the simulation
+        if message_type(data) == PING_MESSAGE:
+            return bytes(data)
+        # the client is quitting, the simulation is told its player left once its connection is closed
+        if message_type(data) == LEAVE_MESSAGE:
+            session.left = True
+            return None
+        if message_type(data) == UPDATE_MESSAGE:
+            session.ack = update_ack(data)
+            session.telemetry.snapshot_acked(session.ack)
+        self.inbox.put(("message", player_id, bytes(data)))
+        return None
+
+    def handle_datagram(self, data, address):
+        # only the header is read, the command is decoded by the simulation
+        try:
+            header = state_header(data)
+        except ValueError:
+            return None
+        if self.accept_datagram(*header, address, len(data)) is not None:
+            self.inbox.put(("state", header[0], bytes(data)))
+        return None
+
+    def threaded_outbox(self):
+        while self.running:
+            message = self.outbox.get()
+            # the simulation has stopped
+            if message is None:
+                break
+            kind, player_id = message[:2]
+            if kind == "verify":
+                verification = self.verifications.get(player_id)
+                if verification is not None:
+                    verification[1] = message[2:]
+                    verification[0].set()
+            elif kind == "send":
+                # the client's sender thread sends it, so a slow client never holds up the replies to other clients
+                session = self.sessions.get(player_id)
+                if session is not None:
+                    session.queue_message(message[2])
+            elif kind == "kick":
+                if self.threaded_clients.get(player_id):
+                    self.threaded_clients[player_id] = False
+                    # stop the client's thread waiting for its next message
+                    try:
+                        self.connections[player_id].shutdown(socket.SHUT_RDWR)
+                    except (KeyError, OSError):
+                        pass
+
+    def threaded_ring(self):
+        # send the newest tick whenever the simulation writes one, ticks written meanwhile are skipped
+        while self.running:
+            tick = self.ring.latest_tick()
+            if tick == self.current_tick:
+                sleep(RING_POLL_INTERVAL / 1000.0)
+                continue
+            data = self.ring.read(tick)
+            # written over while it was read, so read the newer tick instead
+            if data is None:
+                continue
+            self.current_tick = tick
+            self.ring_clock.ticks = tick
+            self.timers.run_due()
+            self.broadcast_tick(data)
+
+    def broadcast_tick(self, data):
+        # only the rooms this worker has clients in are decoded
+        room_ids = set(room.room_id for room in list(self.player_rooms.values()))
+        self.tick_snapshots = {}
+        offset = 0
+        while offset < len(data):
+            room_id, length = ROOM_ENTRY.unpack_from(data, offset)
+            offset += ROOM_ENTRY.size
+            if room_id in room_ids:
+                keyframe = data[offset:offset + length]
+                state = decode_snapshot(keyframe, EMPTY_STATE)
+                room = self.room_mirror(room_id)
+                room.update(state)
+                self.broadcast_state(room, state, snapshot_ticks(keyframe)[2])
+            offset += length
+        self.tick_snapshots = {}
+
+
+def run_io(worker_id, udp_port, ring_name, handoff, inbox, outbox, reports):
+    # workers never open a window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    IOServer(worker_id, udp_port, ring_name, handoff, inbox, outbox, reports).run()
+
+
+class SplitServer(Server):
+    def __init__(self, worker_count=IO_PROCESSES):
+        # the rooms are played in this process, encoding, sending, and receiving is done in the worker processes
+        # so the game ticks at the same rate no matter how many clients are connected
+        super().__init__()
+        self.server_commands = [command for command in self.server_commands
+                                if command not in ("compression", "telemetry")] + ["workers"]
+        self.worker_count = max(worker_count, 1)
+        self.context = get_context("spawn")
+        # what clients send, forwarded by every worker, and the health of every worker
+        self.inbox = self.context.Queue()
+        self.reports = self.context.Queue()
+        # the games are written here every tick, created once the server starts
+        self.ring = None
+        self.workers = [Worker(worker_id, []) for worker_id in range(self.worker_count)]
+        self.outboxes = {}  # worker id to the queue of messages sent to it
+        self.player_workers = {}  # client id to the id of the worker its client is connected to
+
+    def run(self):
+        try:
+            self.socket.bind((self.server_name, self.server_port))
+        except socket.error as e:
+            print(e)
+            print(f"Error Creating A Server On {self.server_name} At {self.server_ip}:{self.server_port}")
+            return
+        self.socket.listen()
+        self.ring = SnapshotRing()
+
+        # start every worker, each on the udp port after the one before
+        for worker in self.workers:
+            worker.udp_port = self.server_port + 1 + worker.worker_id
+            worker.handoff, worker_handoff = self.context.Pipe()
+            self.outboxes[worker.worker_id] = self.context.Queue()
+            worker.process = self.context.Process(target=run_io,
+                                                  args=(worker.worker_id, worker.udp_port, self.ring.name,
+                                                        worker_handoff, self.inbox, self.outboxes[worker.worker_id],
+                                                        self.reports),
+                                                  daemon=True)
+            worker.process.start()
+        self.print_started()
+
+        start_new_thread(self.threaded_input, ())
+        start_new_thread(self.threaded_inbox, ())
+        start_new_thread(self.threaded_reports, ())
+        # start the game and snapshot threads
+        self.start_games()
+
+        while self.running:
+            try:
+                conn, addr = self.socket.accept()
+            except OSError:
+                print("Socket Connection Aborted - Server Closed")
+                break
+            print(f"\nClient {self.current_player} Has Connected From IP: {addr[0]}")
+            start_new_thread(threaded_hand_off, (self.workers, conn, addr, (addr, self.current_player)))
+            self.current_player += 1
+
+        self.stop_workers()
+        self.ring.close()
+        pg.quit()
+        print("\nProcess Finished")
+
+    def print_started(self):
+        super().print_started()
+        print(f"Clients Are Sent Snapshots By {self.worker_count} Worker Processes")
+
+    def end(self):
+        # the listening socket is waited on in the main thread, so it has to be shut down to stop waiting
+        close_listening(self.socket)
+        super().end()
+
+    def stop_workers(self):
+        # tell every worker to stop, and stop any that don't
+        for worker in self.workers:
+            self.outboxes[worker.worker_id].put(None)
+            try:
+                worker.handoff.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(WORKER_STOP_TIMEOUT)
+            if worker.process.is_alive():
+                print(f"Worker {worker.worker_id} Did Not Stop, Terminating It...")
+                worker.process.terminate()
+
+    def broadcast_snapshots(self):
+        # every room with players is written to the ring as a keyframe, the workers send clients what changed
+        server_time = pg.time.get_ticks() & 0xFFFFFFFF
+        self.current_tick += 1
+        parts = []
+        for room in self.rooms:
+            state = room.snapshot
+            if state is None or not state['players']:
+                continue
+            try:
+                keyframe = encode_snapshot(self.current_tick, NO_BASE, EMPTY_STATE, state, server_time)
+            except (ValueError, StructError) as e:
+                # the other rooms are still sent
+                print(f"\nRoom {room.room_id} Was Not Sent On Tick {self.current_tick}, It Could Not Be Encoded ({e})")
+                continue
+            parts.append(ROOM_ENTRY.pack(room.room_id, len(keyframe)))
+            parts.append(keyframe)
+        if not self.ring.write(self.current_tick, b"".join(parts)):
+            print(f"\nTick {self.current_tick} Was Not Sent, It Does Not Fit In {RING_SLOT_SIZE} Bytes")
+
+    def threaded_inbox(self):
+        while self.running:
+            try:
+                message = self.inbox.get(timeout=HEALTH_INTERVAL / 1000.0)
+            except Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            try:
+                self.handle_inbox(message)
+            except (ValueError, StructError):
+                # the message was not a valid message, or the reply could not be encoded, so the client is disconnected
+                self.threaded_clients[message[1]] = False
+                self.send_kicks()
+
+    def handle_inbox(self, message):
+        kind, player_id = message[:2]
+        if kind == "join":
+            self.join(player_id, *message[2:])
+        elif kind == "leave":
+            self.player_workers.pop(player_id, None)
+            self.threaded_clients[player_id] = False
+            if player_id in self.player_rooms:
+                self.remove_player(player_id)
+        # ignore messages the client sent before it left
+        elif player_id not in self.player_rooms:
+            return
+        elif kind == "message":
+            data = message[2]
+            if message_type(data) == EVENTS_MESSAGE:
+                self.process_overwrites(player_id, decode_events(data))
+            elif message_type(data) == PROFILE_MESSAGE:
+                self.apply_profile(player_id, decode_profile(data))
+                self.send_overrides(player_id)
+            else:
+                self.apply_command(player_id, decode_update(data)[0])
+                self.send_overrides(player_id)
+        elif kind == "state":
+            self.apply_command(player_id, decode_state(message[2])[1])
+            self.send_overrides(player_id)
+
+    def join(self, player_id, worker_id, player_data, requested_room):
+        verify, reason, player_data, room = self.check_player(player_data, requested_room)
+        self.outboxes[worker_id].put(("verify", player_id, verify, reason, self.room_id(room)))
+        if verify:
+            self.threaded_clients[player_id] = True
+            self.player_workers[player_id] = worker_id
+            self.add_player(player_id, player_data, room)
+
+    def send_overrides(self, player_id):
+        # the client keeps its own player, so changes the server made to it are sent back by its worker
+        override = self.override_message(player_id)
+        worker_id = self.player_workers.get(player_id)
+        if override is not None and worker_id is not None:
+            self.outboxes[worker_id].put(("send", player_id, override))
+
+    def send_kicks(self):
+        # kicked clients are disconnected by their worker
+        for player_id, worker_id in list(self.player_workers.items()):
+            if not self.threaded_clients[player_id]:
+                del self.player_workers[player_id]
+                self.outboxes[worker_id].put(("kick", player_id))
+
+    def threaded_reports(self):
+        while self.running:
+            try:
+                report = self.reports.get(timeout=HEALTH_INTERVAL / 1000.0)
+            except Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            self.workers[report['worker']].receive_report(report)
+
+    def run_command(self, command):
+        # show the clients and cpu usage of every worker
+        # syntax: workers
+        if command and command[0] == "workers":
+            print("All Workers Are As Follows:")
+            for worker in self.workers:
+                if not worker.process.is_alive():
+                    print(f"\t- Worker {worker.worker_id}: Stopped (Exit Code {worker.process.exitcode})")
+                elif worker.report is None:
+                    print(f"\t- Worker {worker.worker_id} (PID {worker.process.pid}): Starting...")
+                else:
+                    print(f"\t- Worker {worker.worker_id} (PID {worker.process.pid}): "
+                          f"Clients: {worker.report['players']} - CPU: {worker.cpu_usage * 100:.0f}% - "
+                          f"Udp Port: {worker.udp_port}")
+        else:
+            super().run_command(command)
+        self.send_kicks()
+
+
+if __name__ == "__main__":
+    # the amount of workers can be given as an argument, such as: python splitserver.py 4
+    if len(argv) > 1:
+        SplitServer(int(argv[1])).run()
+    else:
+        SplitServer().run()
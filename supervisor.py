@@ -0,0 +1,359 @@
+import os
+import socket
+from sys import argv
+from queue import Empty
+from secrets import randbits
+from select import select
+from threading import Lock
+from multiprocessing import get_context
+from multiprocessing.reduction import send_handle, recv_handle
+from _thread import start_new_thread
+from time import sleep, monotonic, process_time
+import pygame as pg
+from server import Server
+from network import MESSAGE_HEADER, COMPRESSED_FLAG
+from codec import decode_join, ANY_ROOM, NO_SESSION
+from settings import *
+
+# the lowest byte of a session token made by a worker is the id of the worker
+WORKER_ID_MASK = 0xFF
+
+
+class WorkerServer(Server):
+    def __init__(self, worker_id, room_ids, udp_port, handoff, reports):
+        # a server without a window or console, the supervisor accepts its clients and hands them to it
+        super().__init__(room_ids)
+        self.worker_id = worker_id
+        self.udp_port = udp_port
+        # connections are received from the supervisor, and the health of the worker is sent back
+        self.handoff = handoff
+        self.reports = reports
+
+    def create_socket(self):
+        # the supervisor listens for tcp connections, every worker has its own udp port
+        try:
+            self.udp_socket.bind((self.server_name, self.udp_port))
+        except socket.error as e:
+            print(e)
+            print(f"Error Creating Worker {self.worker_id} On {self.server_name} At {self.server_ip}:{self.udp_port}")
+
+    def run(self):
+        self.create_socket()
+        # start the thread for clients using udp
+        start_new_thread(self.threaded_udp, ())
+        # start the game and snapshot threads
+        self.start_games()
+        # start the thread telling the supervisor how the worker is doing
+        start_new_thread(self.threaded_report, ())
+        self.print_started()
+
+        while self.running:
+            # what the supervisor sends with the client, then its connection
+            try:
+                message = self.handoff.recv()
+            except EOFError:
+                # the supervisor has stopped
+                message = None
+            if message is None:
+                break
+            conn = socket.socket(fileno=recv_handle(self.handoff))
+            self.accept_client(conn, message)
+
+        self.end()
+        pg.quit()
+        print(f"\nWorker {self.worker_id} Finished")
+
+    def open_session(self, connection, player_id):
+        session = super().open_session(connection, player_id)
+        # a client resuming its player with this token is handed back to this worker, which kept the player
+        session.token = (randbits(24) or 1) << 8 | self.worker_id
+        return session
+
+    def print_started(self):
+        print(f"\nWorker {self.worker_id} Started With Rooms: {', '.join(str(room.room_id) for room in self.rooms)}")
+
+    def threaded_report(self):
+        while self.running:
+            self.reports.put(self.health())
+            sleep(HEALTH_INTERVAL / 1000.0)
+
+    def health(self):
+        rooms = [(room.room_id, len(room.players), room.game['current map'], room.game['active'])
+                 for room in self.rooms]
+        return {"worker": self.worker_id,
+                "players": len(self.player_rooms),
+                "connections": len(self.connections),
+                "cpu time": process_time(),  # in seconds, of every thread of the worker
+                "rooms": rooms
+                }
+
+
+def run_worker(worker_id, room_ids, udp_port, handoff, reports):
+    # workers never open a window
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    WorkerServer(worker_id, room_ids, udp_port, handoff, reports).run()
+
+
+class Worker:
+    def __init__(self, worker_id, room_ids):
+        # a worker process, as the supervisor sees it
+        self.worker_id = worker_id
+        self.room_ids = room_ids
+        self.udp_port = None
+        self.process = None
+        self.handoff = None
+        # the latest health report, when it arrived, and how much of a core the worker used since the one before
+        self.report = None
+        self.report_time = None
+        self.cpu_usage = 0.0
+        # clients handed to the worker since its latest report, so clients aren't all sent to the same worker
+        self.handed = 0
+        self.stopped = False
+        # clients are handed off on their own threads, and a message and its connection have to be sent together
+        self.handoff_lock = Lock()
+
+    def load(self):
+        players = 0 if self.report is None else self.report['players']
+        return players + self.handed
+
+    def receive_report(self, report):
+        current_time = monotonic()
+        if self.report is not None and current_time > self.report_time:
+            self.cpu_usage = (report['cpu time'] - self.report['cpu time']) / (current_time - self.report_time)
+        self.report = report
+        self.report_time = current_time
+        self.handed = 0
+
+
+def close_listening(listening_socket):
+    # closing a socket doesn't stop accept() waiting for a connection on another thread, shutting it down does
+    try:
+        listening_socket.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    listening_socket.close()
+
+
+def least_loaded(workers):
+    workers = [worker for worker in workers if worker.process.is_alive()]
+    if not workers:
+        return None
+    return min(workers, key=Worker.load)
+
+
+def resume_worker(workers, conn):
+    # a client resuming its player sends its join as soon as it connects, new clients wait to be sent a player first
+    # the token in the join says which worker kept the player, None if the client isn't resuming one
+    end_time = monotonic() + RESUME_WAIT / 1000.0
+    data = b""
+    try:
+        while monotonic() < end_time:
+            if not select([conn], [], [], end_time - monotonic())[0]:
+                return None
+            # the join is only looked at, the worker receives it from the connection as usual
+            received = conn.recv(RECEIVE_LIMIT, socket.MSG_PEEK)
+            if len(received) == len(data):
+                # the connection was closed, or the rest of the join hasn't arrived yet
+                if not received:
+                    return None
+                sleep(RESUME_POLL_INTERVAL / 1000.0)
+            data = received
+            if len(data) < MESSAGE_HEADER.size:
+                continue
+            length = MESSAGE_HEADER.unpack_from(data)[0]
+            # a join is sent before a compression is chosen
+            if length & COMPRESSED_FLAG:
+                return None
+            if len(data) >= MESSAGE_HEADER.size + length:
+                break
+        else:
+            return None
+    except OSError:
+        return None
+
+    try:
+        token = decode_join(data[MESSAGE_HEADER.size:MESSAGE_HEADER.size + length])[3]
+    except ValueError:
+        return None
+    worker_id = token & WORKER_ID_MASK
+    if token == NO_SESSION or worker_id >= len(workers):
+        return None
+    return workers[worker_id]
+
+
+def threaded_hand_off(workers, conn, addr, message):
+    # waiting to see if the client is resuming a player only holds up this client
+    hand_off(workers, conn, addr, message, resume_worker(workers, conn))
+
+
+def hand_off(workers, conn, addr, message, worker=None):
+    # the worker that kept the player being resumed, or else the worker with the fewest players, is sent the message
+    # then the client, the client only talks to that worker
+    if worker is None or not worker.process.is_alive():
+        worker = least_loaded(workers)
+    if worker is None:
+        print(f"\nClient From IP {addr[0]} Refused: No Workers Are Running")
+    else:
+        try:
+            with worker.handoff_lock:
+                worker.handoff.send(message)
+                send_handle(worker.handoff, conn.fileno(), worker.process.pid)
+            worker.handed += 1
+        except OSError:
+            print(f"\nClient From IP {addr[0]} Refused: Worker {worker.worker_id} Has Stopped")
+    # the worker has its own copy of the connection
+    conn.close()
+
+
+class Supervisor:
+    def __init__(self, worker_count=WORKERS):
+        # get machine's information to create a server
+        self.server_name = socket.gethostname()
+        self.server_ip = socket.gethostbyname(self.server_name)
+        self.server_port = PORT
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.running = True
+        self.commands = ["help", "status", "end"]
+        # one worker for every core, each playing ROOMS rooms on its own core
+        # room ids are sent in one byte, so there can't be more rooms than fit in it
+        self.worker_count = min(worker_count or os.cpu_count() or 1, ANY_ROOM // ROOMS)
+        # workers are started fresh instead of copied from the supervisor, so they don't share any of its state
+        self.context = get_context("spawn")
+        self.reports = self.context.Queue()
+        self.workers = []
+        for worker_id in range(self.worker_count):
+            room_ids = list(range(worker_id * ROOMS, (worker_id + 1) * ROOMS))
+            self.workers.append(Worker(worker_id, room_ids))
+
+    def run(self):
+        try:
+            self.socket.bind((self.server_name, self.server_port))
+        except socket.error as e:
+            print(e)
+            print(f"Error Creating A Server On {self.server_name} At {self.server_ip}:{self.server_port}")
+            return
+        self.socket.listen()
+
+        # start every worker, each on the udp port after the one before
+        for worker in self.workers:
+            worker.udp_port = self.server_port + 1 + worker.worker_id
+            worker.handoff, worker_handoff = self.context.Pipe()
+            worker.process = self.context.Process(target=run_worker,
+                                                  args=(worker.worker_id, worker.room_ids, worker.udp_port,
+                                                        worker_handoff, self.reports),
+                                                  daemon=True)
+            worker.process.start()
+        print(f"\nSupervisor Started On {self.server_name}:\n\t- IP: {self.server_ip}\n\t- Port: {self.server_port}"
+              f"\n\t- Workers: {self.worker_count}\n\t- Rooms: {self.worker_count * ROOMS}")
+
+        start_new_thread(self.threaded_reports, ())
+        start_new_thread(self.threaded_input, ())
+
+        while self.running:
+            try:
+                conn, addr = self.socket.accept()
+            except OSError:
+                print("Socket Connection Aborted - Server Closed")
+                break
+            # the worker only needs the address of the client
+            start_new_thread(threaded_hand_off, (self.workers, conn, addr, addr))
+
+        self.stop_workers()
+        print("\nProcess Finished")
+
+    def threaded_reports(self):
+        while self.running:
+            try:
+                report = self.reports.get(timeout=HEALTH_INTERVAL / 1000.0)
+            except Empty:
+                report = None
+            except (EOFError, OSError):
+                break
+            if report is not None:
+                self.workers[report['worker']].receive_report(report)
+
+            # let the console know once a worker has stopped, its clients are disconnected
+            for worker in self.workers:
+                if not worker.stopped and not worker.process.is_alive():
+                    worker.stopped = True
+                    if self.running:
+                        print(f"\nWorker {worker.worker_id} Has Stopped (Exit Code {worker.process.exitcode})")
+
+    def threaded_input(self):
+        while self.running:
+            # split the text command received into words
+            self.run_command(input().split())
+
+    def run_command(self, command):
+        if not command:
+            print("Command Error: No Command Was Given")
+
+        # show a list of valid commands
+        # syntax: help
+        elif command[0] == "help":
+            print("Valid Commands Are As Follows:")
+            for valid_command in self.commands:
+                print(f"\t- {valid_command}")
+
+        # show the health, players, and rooms of every worker
+        # syntax: status
+        elif command[0] == "status":
+            self.print_status()
+
+        # end the program
+        # syntax: end
+        elif command[0] == "end":
+            self.end()
+
+        else:
+            print("Command Error: Not A Valid Command, Do help For A List Of Valid Commands")
+
+    def print_status(self):
+        current_time = monotonic()
+        total_players = 0
+        alive_workers = 0
+        print("All Workers Are As Follows:")
+        for worker in self.workers:
+            if not worker.process.is_alive():
+                print(f"\t- Worker {worker.worker_id}: Stopped (Exit Code {worker.process.exitcode})")
+                continue
+            alive_workers += 1
+            if worker.report is None:
+                print(f"\t- Worker {worker.worker_id} (PID {worker.process.pid}): Starting...")
+                continue
+            total_players += worker.report['players']
+            print(f"\t- Worker {worker.worker_id} (PID {worker.process.pid}): "
+                  f"Players: {worker.report['players']} - CPU: {worker.cpu_usage * 100:.0f}% - "
+                  f"Udp Port: {worker.udp_port} - Last Report: {current_time - worker.report_time:.1f} Seconds Ago")
+            for room_id, players, current_map, active in worker.report['rooms']:
+                print(f"\t\t- Room {room_id}: {players}/{MAX_CLIENTS} Players - Map: {current_map} - "
+                      f"{'Active' if active else 'Between Games'}")
+        print(f"Workers Running: {alive_workers}/{self.worker_count} - Players: {total_players}/"
+              f"{self.worker_count * ROOMS * MAX_CLIENTS}")
+
+    def end(self):
+        print("\nStarting Server Termination")
+        self.running = False
+        print("Closing Server Socket...")
+        close_listening(self.socket)
+
+    def stop_workers(self):
+        # tell every worker to stop, and stop any that don't
+        for worker in self.workers:
+            try:
+                worker.handoff.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(WORKER_STOP_TIMEOUT)
+            if worker.process.is_alive():
+                print(f"Worker {worker.worker_id} Did Not Stop, Terminating It...")
+                worker.process.terminate()
+
+
+if __name__ == "__main__":
+    # the amount of workers can be given as an argument, such as: python supervisor.py 16
+    if len(argv) > 1:
+        Supervisor(int(argv[1])).run()
+    else:
+        Supervisor().run()
@@ -0,0 +1,113 @@
+from threading import Lock
+from time import monotonic
+from settings import *
+
+
+class Telemetry:
+    def __init__(self):
+        # how well one connection is doing, kept on both the server and the client
+        # the client thread, the sender, and the udp thread can all record at once
+        self.lock = Lock()
+        # the smoothed round trip time, and how much it changes from one measurement to the next, in milliseconds
+        self.rtt = None
+        self.jitter = 0.0
+        self.latest_rtt = None
+        # totals since the connection was opened
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.encode_time = 0.0  # in seconds
+        self.decode_time = 0.0  # in seconds
+        # the rates are worked out from the totals once a window has passed, so they always cover a whole window
+        self.window_start = monotonic()
+        self.window_totals = self.totals()
+        self.rates = tuple(0.0 for total in self.window_totals)
+        # snapshots sent that the client has not received yet, by their tick, to time how long it takes
+        self.unacked = {}
+
+    def totals(self):
+        return (self.bytes_in, self.bytes_out, self.messages_in, self.messages_out, self.encode_time,
+                self.decode_time)
+
+    def update_rates(self):
+        # the lock has to be held
+        current_time = monotonic()
+        window_length = current_time - self.window_start
+        if window_length * 1000 < TELEMETRY_WINDOW:
+            return
+        totals = self.totals()
+        self.rates = tuple((total - window_total) / window_length
+                           for total, window_total in zip(totals, self.window_totals))
+        self.window_start = current_time
+        self.window_totals = totals
+
+    def received(self, size):
+        with self.lock:
+            self.bytes_in += size
+            self.messages_in += 1
+            self.update_rates()
+
+    def sent(self, size):
+        with self.lock:
+            self.bytes_out += size
+            self.messages_out += 1
+            self.update_rates()
+
+    def encoded(self, seconds):
+        with self.lock:
+            self.encode_time += seconds
+
+    def decoded(self, seconds):
+        with self.lock:
+            self.decode_time += seconds
+
+    def add_rtt(self, rtt):
+        with self.lock:
+            if self.rtt is None:
+                self.rtt = rtt
+            else:
+                # smooth the round trip time so a single late message does not change it much
+                self.rtt += (rtt - self.rtt) * RTT_SMOOTHING
+                self.jitter += (abs(rtt - self.latest_rtt) - self.jitter) * JITTER_SMOOTHING
+            self.latest_rtt = rtt
+
+    def snapshot_sent(self, tick):
+        with self.lock:
+            self.unacked[tick] = monotonic()
+            # a client that stops receiving snapshots doesn't keep every tick sent to it
+            if len(self.unacked) > SNAPSHOT_HISTORY:
+                del self.unacked[next(iter(self.unacked))]
+
+    def snapshot_acked(self, tick):
+        # the client got the snapshot, so the time since it was sent is a round trip
+        # this also has the time until the client next sent its player, which is at most a frame
+        with self.lock:
+            sent_time = self.unacked.pop(tick, None)
+            if sent_time is None:
+                return
+            # snapshots sent before it are not timed, as they either arrived before it or were lost
+            for unacked_tick in [unacked_tick for unacked_tick in self.unacked if unacked_tick < tick]:
+                del self.unacked[unacked_tick]
+        self.add_rtt((monotonic() - sent_time) * 1000)
+
+    def lines(self):
+        # the telemetry as lines of text, for the server console and the client overlay
+        with self.lock:
+            self.update_rates()
+            bytes_in, bytes_out, messages_in, messages_out, encode_time, decode_time = self.rates
+            if self.rtt is None:
+                rtt = "RTT: Not Measured Yet"
+            else:
+                rtt = f"RTT: {self.rtt:.1f} ms - Jitter: {self.jitter:.1f} ms"
+            return [rtt,
+                    f"In: {bytes_in / 1000:.1f} KB/s - {messages_in:.0f} Messages/s",
+                    f"Out: {bytes_out / 1000:.1f} KB/s - {messages_out:.0f} Messages/s",
+                    f"Encode: {encode_time * 1000:.2f} ms/s - Decode: {decode_time * 1000:.2f} ms/s"]
+
+    def stats(self):
+        lines = self.lines()
+        with self.lock:
+            totals = (f"Total In: {self.bytes_in / 1000:.1f} KB - Total Out: {self.bytes_out / 1000:.1f} KB - "
+                      f"Encode Time: {self.encode_time * 1000:.1f} ms - Decode Time: {self.decode_time * 1000:.1f} ms")
+        return " - ".join(lines + [totals])
@@ -0,0 +1,86 @@
+import pytest
+from pygame.math import Vector2 as Vec
+from bullets import BulletStore, WallGrid
+from codec import bullet_states
+from settings import BULLET_VEL, BULLET_RANGE, BULLET_HIT_SIZE, PLAYER_HIT_RECT_WIDTH
+
+
+def test_bullets_move_the_way_they_point():
+    bullets = BulletStore()
+    bullets.add(0, Vec(100, 100), 0, 1, 0)
+    bullets.add(1, Vec(100, 100), 90, 1, 0)
+    bullets.move(0.5)
+    assert bullets.x[0] == pytest.approx(100 + BULLET_VEL / 2)
+    assert bullets.y[0] == pytest.approx(100)
+    # angles go counterclockwise, and y goes down the screen
+    assert bullets.x[1] == pytest.approx(100)
+    assert bullets.y[1] == pytest.approx(100 - BULLET_VEL / 2)
+
+
+def test_states_match_the_codec():
+    bullets = BulletStore()
+    moving = {}
+    for bullet_id, (pos, angle, owner_player_id) in enumerate([(Vec(1.07, 2), 45.5, 1), (Vec(-9999, 9999), 0, 70000),
+                                                                (Vec(300.3, 20.9), 359.9, 2)]):
+        bullets.add(bullet_id, pos, angle, owner_player_id, 0)
+        moving[bullet_id] = [pos, angle, owner_player_id]
+    assert bullets.states() == bullet_states(moving)
+
+
+def test_removed_slots_are_used_again():
+    bullets = BulletStore(size=2)
+    bullets.add(0, Vec(0, 0), 0, 1, 0)
+    bullets.add(1, Vec(0, 0), 0, 1, 0)
+    bullets.remove(0)
+    # removing a bullet twice, as two clients can report it, frees its slot once
+    bullets.remove(0)
+    bullets.add(2, Vec(0, 0), 0, 1, 0)
+    assert len(bullets.alive) == 2
+    assert sorted(bullets.states()) == [1, 2]
+
+
+def test_store_grows_when_full():
+    bullets = BulletStore(size=2)
+    for bullet_id in range(5):
+        bullets.add(bullet_id, Vec(bullet_id, 0), 0, 1, 0)
+    assert len(bullets) == 5
+    assert len(bullets.alive) == 8
+    assert sorted(bullets.states()) == [0, 1, 2, 3, 4]
+
+
+def test_remove_where_only_removes_the_hits():
+    bullets = BulletStore()
+    for bullet_id in range(3):
+        bullets.add(bullet_id, Vec(0, 0), 0, 1, 0)
+    bullets.remove_where(bullets.bullet_id[:bullets.used] != 1)
+    assert list(bullets.states()) == [1]
+
+
+def test_bullets_expire_after_their_range():
+    bullets = BulletStore()
+    tick_length = 0.1
+    range_ticks = int(BULLET_RANGE / (BULLET_VEL * tick_length))
+    bullets.add(0, Vec(0, 0), 0, 1, 0)
+    bullets.add(1, Vec(0, 0), 0, 1, 10)
+    assert bullets.expired(range_ticks - 1, tick_length).tolist() == [False, False]
+    assert bullets.expired(range_ticks, tick_length).tolist() == [True, False]
+
+
+def test_bullets_do_not_hit_their_owner():
+    bullets = BulletStore()
+    bullets.add(0, Vec(100, 100), 0, 1, 0)
+    bullets.add(1, Vec(100, 100), 0, 2, 0)
+    bullets.add(2, Vec(100 + PLAYER_HIT_RECT_WIDTH, 100), 0, 2, 0)
+    assert bullets.hits(Vec(100, 100), 1).tolist() == [False, True, False]
+
+
+def test_wall_grid_stops_bullets_at_walls_and_the_edge():
+    grid = WallGrid([(100, 0, 20, 200)], 400, 200)
+    bullets = BulletStore()
+    bullets.add(0, Vec(50, 50), 0, 1, 0)
+    bullets.add(1, Vec(110, 50), 0, 1, 0)
+    # a bullet touches a wall once its center is closer than half its size
+    bullets.add(2, Vec(100 - BULLET_HIT_SIZE / 2 + 1, 50), 0, 1, 0)
+    bullets.add(3, Vec(-5, 50), 0, 1, 0)
+    bullets.add(4, Vec(300, 250), 0, 1, 0)
+    assert grid.collide(bullets).tolist() == [False, True, True, True, True]
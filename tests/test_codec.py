@@ -0,0 +1,135 @@
+import pytest
+from pygame.math import Vector2 as Vec
+from entities import NetPlayer
+from codec import (encode, decode, encode_override, decode_override, encode_profile, decode_profile, encode_join,
+                   decode_join, MAX_STRING_LENGTH, ANY_ROOM)
+
+
+def make_player(player_id=3):
+    player = NetPlayer(player_id)
+    player.username = "pilot"
+    player.ammo = 12
+    player.kills = 4
+    player.deaths = 2
+    player.score = 400
+    player.pos = Vec(120.5, -64.25)
+    player.rot = 90.0
+    player.frozen = True
+    player.destroy = (True, 7)
+    player.current_crash_time = 250
+    player.image_color = "blue"
+    player.image_string = "shipblue.png"
+    player.fillcolor = (10, 20, 30)
+    player.input_sequence = 99
+    return player
+
+
+def test_player_round_trip():
+    player = make_player()
+    decoded = decode(encode(player))
+    for attr in ["player_id", "username", "ammo", "kills", "deaths", "score", "pos", "rot", "frozen", "respawn",
+                 "destroy", "current_crash_time", "current_respawn_time", "image_color", "image_string", "fillcolor",
+                 "input_sequence"]:
+        assert getattr(decoded, attr) == getattr(player, attr), attr
+
+
+def test_player_overwrites_round_trip():
+    player = make_player()
+    player.overwrites['items'].append(5)
+    player.overwrites['deaths by'].append(2)
+    player.overwrites['new bullets'].append((Vec(10, 20), 45.0, 3))
+    decoded = decode(encode(player))
+    assert decoded.overwrites['items'] == [5]
+    assert decoded.overwrites['deaths by'] == [2]
+    pos, angle, owner_player_id = decoded.overwrites['new bullets'][0]
+    assert (pos, angle, owner_player_id) == (Vec(10, 20), 45.0, 3)
+
+
+def test_positions_are_rounded_to_sub_pixels():
+    player = make_player()
+    player.pos = Vec(1.07, 2.01)
+    assert decode(encode(player)).pos == Vec(1.125, 2.0)
+
+
+def test_positions_past_the_edge_are_sent_at_the_edge():
+    player = make_player()
+    player.pos = Vec(10000, -10000)
+    assert decode(encode(player)).pos == Vec(0x7FFF / 8, -0x8000 / 8)
+
+
+def test_counters_out_of_range_are_clamped():
+    player = make_player()
+    player.ammo = 40000
+    player.kills = -1
+    player.deaths = 70000
+    player.score = 1 << 40
+    decoded = decode(encode(player))
+    assert decoded.ammo == 0x7FFF
+    assert decoded.kills == 0
+    assert decoded.deaths == 0xFFFF
+    assert decoded.score == 0x7FFFFFFF
+
+
+def test_player_ids_above_16_bits():
+    player = make_player(70000)
+    player.destroy = (True, 70001)
+    decoded = decode(encode(player))
+    assert decoded.player_id == 70000
+    assert decoded.destroy == (True, 70001)
+
+
+def test_username_longest_that_fits():
+    player = make_player()
+    player.username = "a" * MAX_STRING_LENGTH
+    assert decode(encode(player)).username == player.username
+
+
+def test_username_too_long_is_refused():
+    player = make_player()
+    # multi byte characters count as more than one byte
+    player.username = "é" * (MAX_STRING_LENGTH // 2 + 1)
+    with pytest.raises(ValueError):
+        encode(player)
+
+
+def test_verify_round_trip():
+    reply = (False, "Username Is Already Taken (pilot)", 1234, 1, 2, 5555)
+    assert decode(encode(reply)) == reply
+
+
+def test_join_round_trip():
+    player, compressions, room, resume_token = decode_join(encode_join(make_player(), 3, ANY_ROOM, 42))
+    assert (player.username, compressions, room, resume_token) == ("pilot", 3, ANY_ROOM, 42)
+
+
+def test_override_sends_the_input_sequence():
+    player = make_player()
+    attributes = decode_override(encode_override(player, ["ammo", "username"]))
+    assert attributes == {"ammo": 12, "username": "pilot", "input_sequence": 99}
+
+
+def test_profile_only_sends_what_changed():
+    player = make_player()
+    profile, values = encode_profile(player, None)
+    assert decode_profile(profile)['score'] == 400
+    assert encode_profile(player, values)[0] is None
+    player.score = 500
+    player.pos = Vec(0, 0)
+    profile, values = encode_profile(player, values)
+    assert decode_profile(profile) == {"score": 500}
+
+
+def test_profile_never_has_the_player_id():
+    profile, values = encode_profile(make_player(), None)
+    assert "player_id" not in decode_profile(profile)
+
+
+@pytest.mark.parametrize("data", [b"", b"\x01", b"\xff\x00", encode(make_player())[:-4]])
+def test_invalid_messages_raise_value_error(data):
+    with pytest.raises(ValueError):
+        decode(data)
+
+
+def test_unknown_messages_can_not_be_encoded():
+    with pytest.raises(TypeError):
+        encode([1, 2, 3])
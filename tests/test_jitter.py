@@ -0,0 +1,33 @@
+from jitter import JitterBuffer
+
+
+def test_commands_wait_until_the_buffer_is_deep_enough():
+    jitter_buffer = JitterBuffer(depth=2, size=6)
+    jitter_buffer.add(1)
+    assert jitter_buffer.next_command() is None
+    jitter_buffer.add(2)
+    assert jitter_buffer.next_command() == 1
+    assert jitter_buffer.next_command() == 2
+
+
+def test_an_empty_buffer_fills_up_again_before_playing():
+    jitter_buffer = JitterBuffer(depth=2, size=6)
+    for command in [1, 2]:
+        jitter_buffer.add(command)
+    jitter_buffer.next_command()
+    jitter_buffer.next_command()
+    assert jitter_buffer.next_command() is None
+    jitter_buffer.add(3)
+    assert jitter_buffer.next_command() is None
+    jitter_buffer.add(4)
+    assert jitter_buffer.next_command() == 3
+
+
+def test_a_full_buffer_skips_to_the_newest_commands():
+    jitter_buffer = JitterBuffer(depth=2, size=4)
+    for command in range(1, 7):
+        jitter_buffer.add(command)
+    # the oldest commands are dropped as it fills, then it skips down to its depth
+    assert jitter_buffer.next_command() == 5
+    assert jitter_buffer.next_command() == 6
+    assert jitter_buffer.next_command() is None
@@ -0,0 +1,40 @@
+import pytest
+from ring import SnapshotRing
+
+
+@pytest.fixture
+def ring():
+    ring = SnapshotRing(slots=4, slot_size=64)
+    yield ring
+    ring.close()
+
+
+def test_other_processes_read_what_was_written(ring):
+    assert ring.write(1, b"first tick")
+    reader = SnapshotRing(ring.name, slots=4, slot_size=64)
+    try:
+        assert reader.latest_tick() == 1
+        assert reader.read(1) == b"first tick"
+    finally:
+        reader.close()
+
+
+def test_ticks_written_over_can_not_be_read(ring):
+    for tick in range(1, 6):
+        ring.write(tick, f"tick {tick}".encode())
+    # tick 5 went in the slot of tick 1
+    assert ring.read(1) is None
+    assert ring.read(2) == b"tick 2"
+    assert ring.read(5) == b"tick 5"
+    assert ring.latest_tick() == 5
+
+
+def test_ticks_never_written_can_not_be_read(ring):
+    ring.write(1, b"first tick")
+    assert ring.read(2) is None
+
+
+def test_data_too_large_for_a_slot_is_not_written(ring):
+    assert not ring.write(1, bytes(64))
+    assert ring.read(1) is None
+    assert ring.latest_tick() == 0
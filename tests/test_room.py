@@ -0,0 +1,122 @@
+from os import path, listdir
+import pytest
+from pygame.math import Vector2 as Vec
+from entities import NetPlayer
+from bullets import WallGrid
+from room import Room
+from settings import BULLET_RANGE, BULLET_VEL
+
+MAP_FOLDER = path.join(path.dirname(path.dirname(path.abspath(__file__))), "map")
+
+
+class DestroyedPlayers(list):
+    def __call__(self, player_id, killed_by_player_id):
+        self.append((player_id, killed_by_player_id))
+
+
+@pytest.fixture
+def room():
+    maps = [map_file for map_file in listdir(MAP_FOLDER) if map_file.endswith(".tmx")]
+    room = Room(0, maps, MAP_FOLDER, DestroyedPlayers())
+    room.prepare_new_game()
+    room.start_game()
+    # no walls, so bullets are only removed by what is being tested
+    room.wall_grid = WallGrid([], 4000, 4000)
+    return room
+
+
+def add_player(room, player_id, pos):
+    player = NetPlayer(player_id)
+    player.username = f"player {player_id}"
+    player.pos = pos
+    room.add_player(player_id, player)
+    return player
+
+
+def test_bullets_hit_other_players(room):
+    add_player(room, 1, Vec(500, 500))
+    add_player(room, 2, Vec(1000, 1000))
+    room.queue_change(room.add_bullet, Vec(500, 500), 0, 2, room.current_game_id)
+    room.tick()
+    assert room.destroy_player == [(1, 2)]
+    assert len(room.game['bullets']) == 0
+
+
+def test_bullets_do_not_hit_their_owner(room):
+    add_player(room, 1, Vec(500, 500))
+    room.queue_change(room.add_bullet, Vec(500, 500), 0, 1, room.current_game_id)
+    room.tick()
+    assert room.destroy_player == []
+    assert len(room.game['bullets']) == 1
+
+
+def test_players_are_not_hit_again_while_crashing(room):
+    add_player(room, 1, Vec(500, 500))
+    room.queue_change(room.add_bullet, Vec(500, 500), 0, 2, room.current_game_id)
+    room.tick()
+    room.queue_change(room.add_bullet, Vec(500, 500), 0, 2, room.current_game_id)
+    room.tick()
+    assert room.destroy_player == [(1, 2)]
+
+
+def test_bullets_of_an_old_game_are_not_added(room):
+    room.queue_change(room.add_bullet, Vec(500, 500), 0, 2, room.current_game_id - 1)
+    room.tick()
+    assert len(room.game['bullets']) == 0
+
+
+def test_bullets_expire_after_their_range(room):
+    room.queue_change(room.add_bullet, Vec(500, 500), 0, 2, room.current_game_id)
+    ticks = 0
+    while ticks == 0 or len(room.game['bullets']):
+        room.tick()
+        ticks += 1
+    # the bullet is added on the first tick, then goes as far as it can
+    assert ticks - 1 == round(BULLET_RANGE / BULLET_VEL * room.tick_clock.rate)
+    assert room.snapshot['bullets'] == {}
+
+
+def test_players_join_and_leave_on_the_next_tick(room):
+    add_player(room, 1, Vec(500, 500))
+    assert 1 not in room.game['players']
+    room.tick()
+    assert 1 in room.game['players']
+    assert 1 in room.snapshot['players']
+    room.remove_player(1)
+    assert 1 in room.game['players']
+    room.tick()
+    assert 1 not in room.game['players']
+
+
+def test_the_game_has_its_own_copy_of_each_player(room):
+    player = add_player(room, 1, Vec(500, 500))
+    room.tick()
+    # a client's thread changing its player doesn't change the player the tick reads
+    player.score = 100
+    assert room.game['players'][1].score == 0
+    room.queue_change(room.update_player, 1, {"score": 100})
+    assert room.game['players'][1].score == 0
+    room.tick()
+    assert room.game['players'][1].score == 100
+
+
+def test_changes_to_players_that_left_are_ignored(room):
+    add_player(room, 1, Vec(500, 500))
+    room.tick()
+    room.remove_player(1)
+    room.queue_change(room.update_player, 1, {"score": 100})
+    room.tick()
+    assert 1 not in room.game['players']
+
+
+def test_snapshots_can_not_be_changed(room):
+    add_player(room, 1, Vec(500, 500))
+    room.tick()
+    snapshot = room.snapshot
+    with pytest.raises(TypeError):
+        snapshot['players'][2] = snapshot['players'][1]
+    room.queue_change(room.update_player, 1, {"score": 100})
+    room.tick()
+    # the next tick publishes a new snapshot instead of changing the old one
+    assert room.snapshot is not snapshot
+    assert snapshot['players'][1] != room.snapshot['players'][1]
@@ -0,0 +1,107 @@
+from pygame.math import Vector2 as Vec
+from entities import NetPlayer
+from snapshot import SnapshotHistory
+from codec import (encode_snapshot, decode_snapshot, decode_game, snapshot_ticks, game_state, state_game, NO_BASE,
+                   EMPTY_STATE)
+
+
+def make_game():
+    players = {}
+    for player_id, username in [(1, "red"), (2, "blue")]:
+        player = NetPlayer(player_id)
+        player.username = username
+        player.image_color = "blue"
+        player.image_string = "shipblue.png"
+        player.pos = Vec(player_id * 100, 50)
+        players[player_id] = player
+    return {"players": players,
+            "current map": "four_corners.tmx",
+            "game time": 300.0,
+            "score time": 0.0,
+            "items": {0: [True, "random", "bullet"], 1: [False, "power", "power"]},
+            "bullets": {0: [Vec(10, 10), 90.0, 1], 1: [Vec(20, 20), 180.0, 2]},
+            "active": True
+            }
+
+
+def test_keyframe_round_trip():
+    state = game_state(make_game())
+    keyframe = encode_snapshot(5, NO_BASE, EMPTY_STATE, state, 1000)
+    assert snapshot_ticks(keyframe) == (5, NO_BASE, 1000)
+    assert decode_snapshot(keyframe, EMPTY_STATE) == state
+
+
+def test_keyframe_decodes_straight_to_the_game():
+    state = game_state(make_game())
+    keyframe = encode_snapshot(5, NO_BASE, EMPTY_STATE, state)
+    game = decode_game(keyframe)
+    assert game_state(game) == state
+    assert game_state(state_game(state)) == state
+
+
+def test_delta_applies_changes_to_the_base():
+    game = make_game()
+    base_state = game_state(game)
+    game['players'][1].pos = Vec(150, 60)
+    game['players'][2].score = 100
+    game['items'][1][0] = True
+    game['bullets'][0][0] = Vec(15, 10)
+    game['game time'] = 299.0
+    state = game_state(game)
+    delta = encode_snapshot(6, 5, base_state, state)
+    assert snapshot_ticks(delta)[:2] == (6, 5)
+    assert decode_snapshot(delta, base_state) == state
+
+
+def test_delta_removes_what_left_and_adds_what_joined():
+    game = make_game()
+    base_state = game_state(game)
+    del game['players'][2]
+    player = NetPlayer(70000)
+    player.username = "green"
+    game['players'][70000] = player
+    del game['items'][0]
+    del game['bullets'][1]
+    game['bullets'][2] = [Vec(30, 30), 0.0, 70000]
+    state = game_state(game)
+    assert decode_snapshot(encode_snapshot(6, 5, base_state, state), base_state) == state
+
+
+def test_delta_only_has_what_changed():
+    game = make_game()
+    base_state = game_state(game)
+    keyframe = encode_snapshot(5, NO_BASE, EMPTY_STATE, base_state)
+    unchanged = encode_snapshot(6, 5, base_state, base_state)
+    assert decode_snapshot(unchanged, base_state) == base_state
+    game['players'][1].pos = Vec(101, 50)
+    moved = encode_snapshot(6, 5, base_state, game_state(game))
+    assert len(unchanged) < len(moved) < len(keyframe)
+
+
+def test_decoding_does_not_change_the_base():
+    game = make_game()
+    base_state = game_state(game)
+    base_players = dict(base_state['players'])
+    game['players'][1].kills = 3
+    decode_snapshot(encode_snapshot(6, 5, base_state, game_state(game)), base_state)
+    assert base_state['players'] == base_players
+
+
+def test_history_forgets_the_oldest_snapshots():
+    history = SnapshotHistory(size=3)
+    for tick in range(1, 6):
+        history.add(tick, {"tick": tick})
+    assert history.get(1) is None
+    assert history.get(2) is None
+    assert history.get(3) == {"tick": 3}
+    assert history.latest_tick == 5
+    assert history.latest() == {"tick": 5}
+
+
+def test_history_clear():
+    history = SnapshotHistory()
+    history.add(1, {})
+    history.clear()
+    assert history.get(1) is None
+    assert history.latest_tick is None
+    assert history.latest() is None
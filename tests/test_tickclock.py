@@ -0,0 +1,72 @@
+import pytest
+import tickclock
+from tickclock import TickClock
+from settings import MAX_CATCH_UP_TICKS
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def fake_time(monkeypatch):
+    fake_time = FakeTime()
+    monkeypatch.setattr(tickclock, "monotonic", fake_time)
+    return fake_time
+
+
+def test_first_tick_is_due_right_away(fake_time):
+    clock = TickClock(rate=10)
+    assert clock.due_ticks() == 1
+    assert clock.due_ticks() == 0
+    assert clock.time_until_tick() == pytest.approx(0.1)
+
+
+def test_ticks_stay_on_whole_tick_lengths(fake_time):
+    clock = TickClock(rate=10)
+    clock.due_ticks()
+    # waking up late doesn't push the next tick back
+    fake_time.now += 0.13
+    assert clock.due_ticks() == 1
+    assert clock.time_until_tick() == pytest.approx(0.07)
+    assert clock.overruns == 0
+
+
+def test_falling_behind_runs_the_ticks_missed(fake_time):
+    clock = TickClock(rate=10)
+    clock.due_ticks()
+    fake_time.now += 0.35
+    assert clock.due_ticks() == 3
+    assert clock.overruns == 2
+    assert clock.skipped == 0
+
+
+def test_falling_far_behind_drops_the_oldest_ticks(fake_time):
+    clock = TickClock(rate=10)
+    clock.due_ticks()
+    fake_time.now += 0.1 * (MAX_CATCH_UP_TICKS + 4) + 0.05
+    assert clock.due_ticks() == MAX_CATCH_UP_TICKS
+    assert clock.skipped == 4
+    # the dropped ticks are not run later
+    assert clock.due_ticks() == 0
+
+
+def test_restart_does_not_catch_up(fake_time):
+    clock = TickClock(rate=10)
+    clock.due_ticks()
+    fake_time.now += 60
+    clock.restart()
+    assert clock.due_ticks() == 1
+    assert clock.skipped == 0
+
+
+def test_time_since_counts_game_time(fake_time):
+    clock = TickClock(rate=20)
+    clock.ticks = 50
+    # the wall clock doesn't change game time, only ticks do
+    fake_time.now += 10
+    assert clock.time_since(30) == pytest.approx(1.0)
@@ -0,0 +1,76 @@
+from tickclock import TickClock
+from timers import TickTimers
+
+
+def run_ticks(timers, ticks):
+    for tick in range(ticks):
+        timers.tick_clock.ticks += 1
+        timers.run_due()
+
+
+def test_timers_run_on_the_tick_they_are_due():
+    timers = TickTimers(TickClock(rate=10))
+    ran = []
+    timers.schedule(0.5, ran.append, "half")
+    timers.schedule(0.2, ran.append, "fifth")
+    run_ticks(timers, 1)
+    assert ran == []
+    run_ticks(timers, 1)
+    assert ran == ["fifth"]
+    run_ticks(timers, 3)
+    assert ran == ["fifth", "half"]
+
+
+def test_timers_due_on_the_same_tick_run_in_the_order_scheduled():
+    timers = TickTimers(TickClock(rate=10))
+    ran = []
+    for name in ["first", "second", "third"]:
+        timers.schedule(0.3, ran.append, name)
+    run_ticks(timers, 3)
+    assert ran == ["first", "second", "third"]
+
+
+def test_timers_wait_at_least_one_tick():
+    timers = TickTimers(TickClock(rate=10))
+    ran = []
+    timers.schedule(0, ran.append, "now")
+    timers.run_due()
+    assert ran == []
+    run_ticks(timers, 1)
+    assert ran == ["now"]
+
+
+def test_cancelled_timers_do_not_run():
+    timers = TickTimers(TickClock(rate=10))
+    ran = []
+    timer = timers.schedule(0.1, ran.append, "cancelled")
+    timers.schedule(0.1, ran.append, "kept")
+    timers.cancel(timer)
+    run_ticks(timers, 1)
+    assert ran == ["kept"]
+
+
+def test_cancel_group_removes_only_that_group():
+    timers = TickTimers(TickClock(rate=10))
+    ran = []
+    timers.schedule(0.1, ran.append, "old game", group=1)
+    timers.schedule(5, ran.append, "old game later", group=1)
+    timers.schedule(0.1, ran.append, "new game", group=2)
+    timers.cancel_group(1)
+    assert len(timers.timers) == 1
+    run_ticks(timers, 60)
+    assert ran == ["new game"]
+
+
+def test_timers_can_schedule_timers():
+    timers = TickTimers(TickClock(rate=10))
+    ran = []
+
+    def respawn():
+        ran.append(timers.tick_clock.ticks)
+        if len(ran) < 3:
+            timers.schedule(0.1, respawn)
+
+    timers.schedule(0.1, respawn)
+    run_ticks(timers, 5)
+    assert ran == [1, 2, 3]
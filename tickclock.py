@@ -0,0 +1,42 @@
+from time import monotonic
+from settings import *
+
+
+class TickClock:
+    def __init__(self, rate=TICK_RATE):
+        # runs the same amount of ticks every second, each moving the game forward by the same time
+        self.rate = rate
+        self.tick_length = 1.0 / rate  # in seconds
+        # ticks are due at whole tick lengths from the start, so sleeping too long doesn't add up over many ticks
+        self.next_time = monotonic()
+        # how many ticks have been run, counted by the room as it runs them
+        self.ticks = 0
+        # ticks that were due before the one before them finished, and ticks dropped to catch up
+        self.overruns = 0
+        self.skipped = 0
+
+    def restart(self):
+        # start ticking from now, such as after waiting between games, instead of catching up on the time waited
+        self.next_time = monotonic()
+
+    def time_since(self, tick):
+        # in seconds, how far the ticks run since the given tick have moved the game forward
+        return (self.ticks - tick) * self.tick_length
+
+    def time_until_tick(self):
+        # in seconds, how long to sleep until the next tick is due
+        return max(0.0, self.next_time - monotonic())
+
+    def due_ticks(self):
+        # how many ticks to run now, zero if it is too early
+        current_time = monotonic()
+        if current_time < self.next_time:
+            return 0
+        ticks = int((current_time - self.next_time) / self.tick_length) + 1
+        self.next_time += ticks * self.tick_length
+        self.overruns += ticks - 1
+        # a server too slow to keep up would fall further behind catching up, so the oldest ticks are dropped
+        if ticks > MAX_CATCH_UP_TICKS:
+            self.skipped += ticks - MAX_CATCH_UP_TICKS
+            ticks = MAX_CATCH_UP_TICKS
+        return ticks
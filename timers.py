@@ -0,0 +1,56 @@
+from heapq import heappush, heappop, heapify
+from itertools import count
+from threading import Lock
+
+
+class Timer:
+    def __init__(self, tick, function, args, group):
+        # a function to run on a tick of a room
+        self.tick = tick
+        self.function = function
+        self.args = args
+        self.group = group
+        self.cancelled = False
+
+
+class TickTimers:
+    def __init__(self, tick_clock):
+        # every timer of a room, run by the room's own ticks instead of each sleeping on its own thread
+        self.tick_clock = tick_clock
+        # the tick each timer is due on, kept in a heap so the next one due is always first
+        # timers due on the same tick run in the order they were scheduled
+        self.timers = []
+        self.order = count()
+        # clients schedule timers from their own threads while the room runs them
+        self.lock = Lock()
+
+    def schedule(self, delay, function, *args, group=None):
+        # run the function after the delay in seconds, timers in a group can all be cancelled at once
+        tick = self.tick_clock.ticks + max(1, round(delay * self.tick_clock.rate))
+        timer = Timer(tick, function, args, group)
+        with self.lock:
+            heappush(self.timers, (tick, next(self.order), timer))
+        return timer
+
+    def cancel(self, timer):
+        # the timer stays in the heap until it is due, then it is skipped
+        timer.cancelled = True
+
+    def cancel_group(self, group):
+        # the timers are removed right away, as a group can have many timers that are far from due
+        with self.lock:
+            for tick, order, timer in self.timers:
+                if timer.group == group:
+                    timer.cancelled = True
+            self.timers = [entry for entry in self.timers if not entry[2].cancelled]
+            heapify(self.timers)
+
+    def run_due(self):
+        # run every timer due by the current tick
+        while True:
+            with self.lock:
+                if not self.timers or self.timers[0][0] > self.tick_clock.ticks:
+                    break
+                timer = heappop(self.timers)[2]
+            if not timer.cancelled:
+                timer.function(*timer.args)